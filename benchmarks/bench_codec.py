@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark of ConfigMap serialisation at 1k / 10k repositories.
+
+Compares the pure-Python PyYAML safe loader/dumper with libyaml
+(CSafeLoader / CSafeDumper) and the JSON state used with STATE_FORMAT=json.
+
+    python benchmarks/bench_codec.py [--repos 1000 10000] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import codec  # noqa: E402
+
+
+def make_config(count: int) -> dict:
+    """A config.yaml with ``count`` repository entries and their state, as the poller writes it."""
+    return {
+        'repositories': [
+            {
+                'name': f'repo-{i:05d}',
+                'url': f'https://github.com/org-{i % 50}/repo-{i:05d}',
+                'branch': 'main',
+                'pipeline': 'build-pipeline',
+                'params': [
+                    {'name': 'git-url', 'value': '${repo.url}'},
+                    {'name': 'revision', 'value': '${commit.sha}'},
+                ],
+                'workspaces': [{'name': 'shared-workspace', 'claimName': 'source-pvc'}],
+                'lastCheckedSHA': f'{i:040x}',
+                'lastCheckedAt': f'2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z',
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(counts, repeat: int) -> None:
+    print(f"libyaml available: {codec.SafeLoader is not yaml.SafeLoader}")
+    print(f"{'repos':>7}  {'codec':<22} {'load':>9} {'dump':>9} {'size':>10}")
+    for count in counts:
+        config_data = make_config(count)
+        text = yaml.dump(config_data, Dumper=yaml.SafeDumper, default_flow_style=False)
+        config_only, state = codec.split_state(config_data)
+        state_text = codec.dump_state(state)
+
+        rows = [
+            ('yaml (pure Python)',
+             lambda: yaml.load(text, Loader=yaml.SafeLoader),
+             lambda: yaml.dump(config_data, Dumper=yaml.SafeDumper, default_flow_style=False),
+             len(text)),
+            ('yaml (libyaml)', lambda: codec.load_yaml(text), lambda: codec.dump_yaml(config_data), len(text)),
+            ('state.json', lambda: json.loads(state_text), lambda: codec.dump_state(state), len(state_text)),
+        ]
+        for name, load, dump, size in rows:
+            print(f"{count:>7}  {name:<22} {best_of(repeat, load):>8.3f}s {best_of(repeat, dump):>8.3f}s "
+                  f"{size / 1024:>8.0f}KB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repos', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.repos, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
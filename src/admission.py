@@ -0,0 +1,117 @@
+"""
+Trigger admission control for poller-created PipelineRuns.
+
+Caps the number of concurrently running PipelineRuns (globally and optionally
+per pipeline). Triggers above the cap are kept in a priority-ordered backlog
+that is persisted in the ConfigMap and drained on later runs.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from models import RepositoryConfig
+from tekton import PIPELINE_LABEL, is_running, list_pipelineruns
+
+logger = logging.getLogger(__name__)
+
+
+def count_running(custom_client, namespace: str) -> Counter:
+    """
+    Count running poller-created PipelineRuns per pipeline.
+
+    Returns:
+        Counter keyed by pipeline name
+    """
+    running: Counter = Counter()
+    for pipeline_run in list_pipelineruns(custom_client, namespace):
+        if is_running(pipeline_run):
+            labels = (pipeline_run.get('metadata') or {}).get('labels') or {}
+            running[labels.get(PIPELINE_LABEL, '')] += 1
+    return running
+
+
+class TriggerAdmission:
+    """
+    Decides whether a trigger may create a PipelineRun now or must wait.
+
+    Configured through the ``admission`` section of config.yaml::
+
+        admission:
+          maxRunning: 20        # cap across all pipelines (0 or unset: unlimited)
+          pipelines:
+            integration: 2      # per-pipeline caps
+
+    The backlog is the ``backlog`` list of config.yaml. Each entry records the
+    repository name, the SHA to build, the SHA it replaces, its priority and
+    when it was queued.
+    """
+
+    def __init__(self, settings: Dict, running: Counter, backlog: List[Dict]):
+        self.max_running = int(settings.get('maxRunning') or 0)
+        self.pipeline_limits = {
+            name: int(limit) for name, limit in (settings.get('pipelines') or {}).items()
+        }
+        self.running = Counter(running)
+        self.backlog = backlog
+        # Set when the running count is unknown: every trigger is queued
+        self.blocked = False
+
+    @property
+    def total_running(self) -> int:
+        return sum(self.running.values())
+
+    def try_admit(self, pipeline: str) -> bool:
+        """Reserve a slot for a PipelineRun of the given pipeline if capacity allows."""
+        if self.blocked:
+            return False
+        if self.max_running and self.total_running >= self.max_running:
+            return False
+        limit = self.pipeline_limits.get(pipeline)
+        if limit is not None and self.running[pipeline] >= limit:
+            return False
+        self.running[pipeline] += 1
+        return True
+
+    def release(self, pipeline: str) -> None:
+        """Give back a slot reserved by try_admit (e.g. when creation failed)."""
+        if self.running[pipeline] > 0:
+            self.running[pipeline] -= 1
+
+    def find(self, repo_key: str) -> Optional[Dict]:
+        """Return the backlog entry queued for a repository, if any."""
+        for entry in self.backlog:
+            if entry.get('repository') == repo_key:
+                return entry
+        return None
+
+    def enqueue(self, repo: RepositoryConfig, sha: str, previous_sha: str) -> None:
+        """
+        Queue a trigger for later.
+
+        A repository has at most one entry: a newer SHA replaces the queued one
+        but keeps its position, so a burst of pushes results in a single run.
+        """
+        entry = self.find(repo.key)
+        if entry:
+            logger.info(f"Backlog entry for {repo.name} updated: {entry['sha'][:7]} -> {sha[:7]}")
+            entry['sha'] = sha
+            return
+
+        self.backlog.append({
+            'repository': repo.key,
+            'pipeline': repo.pipeline,
+            'sha': sha,
+            'previousSHA': previous_sha,
+            'priority': repo.priority,
+            'enqueuedAt': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        })
+        logger.info(f"Trigger for {repo.name} queued in backlog ({len(self.backlog)} waiting)")
+
+    def remove(self, entry: Dict) -> None:
+        self.backlog.remove(entry)
+
+    def ordered_backlog(self) -> List[Dict]:
+        """Backlog entries by priority (highest first), then by queue time."""
+        return sorted(self.backlog, key=lambda e: (-int(e.get('priority', 0)), e.get('enqueuedAt', '')))
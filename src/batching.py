@@ -0,0 +1,135 @@
+"""
+Time-windowed batching of triggers that share a pipeline.
+
+When several repositories feed the same (heavy) pipeline, a change landing
+across all of them at once would otherwise create one PipelineRun per
+repository. With batching enabled for a pipeline, the first detected change
+opens a window; every change detected for that pipeline until the window
+closes is added to the batch, and a single PipelineRun is created for all of
+them at the first cycle after the window has closed.
+
+Configured in config.yaml::
+
+    batching:
+      pipelines:
+        integration: 10m      # window per pipeline (s/m/h/d, plain numbers are seconds)
+
+Open batches are persisted in the ``batches`` list of the config, like the
+admission backlog, so a window can span several CronJob runs.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from models import RepositoryConfig
+from retention import parse_duration
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Params added to a batched PipelineRun
+BATCH_REPOSITORIES_PARAM = 'batch-repositories'
+BATCH_SHAS_PARAM = 'batch-shas'
+BATCH_CHANGES_PARAM = 'batch-changes'
+BATCH_PARAMS = (BATCH_REPOSITORIES_PARAM, BATCH_SHAS_PARAM, BATCH_CHANGES_PARAM)
+
+
+def parse_windows(config_data: Dict) -> Dict[str, float]:
+    """
+    Parse the ``batching`` section into pipeline -> window seconds.
+
+    Raises:
+        ValueError: listing every invalid window
+    """
+    settings = config_data.get('batching') or {}
+    pipelines = (settings.get('pipelines') or {}) if isinstance(settings, dict) else None
+    if not isinstance(pipelines, dict):
+        raise ValueError("'batching.pipelines' must be a mapping of pipeline name to window")
+
+    windows = {}
+    problems = []
+    for pipeline, window in pipelines.items():
+        try:
+            windows[str(pipeline)] = parse_duration(window)
+        except ValueError as e:
+            problems.append(f"pipeline '{pipeline}': {e}")
+    if problems:
+        raise ValueError('; '.join(problems))
+    return windows
+
+
+class TriggerBatcher:
+    """
+    Collects changes of batched pipelines into windows.
+
+    Each entry of ``batches`` records the pipeline, when its window opened and
+    the changes in detection order (one per repository: a later change of the
+    same repository replaces the SHA but keeps the previous SHA).
+    """
+
+    def __init__(self, windows: Dict[str, float], batches: List[Dict]):
+        self.windows = windows
+        self.batches = batches
+
+    def batches_pipeline(self, pipeline: str) -> bool:
+        return pipeline in self.windows
+
+    def find(self, pipeline: str) -> Optional[Dict]:
+        for batch in self.batches:
+            if batch.get('pipeline') == pipeline:
+                return batch
+        return None
+
+    def add(self, repo: RepositoryConfig, sha: str, previous_sha: str,
+            now: Optional[datetime] = None) -> None:
+        """Add a detected change to the open batch of its pipeline, opening one if needed."""
+        now = now or datetime.now(timezone.utc)
+        batch = self.find(repo.pipeline)
+        if batch is None:
+            batch = {'pipeline': repo.pipeline, 'openedAt': now.strftime(TIME_FORMAT), 'changes': []}
+            self.batches.append(batch)
+            logger.info(f"Opened batch for pipeline {repo.pipeline} "
+                        f"({self.windows[repo.pipeline]:.0f}s window)")
+
+        for change in batch['changes']:
+            if change.get('repository') == repo.key:
+                change['sha'] = sha
+                break
+        else:
+            batch['changes'].append({'repository': repo.key, 'sha': sha, 'previousSHA': previous_sha})
+        logger.info(f"Change of {repo.name} ({sha[:7]}) added to batch for pipeline {repo.pipeline} "
+                    f"({len(batch['changes'])} changes)")
+
+    def due(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Batches whose window has closed (or whose pipeline is no longer batched)."""
+        now = now or datetime.now(timezone.utc)
+        due = []
+        for batch in self.batches:
+            window = self.windows.get(batch.get('pipeline', ''))
+            try:
+                opened = datetime.strptime(batch['openedAt'], TIME_FORMAT).replace(tzinfo=timezone.utc)
+            except (KeyError, TypeError, ValueError):
+                opened = now - timedelta(seconds=window or 0)
+            if window is None or now - opened >= timedelta(seconds=window):
+                due.append(batch)
+        return due
+
+    def remove(self, batch: Dict) -> None:
+        self.batches.remove(batch)
+
+
+def batch_params(changes: List[Dict], repositories: Dict[str, RepositoryConfig]) -> List[Dict]:
+    """Params listing every change of a batch."""
+    details = []
+    for change in changes:
+        repo = repositories[change['repository']]
+        details.append({'repository': repo.name, 'url': repo.url, 'branch': repo.branch,
+                        'sha': change['sha'], 'previousSHA': change.get('previousSHA', '')})
+    return [
+        {'name': BATCH_REPOSITORIES_PARAM, 'value': ','.join(d['repository'] for d in details)},
+        {'name': BATCH_SHAS_PARAM, 'value': ','.join(d['sha'] for d in details)},
+        {'name': BATCH_CHANGES_PARAM, 'value': json.dumps(details, separators=(',', ':'))},
+    ]
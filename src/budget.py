@@ -0,0 +1,114 @@
+"""
+Deadline-aware cycle budgeting and incremental state checkpoints.
+
+The CronJob kills the poller at activeDeadlineSeconds. CycleBudget tells the
+polling loop when to stop taking new repositories so that there is time left
+to save state, and Checkpointer saves state every N repositories or T seconds
+so that a killed run loses at most one checkpoint's worth of SHA updates.
+"""
+
+import logging
+import math
+import os
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class CycleBudget:
+    """Time budget for one polling cycle."""
+
+    def __init__(self, deadline_seconds: float = 0, reserve_seconds: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            deadline_seconds: Seconds the cycle may take (0: no deadline)
+            reserve_seconds: Seconds kept back for saving state before the deadline
+        """
+        self._clock = clock
+        self.started_at = clock()
+        self.deadline_seconds = deadline_seconds
+        self.reserve_seconds = reserve_seconds
+
+    @classmethod
+    def from_env(cls, clock: Callable[[], float] = time.monotonic) -> 'CycleBudget':
+        return cls(
+            deadline_seconds=float(os.getenv('POLL_DEADLINE_SECONDS', '0')),
+            reserve_seconds=float(os.getenv('DEADLINE_RESERVE_SECONDS', '30')),
+            clock=clock,
+        )
+
+    @property
+    def deadline(self) -> float:
+        """Clock value at which the cycle must be finished (inf without a deadline)."""
+        if not self.deadline_seconds:
+            return math.inf
+        return self.started_at + self.deadline_seconds
+
+    def elapsed(self) -> float:
+        return self._clock() - self.started_at
+
+    def remaining(self) -> float:
+        return self.deadline - self._clock()
+
+    def exhausted(self) -> bool:
+        """True once only the reserve for saving state is left."""
+        return self.remaining() <= self.reserve_seconds
+
+
+class Checkpointer:
+    """Saves pending state every ``every_repos`` repositories or ``interval_seconds``."""
+
+    def __init__(self, save: Callable[[], None], every_repos: int = 50,
+                 interval_seconds: float = 60, clock: Callable[[], float] = time.monotonic):
+        self._save = save
+        self._clock = clock
+        self.every_repos = every_repos
+        self.interval_seconds = interval_seconds
+        self.dirty = False
+        self.pending_repos = 0
+        self.last_saved_at = clock()
+        self.saves = 0
+
+    @classmethod
+    def from_env(cls, save: Callable[[], None], clock: Callable[[], float] = time.monotonic) -> 'Checkpointer':
+        return cls(
+            save,
+            every_repos=int(os.getenv('CHECKPOINT_EVERY_REPOS', '50')),
+            interval_seconds=float(os.getenv('CHECKPOINT_INTERVAL_SECONDS', '60')),
+            clock=clock,
+        )
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+
+    def repo_done(self) -> None:
+        """Count a processed repository and save if a checkpoint is due."""
+        self.pending_repos += 1
+        if not self.dirty:
+            return
+        if ((self.every_repos and self.pending_repos >= self.every_repos)
+                or (self.interval_seconds and self._clock() - self.last_saved_at >= self.interval_seconds)):
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Save pending state if there is any.
+
+        Returns:
+            True if state was saved (or nothing needed saving)
+        """
+        if not self.dirty:
+            return True
+        try:
+            self._save()
+        except Exception as e:
+            # Keep the state dirty so the next checkpoint retries it
+            logger.error(f"Failed to save checkpoint: {e}")
+            return False
+        self.dirty = False
+        self.pending_repos = 0
+        self.last_saved_at = self._clock()
+        self.saves += 1
+        return True
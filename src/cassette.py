@@ -0,0 +1,276 @@
+"""
+Record/replay harness for offline profiling of real polling cycles.
+
+In record mode every HTTP request made through urllib3 (which carries both
+PyGithub's and the Kubernetes client's traffic) is captured together with
+its response and timing into a gzip-compressed JSON cassette. Credentials
+are never written: request headers are not stored and token fields in
+response bodies are scrubbed.
+
+In replay mode the same requests are answered from the cassette without any
+network access, optionally sleeping for the recorded (or scaled) latency.
+
+Enabled from main() through environment variables:
+
+    POLLER_CASSETTE_MODE=record|replay
+    POLLER_CASSETTE=/path/to/cycle.cassette.json.gz
+    POLLER_REPLAY_SPEED=1.0   # latency multiplier in replay (0: no delay)
+"""
+
+import base64
+import contextlib
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import HTTPError
+from urllib3.response import HTTPResponse
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+REDACTED = 'REDACTED'
+
+# Response headers never written to a cassette
+_SECRET_HEADERS = frozenset({'set-cookie'})
+# Response headers describing the wire encoding, dropped once the body is decoded
+_ENCODING_HEADERS = frozenset({'content-encoding', 'content-length', 'transfer-encoding'})
+# JSON keys whose values are scrubbed from response bodies
+_SECRET_KEYS = frozenset({'token', 'access_token', 'refresh_token'})
+
+_active: Optional['Cassette'] = None
+_mode: Optional[str] = None
+
+
+class CassetteMiss(HTTPError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def _scrub(value):
+    if isinstance(value, dict):
+        return {k: (REDACTED if k in _SECRET_KEYS and isinstance(v, str) else _scrub(v))
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [_scrub(item) for item in value]
+    return value
+
+
+def _encode_body(data: bytes) -> Dict:
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return {'body64': base64.b64encode(data).decode('ascii')}
+    try:
+        return {'json': _scrub(json.loads(text))} if text else {'body': ''}
+    except ValueError:
+        return {'body': text}
+
+
+def _decode_body(interaction: Dict) -> bytes:
+    if 'json' in interaction:
+        return json.dumps(interaction['json']).encode('utf-8')
+    if 'body64' in interaction:
+        return base64.b64decode(interaction['body64'])
+    return interaction.get('body', '').encode('utf-8')
+
+
+def _pool_origin(pool: HTTPConnectionPool) -> str:
+    port = f":{pool.port}" if pool.port and pool.port not in (80, 443) else ''
+    return f"{pool.scheme}://{pool.host}{port}"
+
+
+def _build_response(status: int, reason: str, headers: Dict[str, str], data: bytes,
+                    method: str, url: str, kwargs: Dict, ttfb: float, connection=None) -> HTTPResponse:
+    """
+    Build a urllib3 response that behaves like one read from the network.
+
+    It carries the request timings the transport stamps on network responses
+    (see transport._TimedConnectionMixin), so the transport hooks keep firing
+    in record and replay mode.
+    """
+    response = HTTPResponse(
+        body=io.BytesIO(data),
+        headers=headers,
+        status=status,
+        reason=reason,
+        preload_content=kwargs.get('preload_content', True),
+        decode_content=kwargs.get('decode_content', True),
+        request_method=method,
+        request_url=url,
+    )
+    setattr(response, 'poller_ttfb', ttfb)
+    setattr(response, 'poller_connection', connection)
+    return response
+
+
+class Cassette:
+    """Recorded HTTP interactions of one or more polling cycles."""
+
+    def __init__(self, interactions: Optional[List[Dict]] = None, metadata: Optional[Dict] = None):
+        self.interactions: List[Dict] = interactions or []
+        self.metadata: Dict = metadata or {}
+        self._lock = threading.Lock()
+        self._queues: Dict[Tuple[str, str], Deque[Dict]] = defaultdict(deque)
+        self._last: Dict[Tuple[str, str], Dict] = {}
+        for interaction in self.interactions:
+            self._queues[(interaction['method'], interaction['url'])].append(interaction)
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version: {data.get('version')}")
+        return cls(data['interactions'], data.get('metadata'))
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump({
+                'version': CASSETTE_VERSION,
+                'metadata': self.metadata,
+                'interactions': self.interactions,
+            }, f, separators=(',', ':'))
+        logger.info(f"Cassette saved: {path} ({len(self.interactions)} interactions)")
+
+    def record(self, method: str, url: str, status: int, reason: str,
+               headers: Dict[str, str], data: bytes, elapsed: float) -> None:
+        interaction = {
+            'method': method,
+            'url': url,
+            'status': status,
+            'reason': reason,
+            'headers': headers,
+            'elapsed': round(elapsed, 4),
+        }
+        interaction.update(_encode_body(data))
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def match(self, method: str, url: str) -> Dict:
+        """
+        Return the next recorded interaction for a request.
+
+        Repeated requests are answered in recording order; once the recorded
+        answers run out the last one is reused, so a cassette from one cycle
+        can drive many.
+        """
+        key = (method, url)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            if key not in self._last:
+                raise CassetteMiss(f"No recorded response for {method} {url}")
+            return self._last[key]
+
+
+def _recording_urlopen(cassette: Cassette, original):
+    def urlopen(pool, method, url, body=None, headers=None, **kwargs):
+        started = time.perf_counter()
+        response = original(pool, method, url, body=body, headers=headers, **kwargs)
+        if kwargs.get('preload_content', True):
+            data = response.data
+            decoded = kwargs.get('decode_content', True)
+        else:
+            data = response.read(decode_content=True)
+            decoded = True
+            response.release_conn()
+        elapsed = time.perf_counter() - started
+
+        response_headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in _SECRET_HEADERS
+            and not (decoded and name.lower() in _ENCODING_HEADERS)
+        }
+        cassette.record(method, _pool_origin(pool) + url, response.status, response.reason,
+                        response_headers, data, elapsed)
+        original_response = getattr(response, '_original_response', None)
+        return _build_response(response.status, response.reason, response_headers, data,
+                               method, url, kwargs, getattr(original_response, 'poller_ttfb', elapsed),
+                               getattr(original_response, 'poller_connection', None))
+    return urlopen
+
+
+def _replaying_urlopen(cassette: Cassette, speed: float):
+    def urlopen(pool, method, url, body=None, headers=None, **kwargs):
+        interaction = cassette.match(method, _pool_origin(pool) + url)
+        latency = interaction.get('elapsed', 0) * speed
+        if latency > 0:
+            time.sleep(latency)
+        # Replayed requests open no connections
+        return _build_response(interaction['status'], interaction.get('reason', ''),
+                               interaction.get('headers', {}), _decode_body(interaction),
+                               method, url, kwargs, latency)
+    return urlopen
+
+
+def replaying() -> bool:
+    """True while a replay session is active."""
+    return _mode == 'replay'
+
+
+def active_cassette() -> Optional[Cassette]:
+    return _active
+
+
+def configure_kubernetes() -> None:
+    """Point the Kubernetes client at the API server recorded in the cassette."""
+    from kubernetes import client
+
+    configuration = client.Configuration()
+    configuration.host = (_active.metadata if _active else {}).get('kubernetesHost', 'https://kubernetes.default.svc')
+    configuration.api_key = {'authorization': f'Bearer {REDACTED}'}
+    client.Configuration.set_default(configuration)
+
+
+@contextlib.contextmanager
+def session(mode: str, path: str, speed: float = 1.0) -> Iterator[Cassette]:
+    """
+    Record or replay all urllib3 traffic for the duration of the block.
+
+    Args:
+        mode: 'record' or 'replay'
+        path: Cassette file
+        speed: Replay latency multiplier (1.0: as recorded, 0: no delay)
+    """
+    global _active, _mode
+
+    if mode not in ('record', 'replay'):
+        raise ValueError(f"Unknown cassette mode: {mode}")
+
+    original = HTTPConnectionPool.urlopen
+    if mode == 'record':
+        cassette = Cassette(metadata={
+            'recordedAt': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        })
+        setattr(HTTPConnectionPool, 'urlopen', _recording_urlopen(cassette, original))
+    else:
+        cassette = Cassette.load(path)
+        setattr(HTTPConnectionPool, 'urlopen', _replaying_urlopen(cassette, speed))
+        logger.info(f"Replaying {len(cassette.interactions)} interactions from {path} (speed {speed})")
+
+    _active, _mode = cassette, mode
+    try:
+        yield cassette
+    finally:
+        setattr(HTTPConnectionPool, 'urlopen', original)
+        _active = _mode = None
+        if mode == 'record':
+            cassette.save(path)
+
+
+def session_from_env():
+    """Return a record/replay session configured by environment, or a no-op context."""
+    mode = os.getenv('POLLER_CASSETTE_MODE', '').lower()
+    if not mode:
+        return contextlib.nullcontext()
+    path = os.getenv('POLLER_CASSETTE', 'poller.cassette.json.gz')
+    return session(mode, path, float(os.getenv('POLLER_REPLAY_SPEED', '1.0')))
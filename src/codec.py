@@ -0,0 +1,95 @@
+"""
+Serialisation of the ConfigMap: config.yaml and the optional state.json.
+
+YAML goes through libyaml (CSafeLoader / CSafeDumper) when PyYAML was built
+with it, falling back to the pure-Python safe loader and dumper otherwise.
+
+With STATE_FORMAT=json the poller's own state (each repository's
+lastCheckedSHA / lastCheckedAt, the trigger backlog and open batches) is
+kept as compact JSON under a separate ConfigMap key, so a cycle only
+serialises the state instead of re-dumping the whole config.yaml. State embedded in config.yaml
+by earlier versions is migrated out on the first save.
+"""
+
+import json
+from typing import Any, Dict, Tuple
+
+import yaml
+
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+CONFIG_KEY = 'config.yaml'
+STATE_KEY = 'state.json'
+STATE_VERSION = 1
+
+# Fields of a repository entry written by the poller
+REPOSITORY_STATE_KEYS = ('lastCheckedSHA', 'lastCheckedAt', 'lastTag', 'tagsETag')
+# Top-level config.yaml keys written by the poller
+GLOBAL_STATE_KEYS = ('backlog', 'batches', 'validations')
+
+
+def load_yaml(text: str):
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def dump_yaml(data) -> str:
+    return yaml.dump(data, Dumper=SafeDumper, default_flow_style=False, allow_unicode=True)
+
+
+def has_embedded_state(config_data: Dict) -> bool:
+    """True if config.yaml still carries state written by the poller."""
+    if any(key in config_data for key in GLOBAL_STATE_KEYS):
+        return True
+    return any(
+        isinstance(entry, dict) and any(key in entry for key in REPOSITORY_STATE_KEYS)
+        for entry in config_data.get('repositories') or []
+    )
+
+
+def split_state(config_data: Dict) -> Tuple[Dict, Dict]:
+    """
+    Separate the poller's state from the user-authored configuration.
+
+    Returns:
+        (config without state, state) -- config_data itself is not modified
+    """
+    config = {key: value for key, value in config_data.items() if key not in GLOBAL_STATE_KEYS}
+    state: Dict[str, Any] = {'version': STATE_VERSION, 'repositories': {}}
+    for key in GLOBAL_STATE_KEYS:
+        if key in config_data:
+            state[key] = config_data[key]
+
+    entries = []
+    for entry in config_data.get('repositories') or []:
+        if not isinstance(entry, dict):
+            entries.append(entry)
+            continue
+        entries.append({key: value for key, value in entry.items() if key not in REPOSITORY_STATE_KEYS})
+        repo_state = {key: entry[key] for key in REPOSITORY_STATE_KEYS if key in entry}
+        if repo_state and entry.get('name'):
+            state['repositories'][entry['name']] = repo_state
+    if 'repositories' in config_data:
+        config['repositories'] = entries
+    return config, state
+
+
+def merge_state(config_data: Dict, state: Dict) -> None:
+    """Apply saved state onto the parsed config.yaml (state wins over embedded values)."""
+    if state.get('version', STATE_VERSION) != STATE_VERSION:
+        raise ValueError(f"Unsupported state version: {state.get('version')}")
+    for key in GLOBAL_STATE_KEYS:
+        if key in state:
+            config_data[key] = state[key]
+    repositories = state.get('repositories') or {}
+    for entry in config_data.get('repositories') or []:
+        if isinstance(entry, dict) and entry.get('name') in repositories:
+            entry.update(repositories[entry['name']])
+
+
+def dump_state(state: Dict) -> str:
+    return json.dumps(state, separators=(',', ':'), sort_keys=True)
+
+
+def load_state(text: str) -> Dict:
+    return json.loads(text)
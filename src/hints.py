@@ -0,0 +1,259 @@
+"""
+Change hints pushed by a webhook relay.
+
+In daemon mode the poller can listen for lightweight "repository X, ref Y
+changed" notifications over HTTP. A hint only schedules an immediate head
+lookup for the matching repository entries: the SHA in the payload (if any)
+is never trusted, the head is always read from the GitHub API. Repositories
+that keep receiving hints are polled less often by the regular cycle.
+
+A hint is a JSON POST to ``/hints``::
+
+    {"repository": "my-org/my-app", "ref": "refs/heads/main"}
+
+``repository`` may also be a full URL (to select a GHES host), or
+``owner/name`` with a separate ``host``. Without ``ref`` every watched branch
+(and tag listing) of the repository is checked; a ``refs/tags/<name>`` ref
+checks the entries watching tags that the tag name could match. The body must be signed with the shared
+secret like GitHub webhooks: ``X-Hint-Signature-256: sha256=<hex HMAC>``.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import DEFAULT_HOST, ConfigError, RepositoryConfig, parse_repo_url
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Hint-Signature-256'
+MAX_BODY_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Hint:
+    """A change notification for a repository (and optionally one branch or tag)."""
+    host: str
+    owner: str
+    repo: str
+    branch: Optional[str] = None
+    tag: Optional[str] = None
+
+    def matches(self, repo: RepositoryConfig) -> bool:
+        host, owner, name, branch = repo.head_key
+        if (self.host, self.owner, self.repo) != (host, owner, name):
+            return False
+        if self.tag is not None:
+            return repo.tags is not None and self.tag.startswith(repo.tags.prefix)
+        return self.branch in (None, branch)
+
+
+def parse_hint(payload) -> Hint:
+    """
+    Parse a hint payload.
+
+    Raises:
+        ValueError: if the payload does not name a repository and branch
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("payload must be a JSON object")
+    repository = payload.get('repository')
+    if not isinstance(repository, str) or not repository.strip():
+        raise ValueError("'repository' is required")
+
+    if '://' in repository or '@' in repository:
+        url = repository
+    else:
+        url = f"https://{payload.get('host') or DEFAULT_HOST}/{repository.strip('/')}"
+    try:
+        host, owner, name = parse_repo_url(url)
+    except ConfigError as e:
+        raise ValueError(str(e)) from e
+
+    ref = payload.get('ref')
+    if ref is not None and not isinstance(ref, str):
+        raise ValueError("'ref' must be a string")
+    branch = tag = None
+    if ref:
+        if ref.startswith('refs/heads/'):
+            branch = ref[len('refs/heads/'):]
+        elif ref.startswith('refs/tags/') and len(ref) > len('refs/tags/'):
+            tag = ref[len('refs/tags/'):]
+        elif ref.startswith('refs/'):
+            raise ValueError(f"unsupported ref '{ref}'")
+        else:
+            branch = ref
+    return Hint(host, owner.lower(), name.lower(), branch, tag)
+
+
+def sign(secret: bytes, body: bytes) -> str:
+    return 'sha256=' + hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: bytes, body: bytes, signature: Optional[str]) -> bool:
+    if not signature:
+        return False
+    return hmac.compare_digest(sign(secret, body), signature)
+
+
+class HintQueue:
+    """
+    Hints waiting to be checked, plus when each was last received.
+
+    Duplicate hints arriving before the queue is drained are coalesced.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._pending: Dict[Hint, None] = {}
+        # (host, owner, repo) -> when each hint for that repository was last received
+        self._received_at: Dict[Tuple[str, str, str], Dict[Hint, float]] = {}
+        self._closed = False
+        self.received = 0
+        self.rejected = 0
+
+    def put(self, hint: Hint) -> None:
+        with self._condition:
+            self._pending[hint] = None
+            self._received_at.setdefault((hint.host, hint.owner, hint.repo), {})[hint] = self._clock()
+            self.received += 1
+            self._condition.notify_all()
+
+    def reject(self) -> None:
+        with self._condition:
+            self.rejected += 1
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """Block until a hint is pending, the queue is closed or the timeout expires."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._closed, timeout)
+            return bool(self._pending)
+
+    def drain(self) -> List[Hint]:
+        with self._condition:
+            hints = list(self._pending)
+            self._pending.clear()
+            return hints
+
+    def close(self) -> None:
+        """Wake up wait() for shutdown."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def hinted_within(self, repo: RepositoryConfig, seconds: float) -> bool:
+        """True if a hint matching the repository entry arrived in the last ``seconds``."""
+        cutoff = self._clock() - seconds
+        host, owner, name, _ = repo.head_key
+        with self._condition:
+            received_at = self._received_at.get((host, owner, name)) or {}
+            return any(received >= cutoff and hint.matches(repo) for hint, received in received_at.items())
+
+    def prune(self, seconds: float) -> None:
+        """Forget when hints were received if that was more than ``seconds`` ago."""
+        cutoff = self._clock() - seconds
+        with self._condition:
+            for key, received_at in list(self._received_at.items()):
+                recent = {hint: received for hint, received in received_at.items() if received >= cutoff}
+                if recent:
+                    self._received_at[key] = recent
+                else:
+                    del self._received_at[key]
+
+
+def checked_within(repo: RepositoryConfig, seconds: float, now: datetime) -> bool:
+    """True if the repository entry's lastCheckedAt is less than ``seconds`` old."""
+    checked_at = repo.raw.get('lastCheckedAt')
+    if not checked_at:
+        return False
+    try:
+        checked = datetime.strptime(checked_at, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return False
+    return (now - checked).total_seconds() < seconds
+
+
+class HintServer:
+    """HTTP endpoint receiving signed hints into a HintQueue."""
+
+    def __init__(self, queue: HintQueue, secret: bytes, host: str = '0.0.0.0', port: int = 8080):
+        if not secret:
+            raise ValueError("a hint secret is required")
+        self.queue = queue
+        handler = self._handler(queue, secret)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @staticmethod
+    def _handler(queue: HintQueue, secret: bytes):
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, message: str) -> None:
+                body = json.dumps({'message': message}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/healthz':
+                    self._reply(200, 'ok')
+                else:
+                    self._reply(404, 'not found')
+
+            def do_POST(self):
+                if self.path != '/hints':
+                    self._reply(404, 'not found')
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    length = 0
+                if length <= 0 or length > MAX_BODY_BYTES:
+                    self._reply(413 if length > 0 else 400, 'invalid body size')
+                    return
+                body = self.rfile.read(length)
+                if not verify_signature(secret, body, self.headers.get(SIGNATURE_HEADER)):
+                    queue.reject()
+                    logger.warning(f"Rejected hint with invalid signature from {self.client_address[0]}")
+                    self._reply(401, 'invalid signature')
+                    return
+                try:
+                    hint = parse_hint(json.loads(body))
+                except ValueError as e:
+                    queue.reject()
+                    self._reply(400, str(e))
+                    return
+                queue.put(hint)
+                logger.info(f"Received hint for {hint.host}/{hint.owner}/{hint.repo} "
+                            f"({hint.branch or hint.tag or 'all branches'})")
+                self._reply(202, 'queued')
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name='hint-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Listening for hints on port {self.port}")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
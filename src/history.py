@@ -0,0 +1,327 @@
+"""
+Run history in a local SQLite file, and the ``poller stats`` report.
+
+Besides ``lastCheckedSHA`` the poller keeps nothing about past cycles. With
+HISTORY_PATH set (a file on a PVC, e.g. /data/history.db) every cycle
+appends one compact record for the cycle and one per checked repository:
+duration, GitHub API calls, 304 Not Modified responses, detected changes,
+created PipelineRuns and errors. With shadow mode on (see shadow.py) the
+cycle's comparison totals are stored as well.
+
+The store is bounded: records older than HISTORY_RETENTION_DAYS (30) are
+dropped, and at most HISTORY_MAX_CYCLES (10000) cycles are kept.
+
+``python src/poller.py stats [--db PATH] [--days N] [--top N]`` aggregates
+the store without contacting GitHub or Kubernetes: cycle time percentiles,
+the daily trend of cycle time, repository count and API calls, and the
+repositories that change most often, cost the most API calls or fail.
+"""
+
+import argparse
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+from transport import RequestTiming
+
+KIND_REGULAR = 'regular'
+KIND_HINTED = 'hinted'
+
+# Names recorded for batched PipelineRuns, which belong to no single repository
+BATCH_PREFIX = 'batch:'
+
+DEFAULT_PATH = '/data/history.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cycles (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    duration REAL NOT NULL,
+    repositories INTEGER NOT NULL,
+    checked INTEGER NOT NULL,
+    api_calls INTEGER NOT NULL,
+    not_modified INTEGER NOT NULL,
+    changes INTEGER NOT NULL,
+    triggers INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cycles_started_at ON cycles (started_at);
+CREATE TABLE IF NOT EXISTS repo_checks (
+    cycle_id INTEGER NOT NULL,
+    repo TEXT NOT NULL,
+    duration REAL NOT NULL,
+    api_calls INTEGER NOT NULL,
+    not_modified INTEGER NOT NULL,
+    changes INTEGER NOT NULL,
+    triggers INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    PRIMARY KEY (cycle_id, repo)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shadow_cycles (
+    cycle_id INTEGER PRIMARY KEY,
+    backend TEXT NOT NULL,
+    compared INTEGER NOT NULL,
+    disagreed INTEGER NOT NULL,
+    raced INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    primary_seconds REAL NOT NULL,
+    shadow_seconds REAL NOT NULL,
+    primary_calls INTEGER NOT NULL,
+    shadow_calls INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class RepoRecord:
+    duration: float = 0.0
+    api_calls: int = 0
+    not_modified: int = 0
+    changes: int = 0
+    triggers: int = 0
+    errors: int = 0
+
+
+class CycleRecorder:
+    """
+    Collects the counters of one polling cycle.
+
+    API calls are attributed to the repository whose ``track()`` block is
+    running on the calling thread (head lookups run on worker threads);
+    calls outside such a block count for the cycle only. Records named
+    ``batch:<pipeline>`` go to ``batches``: they add to the cycle's totals
+    but are not checked repositories.
+    """
+
+    def __init__(self, kind: str = KIND_REGULAR, clock: Callable[[], float] = time.time,
+                 timer: Callable[[], float] = time.perf_counter):
+        self.kind = kind
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started_at = clock()
+        self._started = timer()
+        self.repositories = 0
+        self.failed = False
+        self.api_calls = 0
+        self.not_modified = 0
+        self.repos: Dict[str, RepoRecord] = {}
+        self.batches: Dict[str, RepoRecord] = {}
+        # ShadowReport.totals() of the cycle, when shadow mode is on
+        self.shadow: Optional[Dict] = None
+
+    def _repo(self, name: str) -> RepoRecord:
+        records = self.batches if name.startswith(BATCH_PREFIX) else self.repos
+        record = records.get(name)
+        if record is None:
+            record = records[name] = RepoRecord()
+        return record
+
+    @contextlib.contextmanager
+    def track(self, name: str) -> Iterator[None]:
+        """Attribute the block's time and API calls to repository ``name``."""
+        previous = getattr(self._local, 'repo', None)
+        self._local.repo = name
+        started = self._timer()
+        try:
+            yield
+        finally:
+            self._local.repo = previous
+            with self._lock:
+                self._repo(name).duration += self._timer() - started
+
+    def on_request(self, timing: RequestTiming) -> None:
+        """Transport hook: count a GitHub response."""
+        name = getattr(self._local, 'repo', None)
+        not_modified = timing.status == 304
+        with self._lock:
+            self.api_calls += 1
+            self.not_modified += not_modified
+            if name is not None:
+                record = self._repo(name)
+                record.api_calls += 1
+                record.not_modified += not_modified
+
+    def changed(self, name: str) -> None:
+        with self._lock:
+            self._repo(name).changes += 1
+
+    def triggered(self, name: str) -> None:
+        with self._lock:
+            self._repo(name).triggers += 1
+
+    def error(self, name: str) -> None:
+        with self._lock:
+            self._repo(name).errors += 1
+
+    def duration(self) -> float:
+        return self._timer() - self._started
+
+
+class HistoryStore:
+    """Append-only, size-bounded SQLite store of CycleRecorder results."""
+
+    def __init__(self, path: str, retention_days: float = 30, max_cycles: int = 10000,
+                 clock: Callable[[], float] = time.time):
+        if retention_days <= 0 or max_cycles <= 0:
+            raise ValueError("history retention and max cycles must be positive")
+        self.path = path
+        self.retention_days = retention_days
+        self.max_cycles = max_cycles
+        self._clock = clock
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls) -> Optional['HistoryStore']:
+        """The store configured by HISTORY_PATH, or None when history is off."""
+        path = os.getenv('HISTORY_PATH', '')
+        if not path:
+            return None
+        return cls(path, float(os.getenv('HISTORY_RETENTION_DAYS', '30')),
+                   int(os.getenv('HISTORY_MAX_CYCLES', '10000')))
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def append(self, recorder: CycleRecorder) -> Optional[int]:
+        """Store one cycle and drop what falls outside the bounds; returns the cycle id."""
+        repos = sorted(recorder.repos.items())
+        records = [record for _, record in repos] + list(recorder.batches.values())
+        totals = [sum(getattr(record, field) for record in records) for field in ('changes', 'triggers', 'errors')]
+        with self.connection as connection:
+            cursor = connection.execute(
+                "INSERT INTO cycles (started_at, kind, duration, repositories, checked, api_calls, not_modified, "
+                "changes, triggers, errors, failed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (recorder.started_at, recorder.kind, recorder.duration(), recorder.repositories, len(repos),
+                 recorder.api_calls, recorder.not_modified, *totals, int(recorder.failed)))
+            cycle_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO repo_checks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(cycle_id, name, record.duration, record.api_calls, record.not_modified, record.changes,
+                  record.triggers, record.errors) for name, record in repos])
+            if recorder.shadow is not None:
+                connection.execute(
+                    "INSERT INTO shadow_cycles VALUES (:cycle_id, :backend, :compared, :disagreed, :raced, :errors, "
+                    ":primary_seconds, :shadow_seconds, :primary_calls, :shadow_calls)",
+                    {'cycle_id': cycle_id, **recorder.shadow})
+            self._rotate(connection)
+        return cycle_id
+
+    def _rotate(self, connection: sqlite3.Connection) -> None:
+        # Ids grow with time, so everything below one cutoff id is dropped in two range deletes
+        cutoff = self._clock() - self.retention_days * 86400
+        oldest_kept = connection.execute(
+            "SELECT MIN(id) FROM (SELECT id FROM cycles WHERE started_at >= ? ORDER BY id DESC LIMIT ?)",
+            (cutoff, self.max_cycles)).fetchone()[0]
+        if oldest_kept is None:
+            return
+        connection.execute("DELETE FROM cycles WHERE id < ?", (oldest_kept,))
+        connection.execute("DELETE FROM repo_checks WHERE cycle_id < ?", (oldest_kept,))
+        connection.execute("DELETE FROM shadow_cycles WHERE cycle_id < ?", (oldest_kept,))
+
+    def report(self, days: float = 7, top: int = 10) -> str:
+        """Render the aggregated history of the last ``days`` days."""
+        since = self._clock() - days * 86400
+        connection = self.connection
+        rows = connection.execute(
+            "SELECT kind, duration, api_calls, not_modified, changes, triggers, errors, failed "
+            "FROM cycles WHERE started_at >= ? ORDER BY started_at", (since,)).fetchall()
+        if not rows:
+            return f"No cycles recorded in the last {days:g} days ({self.path})"
+
+        lines = [f"History of the last {days:g} days ({self.path}):",
+                 f"  {'cycles':<8} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8} {'api calls':>10} "
+                 f"{'304s':>6} {'changes':>8} {'triggers':>8} {'errors':>6} {'failed':>6}"]
+        for kind in (KIND_REGULAR, KIND_HINTED):
+            selected = [row for row in rows if row[0] == kind]
+            if not selected:
+                continue
+            durations = sorted(row[1] for row in selected)
+            calls, not_modified, changes, triggers, errors, failed = (
+                sum(row[index] for row in selected) for index in range(2, 8))
+            lines.append(f"  {kind:<8} {len(selected):>6} {_percentile(durations, 50):>7.1f}s "
+                         f"{_percentile(durations, 95):>7.1f}s {durations[-1]:>7.1f}s {calls:>10} "
+                         f"{not_modified:>6} {changes:>8} {triggers:>8} {errors:>6} {failed:>6}")
+
+        lines.append("Daily regular cycles (UTC):")
+        lines.append(f"  {'day':<10} {'cycles':>6} {'avg time':>9} {'max time':>9} {'repos':>6} "
+                     f"{'calls/cycle':>11}")
+        for day, count, average, longest, repositories, calls in connection.execute(
+                "SELECT date(started_at, 'unixepoch'), COUNT(*), AVG(duration), MAX(duration), "
+                "MAX(repositories), AVG(api_calls) FROM cycles WHERE started_at >= ? AND kind = ? "
+                "GROUP BY 1 ORDER BY 1", (since, KIND_REGULAR)):
+            lines.append(f"  {day:<10} {count:>6} {average:>8.1f}s {longest:>8.1f}s {repositories:>6} "
+                         f"{calls:>11.1f}")
+
+        shadow = connection.execute(
+            "SELECT s.backend, COUNT(*), SUM(s.compared), SUM(s.disagreed), SUM(s.raced), SUM(s.errors), "
+            "SUM(s.primary_seconds), SUM(s.shadow_seconds), SUM(s.primary_calls), SUM(s.shadow_calls) "
+            "FROM shadow_cycles s JOIN cycles c ON c.id = s.cycle_id WHERE c.started_at >= ? "
+            "GROUP BY s.backend ORDER BY s.backend", (since,)).fetchall()
+        if shadow:
+            lines.append("Shadow detection (compared with rest, total time and calls of the sampled lookups):")
+            lines.append(f"  {'backend':<8} {'cycles':>6} {'compared':>8} {'disagreed':>9} {'raced':>5} "
+                         f"{'errors':>6} {'rest time':>9} {'time':>9} {'rest calls':>10} {'calls':>6}")
+            for backend, cycles, compared, disagreed, raced, errors, primary_seconds, shadow_seconds, \
+                    primary_calls, shadow_calls in shadow:
+                lines.append(f"  {backend:<8} {cycles:>6} {compared:>8} {disagreed:>9} {raced:>5} {errors:>6} "
+                             f"{primary_seconds:>8.1f}s {shadow_seconds:>8.1f}s {primary_calls:>10} {shadow_calls:>6}")
+
+        per_repo = ("SELECT r.repo, COUNT(*), SUM(r.api_calls), SUM(r.not_modified), SUM(r.changes), "
+                    "SUM(r.triggers), SUM(r.errors), AVG(r.duration) FROM repo_checks r "
+                    "JOIN cycles c ON c.id = r.cycle_id WHERE c.started_at >= ? "
+                    "GROUP BY r.repo ORDER BY {} DESC, r.repo LIMIT ?")
+        for title, order, column in (("most API calls", "SUM(r.api_calls)", 2), ("most changes", "SUM(r.changes)", 4),
+                                     ("most errors", "SUM(r.errors)", 6)):
+            # Repositories with nothing to count are left out
+            repos = [row for row in connection.execute(per_repo.format(order), (since, top)) if row[column]]
+            if not repos:
+                continue
+            lines.append(f"Repositories with the {title} (top {len(repos)}):")
+            lines.append(f"  {'repository':<30} {'checks':>6} {'calls':>6} {'304s':>6} {'changes':>8} "
+                         f"{'per day':>7} {'triggers':>8} {'errors':>6} {'avg time':>9}")
+            for name, checks, calls, not_modified, changes, triggers, errors, average in repos:
+                lines.append(f"  {name:<30} {checks:>6} {calls:>6} {not_modified:>6} {changes:>8} "
+                             f"{changes / days:>7.2f} {triggers:>8} {errors:>6} {average:>8.3f}s")
+        return '\n'.join(lines)
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(ordered) - 1, -(-len(ordered) * percent // 100) - 1))
+    return ordered[int(index)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """``poller stats``: print the aggregated run history."""
+    parser = argparse.ArgumentParser(prog='poller stats', description='Summarise the recorded run history.')
+    parser.add_argument('--db', default=os.getenv('HISTORY_PATH') or DEFAULT_PATH,
+                        help='history file (default: HISTORY_PATH or %(default)s)')
+    parser.add_argument('--days', type=float, default=7, help='period to summarise (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=10, help='repositories listed per table (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"No history at {args.db} (set HISTORY_PATH on the poller to record it)")
+        return 1
+    store = HistoryStore(args.db)
+    try:
+        print(store.report(args.days, args.top))
+    finally:
+        store.close()
+    return 0
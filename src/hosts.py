@@ -0,0 +1,249 @@
+"""
+GitHub hosts: github.com and GitHub Enterprise Server instances.
+
+The host of each repository URL selects the API endpoint it is polled
+through. Every host has its own credentials, GitHub clients, keep-alive
+connection pool (in the shared transport, see transport.py), lookup
+concurrency, circuit breaker and rate-limit tracking, so a slow GHES instance
+cannot hold up github.com.
+
+Configured in config.yaml (every key is optional)::
+
+    github:
+      hosts:
+        ghes.example.com:
+          apiUrl: https://ghes.example.com/api/v3   # default: https://<host>/api/v3
+          auth: pat                 # pat (default) or app
+          secretDir: /etc/github-poller/hosts/ghes.example.com
+          concurrency: 2            # parallel lookups per token
+          poolSize: 4               # keep-alive connections per client
+          timeout: 15               # read timeout in seconds
+          installations:            # owner -> installation id (auth: app)
+            platform: 42
+
+Credentials are read from files in ``secretDir``: ``github-token`` for a
+PAT, or ``app-id``, ``private-key`` and ``installation-id`` for a GitHub App.
+github.com keeps using the poller's main credentials (GITHUB_AUTH_TYPE).
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from github import Github
+
+from installations import InstallationMap, TokenPool, parse_installation_id
+from models import DEFAULT_HOST
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api.github.com'
+SECRET_ROOT = '/etc/github-poller/hosts'
+
+
+def default_api_url(host: str) -> str:
+    """REST API base URL of a host (GHES serves it under /api/v3)."""
+    if host == DEFAULT_HOST:
+        return DEFAULT_API_URL
+    return f"https://{host}/api/v3"
+
+
+def _positive_int(settings: Dict, key: str, problems: list) -> Optional[int]:
+    value = settings.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        problems.append(f"'{key}' must be a positive integer")
+        return None
+    return value
+
+
+@dataclass(frozen=True)
+class HostSettings:
+    """Connection settings of one GitHub host."""
+    host: str
+    api_url: str
+    auth: str = 'pat'
+    secret_dir: str = ''
+    concurrency: Optional[int] = None
+    pool_size: Optional[int] = None
+    timeout: Optional[int] = None
+    installations: Tuple[Tuple[str, str], ...] = ()
+
+    @classmethod
+    def for_host(cls, host: str, settings: Optional[Dict] = None) -> 'HostSettings':
+        """
+        Build the settings of ``host`` from its config.yaml mapping.
+
+        Raises:
+            ValueError: listing every problem found
+        """
+        settings = settings or {}
+        if not isinstance(settings, dict):
+            raise ValueError("settings must be a mapping")
+
+        problems = []
+        api_url = (settings.get('apiUrl') or default_api_url(host)).rstrip('/')
+        if not urlsplit(api_url).hostname:
+            problems.append(f"invalid 'apiUrl' '{api_url}'")
+        auth = settings.get('auth', 'pat')
+        if auth not in ('pat', 'app'):
+            problems.append("'auth' must be 'pat' or 'app'")
+        installations = []
+        for owner, value in (settings.get('installations') or {}).items():
+            try:
+                installations.append((str(owner), parse_installation_id(value)))
+            except ValueError as e:
+                problems.append(f"owner '{owner}': {e}")
+
+        concurrency = _positive_int(settings, 'concurrency', problems)
+        pool_size = _positive_int(settings, 'poolSize', problems)
+        timeout = _positive_int(settings, 'timeout', problems)
+        if problems:
+            raise ValueError('; '.join(problems))
+
+        return cls(
+            host=host,
+            api_url=api_url,
+            auth=auth,
+            secret_dir=settings.get('secretDir') or os.path.join(SECRET_ROOT, host),
+            concurrency=concurrency,
+            pool_size=pool_size,
+            timeout=timeout,
+            installations=tuple(installations),
+        )
+
+    @property
+    def api_host(self) -> str:
+        """Host name the API calls go to (the circuit breaker key)."""
+        return urlsplit(self.api_url).hostname or self.host
+
+    def client_options(self) -> Dict:
+        """Keyword arguments for Github() beyond the token."""
+        options: Dict[str, Any] = {}
+        if self.api_url != DEFAULT_API_URL:
+            options['base_url'] = self.api_url
+        if self.timeout:
+            options['timeout'] = self.timeout
+        if self.pool_size or (self.concurrency or 0) > 10:
+            # requests keeps 10 connections per pool by default
+            options['pool_size'] = max(self.pool_size or 0, self.concurrency or 0)
+        return options
+
+    def read_secret(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.secret_dir, name), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+
+def parse_hosts(config_data: Dict) -> Dict[str, HostSettings]:
+    """
+    Parse the ``github.hosts`` section of config.yaml.
+
+    Raises:
+        ValueError: listing every invalid host
+    """
+    hosts = (config_data.get('github') or {}).get('hosts') or {}
+    if not isinstance(hosts, dict):
+        raise ValueError("'github.hosts' must be a mapping of host name to settings")
+
+    parsed = {}
+    problems = []
+    for host, settings in hosts.items():
+        host = str(host).lower()
+        try:
+            parsed[host] = HostSettings.for_host(host, settings)
+        except ValueError as e:
+            problems.append(f"host '{host}': {e}")
+    if problems:
+        raise ValueError('; '.join(problems))
+    return parsed
+
+
+class RateLimits:
+    """Remaining REST quota per lane (token), taken from response headers."""
+
+    def __init__(self, floor: int = 0, clock: Callable[[], float] = time.time):
+        self.floor = floor
+        self._clock = clock
+        self._lock = threading.Lock()
+        # lane -> (remaining, limit, reset epoch seconds)
+        self.lanes: Dict[str, Tuple[int, int, float]] = {}
+
+    def observe(self, lane: str, headers) -> None:
+        if not isinstance(headers, dict):
+            return
+        values = {key.lower(): value for key, value in headers.items()}
+        try:
+            remaining = int(values['x-ratelimit-remaining'])
+            limit = int(values['x-ratelimit-limit'])
+            reset = float(values.get('x-ratelimit-reset', 0))
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self.lanes[lane] = (remaining, limit, reset)
+
+    def blocked_for(self, lane: str) -> float:
+        """Seconds until the lane's quota resets if it is down to the floor, else 0."""
+        with self._lock:
+            state = self.lanes.get(lane)
+        if state is None or state[0] > self.floor:
+            return 0.0
+        return max(0.0, state[2] - self._clock())
+
+
+class GitHubEndpoint:
+    """
+    The API endpoint of one host: its credentials, clients and quota.
+
+    With GitHub App authentication each installation gets its own token
+    (from ``tokens``) and client; otherwise a single token is used.
+    """
+
+    def __init__(self, settings: HostSettings, make_client: Callable[[str], Github],
+                 token: Optional[str] = None, tokens: Optional[TokenPool] = None,
+                 installations: Optional[InstallationMap] = None, rate_limit_floor: int = 0):
+        self.settings = settings
+        self._make_client = make_client
+        self._token = token
+        self.tokens = tokens
+        self.installations = installations or InstallationMap()
+        self.rate_limits = RateLimits(rate_limit_floor)
+        self._lock = threading.Lock()
+        # installation id ('' for a single token) -> (token, client built with it)
+        self._clients: Dict[str, Tuple[str, Github]] = {}
+
+    def seed(self, installation_id: Optional[str], token: str, github: Github) -> None:
+        """Register an already built client for a token."""
+        with self._lock:
+            self._clients[installation_id or ''] = (token, github)
+
+    def installation_for(self, owner: str, repo: str) -> Optional[str]:
+        if self.tokens is None:
+            return None
+        return self.installations.resolve(owner, repo)
+
+    def lane(self, owner: str, repo: str) -> str:
+        """Key of the quota a repository's lookups consume."""
+        return f"{self.settings.host}/{self.installation_for(owner, repo) or ''}"
+
+    def client_for(self, owner: str, repo: str) -> Github:
+        """Return the client for a repository, rebuilding it when its token was refreshed."""
+        installation_id = self.installation_for(owner, repo)
+        token = self.tokens.get(installation_id) if self.tokens is not None and installation_id else self._token
+        if not token:
+            raise ValueError(f"no GitHub credentials for {self.settings.host}")
+        key = installation_id or ''
+        with self._lock:
+            cached = self._clients.get(key)
+            if cached is not None and cached[0] == token:
+                return cached[1]
+            github = self._make_client(token)
+            self._clients[key] = (token, github)
+            return github
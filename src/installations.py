@@ -0,0 +1,142 @@
+"""
+GitHub App installations and their access tokens.
+
+A GitHub App installed in several organisations has one installation per
+organisation, and each installation token carries its own rate limit. The
+poller maps every repository to an installation (per repository, per owner,
+or the default GITHUB_INSTALLATION_ID) and keeps a pool of installation
+tokens that are cached and refreshed independently shortly before they expire.
+
+Mapping in config.yaml::
+
+    github:
+      installations:
+        my-org: 12345678        # owner -> installation id
+    repositories:
+      - name: special
+        url: https://github.com/other-org/special
+        installationId: 87654321   # per-repository override
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class InstallationToken:
+    """An installation access token and its expiry (epoch seconds)."""
+    token: str
+    expires_at: float
+
+
+def parse_expires_at(value: str) -> float:
+    """Parse GitHub's ``expires_at`` (e.g. 2024-01-01T00:00:00Z) into epoch seconds."""
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_installation_id(value) -> str:
+    """
+    Normalise an installation id from config.yaml.
+
+    Raises:
+        ValueError: if the value is not a positive integer
+    """
+    if isinstance(value, bool) or not str(value).strip().isdigit() or int(value) <= 0:
+        raise ValueError(f"invalid installation id '{value}'")
+    return str(int(value))
+
+
+class TokenPool:
+    """
+    Per-installation token cache.
+
+    Tokens are re-issued ``refresh_margin`` seconds before they expire. Each
+    installation has its own lock, so refreshing one installation's token
+    never blocks lookups using another's.
+    """
+
+    def __init__(self, issue: Callable[[str], InstallationToken], refresh_margin: float = 300,
+                 clock: Callable[[], float] = time.time):
+        self._issue = issue
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._tokens: Dict[str, InstallationToken] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+
+    def put(self, installation_id: str, token: InstallationToken) -> None:
+        with self._lock:
+            self._tokens[installation_id] = token
+
+    def _installation_lock(self, installation_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(installation_id, threading.Lock())
+
+    def get(self, installation_id: str) -> str:
+        """Return a valid token for the installation, issuing a new one if needed."""
+        with self._installation_lock(installation_id):
+            cached = self._tokens.get(installation_id)
+            if cached is not None and cached.expires_at - self._clock() > self.refresh_margin:
+                return cached.token
+            issued = self._issue(installation_id)
+            self.issued += 1
+            self.put(installation_id, issued)
+            return issued.token
+
+
+class InstallationMap:
+    """Resolves the installation a repository belongs to."""
+
+    def __init__(self, default: Optional[str] = None, owners: Optional[Dict[str, str]] = None,
+                 repositories: Optional[Dict[Tuple[str, str], str]] = None):
+        self.default = default
+        # Keys are lower-cased: GitHub owner and repository names are case-insensitive
+        self.owners = {owner.lower(): iid for owner, iid in (owners or {}).items()}
+        self.repositories = repositories or {}
+
+    @classmethod
+    def from_config(cls, config_data: Dict, repositories: Iterable,
+                    default: Optional[str] = None) -> 'InstallationMap':
+        """
+        Build the map from the ``github.installations`` section and the
+        repositories' ``installationId``.
+
+        Raises:
+            ValueError: if an owner mapping is invalid
+        """
+        settings = (config_data.get('github') or {}).get('installations') or {}
+        if not isinstance(settings, dict):
+            raise ValueError("'github.installations' must be a mapping of owner to installation id")
+
+        owners = {}
+        problems = []
+        for owner, value in settings.items():
+            try:
+                owners[str(owner)] = parse_installation_id(value)
+            except ValueError as e:
+                problems.append(f"owner '{owner}': {e}")
+        if problems:
+            raise ValueError('; '.join(problems))
+        return cls.for_repositories(owners, repositories, default)
+
+    @classmethod
+    def for_repositories(cls, owners: Dict[str, str], repositories: Iterable,
+                         default: Optional[str] = None) -> 'InstallationMap':
+        """Combine owner mappings with the repositories' own ``installationId``."""
+        by_repository = {
+            (repo.owner.lower(), repo.repo.lower()): repo.installation_id
+            for repo in repositories if repo.installation_id
+        }
+        return cls(default, owners, by_repository)
+
+    def resolve(self, owner: str, repo: str) -> Optional[str]:
+        owner, repo = owner.lower(), repo.lower()
+        return self.repositories.get((owner, repo)) or self.owners.get(owner) or self.default
+
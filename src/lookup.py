@@ -0,0 +1,93 @@
+"""
+Per-cycle branch head lookups.
+
+Entries that watch the same repository and branch (for example one running a
+build pipeline and another a security scan) share a single head lookup per
+polling cycle; the result is fanned out to every subscribed entry. Entries
+watching tags under the same prefix likewise share one tag listing.
+
+Lookups can be started ahead in the background, one lane per rate-limit
+quota (GitHub App installation): lanes run in parallel, lookups within a lane
+run in order with bounded concurrency.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Union
+
+from models import HeadKey, RepositoryConfig
+from tags import TagListing
+
+# Result of a lookup: the head SHA, the tag listing for entries watching tags, or None on failure
+Head = Union[str, TagListing, None]
+
+
+def group_by_head(repositories: List[RepositoryConfig]) -> Dict[HeadKey, List[RepositoryConfig]]:
+    """Group entries by normalised (host, owner, repo, ref), keeping config order."""
+    groups: Dict[HeadKey, List[RepositoryConfig]] = {}
+    for repo in repositories:
+        groups.setdefault(repo.head_key, []).append(repo)
+    return groups
+
+
+class HeadLookup:
+    """Fetches each distinct head at most once per cycle."""
+
+    def __init__(self, fetch: Callable[[RepositoryConfig], Head]):
+        self._fetch = fetch
+        self._heads: Dict[HeadKey, Head] = {}
+        self._pending: Dict[HeadKey, Future] = {}
+        self._executors: List[ThreadPoolExecutor] = []
+        self.fetches = 0
+        self.shared = 0
+
+    def prefetch(self, repos: List[RepositoryConfig], lane: Callable[[RepositoryConfig], str],
+                 concurrency: Union[int, Callable[[str], int]] = 1, should_stop: Callable[[], bool] = lambda: False) -> None:
+        """
+        Start fetching the heads of ``repos`` in the background.
+
+        Args:
+            repos: One entry per head to fetch, in the order they will be resolved
+            lane: Returns the lane (quota) an entry's lookup belongs to
+            concurrency: Lookups running at the same time within one lane
+                (or a function returning it for a lane)
+            should_stop: Checked before each lookup; remaining lookups are skipped once True
+        """
+        executors: Dict[str, ThreadPoolExecutor] = {}
+        for repo in repos:
+            key = repo.head_key
+            if key in self._heads or key in self._pending:
+                continue
+            name = lane(repo)
+            if name not in executors:
+                workers = concurrency(name) if callable(concurrency) else concurrency
+                executors[name] = ThreadPoolExecutor(max_workers=workers,
+                                                     thread_name_prefix=f"lookup-{name or 'default'}")
+            self._pending[key] = executors[name].submit(self._fetch_unless, repo, should_stop)
+        self._executors.extend(executors.values())
+
+    def _fetch_unless(self, repo: RepositoryConfig, should_stop: Callable[[], bool]) -> Head:
+        if should_stop():
+            return None
+        return self._fetch(repo)
+
+    def close(self) -> None:
+        """Cancel lookups that have not started yet."""
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = []
+
+    def resolve(self, repo: RepositoryConfig) -> Head:
+        """
+        Return the head SHA for the entry's ref (the tag listing for entries watching tags).
+
+        A failed lookup (None) is remembered too, so the other subscribers
+        do not retry it within the same cycle.
+        """
+        key = repo.head_key
+        if key in self._heads:
+            self.shared += 1
+            return self._heads[key]
+        self.fetches += 1
+        pending = self._pending.pop(key, None)
+        head = self._heads[key] = pending.result() if pending is not None else self._fetch(repo)
+        return head
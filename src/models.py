@@ -0,0 +1,239 @@
+"""
+Typed repository configuration.
+
+Repository entries from config.yaml are validated and parsed once into
+immutable RepositoryConfig objects with defaults applied and the URL already
+split into host/owner/name.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from installations import parse_installation_id
+from retention import RetentionRule, parse_rule
+from tags import TagFilter, parse_tag_filter
+from templates import PipelineRunTemplate, compile_template
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BRANCH = 'main'
+DEFAULT_HOST = 'github.com'
+
+WATCH_BRANCH = 'branch'
+WATCH_TAGS = 'tags'
+WATCH_MODES = (WATCH_BRANCH, WATCH_TAGS)
+
+# Normalised (host, owner, repo, ref) identifying a branch head on GitHub
+HeadKey = Tuple[str, str, str, str]
+
+
+class ConfigError(ValueError):
+    """Raised when a repository URL or entry cannot be parsed."""
+
+
+def parse_repo_url(repo_url: str) -> Tuple[str, str, str]:
+    """
+    Split a repository URL into (host, owner, name).
+
+    Accepts https URLs (with or without a trailing '.git' or '/') and
+    scp-style SSH URLs such as git@github.com:owner/repo.git.
+    """
+    url = repo_url.strip()
+    if '://' not in url and '@' in url and ':' in url:
+        # git@host:owner/repo.git
+        host_part, path = url.split('@', 1)[1].split(':', 1)
+        host = host_part
+    else:
+        parts = urlsplit(url if '://' in url else f"https://{url}")
+        host = parts.hostname or ''
+        if parts.port:
+            host = f"{host}:{parts.port}"
+        path = parts.path
+
+    segments = [segment for segment in path.split('/') if segment]
+    if not host or len(segments) < 2:
+        raise ConfigError(f"cannot parse owner/repository from URL '{repo_url}'")
+
+    owner, name = segments[-2], segments[-1]
+    if name.endswith('.git'):
+        name = name[:-4]
+    if not owner or not name:
+        raise ConfigError(f"cannot parse owner/repository from URL '{repo_url}'")
+    return host.lower(), owner, name
+
+
+@dataclass(frozen=True, slots=True)
+class RepositoryConfig:
+    """
+    A validated repository entry.
+
+    ``name`` is unique within the config and is the entry's identity key
+    (backlog entries and PipelineRun labels refer to it). ``raw`` is the
+    original config.yaml mapping, which still holds the persisted state.
+    """
+    name: str
+    url: str
+    host: str
+    owner: str
+    repo: str
+    branch: str
+    pipeline: str
+    priority: int
+    template: PipelineRunTemplate
+    raw: Dict = field(compare=False, repr=False)
+    retention: Optional[RetentionRule] = None
+    installation_id: Optional[str] = None
+    # Set for entries that watch tags (``watch: tags``) instead of the branch head
+    tags: Optional[TagFilter] = None
+
+    @property
+    def key(self) -> str:
+        return self.name
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.repo}"
+
+    @property
+    def head_key(self) -> HeadKey:
+        # GitHub owner and repository names are case-insensitive; refs are not
+        ref = self.branch if self.tags is None else f"refs/tags/{self.tags.prefix}"
+        return (self.host, self.owner.lower(), self.repo.lower(), ref)
+
+
+def _validate_list_of_mappings(value, label: str, required: Tuple[str, ...]) -> List[str]:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        return [f"'{label}' must be a list"]
+    problems = []
+    for index, item in enumerate(value):
+        if not isinstance(item, dict):
+            problems.append(f"{label}[{index}] must be a mapping")
+            continue
+        for key in required:
+            if not item.get(key):
+                problems.append(f"{label}[{index}] has no '{key}'")
+    return problems
+
+
+def parse_repository(entry: Dict) -> RepositoryConfig:
+    """
+    Validate a single repository entry and build its RepositoryConfig.
+
+    Raises:
+        ConfigError: listing every problem found in the entry
+    """
+    if not isinstance(entry, dict):
+        raise ConfigError("entry must be a mapping")
+
+    problems = []
+    name = entry.get('name') or ''
+    if not name or not isinstance(name, str):
+        problems.append("missing 'name'")
+
+    host = owner = repo = ''
+    repo_url = entry.get('url')
+    if not repo_url or not isinstance(repo_url, str):
+        problems.append("missing 'url'")
+    else:
+        try:
+            host, owner, repo = parse_repo_url(repo_url)
+        except ConfigError as e:
+            problems.append(str(e))
+
+    branch = entry.get('branch') or DEFAULT_BRANCH
+    if not isinstance(branch, str):
+        problems.append("'branch' must be a string")
+
+    watch = entry.get('watch', WATCH_BRANCH)
+    if watch not in WATCH_MODES:
+        problems.append(f"'watch' must be one of: {', '.join(WATCH_MODES)}")
+
+    tags = None
+    if watch == WATCH_TAGS:
+        try:
+            tags = parse_tag_filter(entry.get('tags'))
+        except ValueError as e:
+            problems.append(f"tags: {e}")
+    elif entry.get('tags') is not None:
+        problems.append("'tags' requires 'watch: tags'")
+
+    pipeline = entry.get('pipeline') or ''
+    if not pipeline or not isinstance(pipeline, str):
+        problems.append("missing 'pipeline'")
+
+    priority = entry.get('priority', 0)
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        problems.append("'priority' must be an integer")
+
+    problems.extend(_validate_list_of_mappings(entry.get('params'), 'params', ('name',)))
+    problems.extend(_validate_list_of_mappings(entry.get('workspaces'), 'workspaces', ('name', 'claimName')))
+
+    installation_id = None
+    if entry.get('installationId') is not None:
+        try:
+            installation_id = parse_installation_id(entry['installationId'])
+        except ValueError as e:
+            problems.append(str(e))
+
+    retention = None
+    if entry.get('retention') is not None:
+        try:
+            retention = parse_rule(entry['retention'])
+        except ValueError as e:
+            problems.append(f"retention: {e}")
+
+    if problems:
+        raise ConfigError('; '.join(problems))
+
+    template = compile_template(entry)
+    if template.unknown_placeholders:
+        # Left in the value literally (e.g. ${HOME} meant for the pipeline), but likely a typo
+        placeholders = ', '.join(f"${{{p}}}" for p in template.unknown_placeholders)
+        logger.warning(f"repository '{name}': unknown placeholders kept as literal text: {placeholders}")
+
+    return RepositoryConfig(
+        name=name,
+        url=f"https://{host}/{owner}/{repo}",
+        host=host,
+        owner=owner,
+        repo=repo,
+        branch=branch,
+        pipeline=pipeline,
+        priority=priority,
+        template=template,
+        raw=entry,
+        retention=retention,
+        installation_id=installation_id,
+        tags=tags,
+    )
+
+
+def parse_repositories(entries: List[Dict]) -> Tuple[List[RepositoryConfig], List[str]]:
+    """
+    Parse all repository entries, collecting every problem in one pass.
+
+    Returns:
+        (valid repositories, error messages for the rejected entries)
+    """
+    repositories: List[RepositoryConfig] = []
+    errors: List[str] = []
+    seen = set()
+
+    for index, entry in enumerate(entries):
+        label = entry.get('name') if isinstance(entry, dict) and entry.get('name') else f"#{index}"
+        try:
+            repository = parse_repository(entry)
+        except ConfigError as e:
+            errors.append(f"repository '{label}': {e}")
+            continue
+        if repository.name in seen:
+            errors.append(f"repository '{label}': duplicate name")
+            continue
+        seen.add(repository.name)
+        repositories.append(repository)
+
+    return repositories, errors
@@ -4,19 +4,54 @@ GitHub Repository Poller for Kubernetes
 Monitors GitHub repositories and triggers Tekton pipelines on changes.
 """
 
+import argparse
 import os
+import signal
 import sys
+import threading
 import logging
 import yaml
 import time
 import jwt
 import requests
-from datetime import datetime
-from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
 from github import Github, GithubException
 from kubernetes import client, config
 from kubernetes.client.rest import ApiException
 
+import cassette
+import codec
+from admission import TriggerAdmission, count_running
+from tekton import (
+    BATCH_LABEL, COMMIT_LABEL, PIPELINERUN_PLURAL, REPOSITORY_LABEL, TEKTON_GROUP, TEKTON_VERSION,
+    PIPELINE_PLURAL, list_pipelineruns, list_tekton_objects, pipelinerun_name,
+)
+from batching import TriggerBatcher, batch_params, parse_windows
+from budget import Checkpointer, CycleBudget
+import history
+from hints import Hint, HintQueue, HintServer, checked_within
+from hosts import DEFAULT_API_URL, GitHubEndpoint, HostSettings, parse_hosts
+from installations import InstallationMap, InstallationToken, TokenPool, parse_expires_at
+from lookup import Head, HeadLookup, group_by_head
+from models import DEFAULT_BRANCH, DEFAULT_HOST, RepositoryConfig, parse_repo_url, parse_repositories
+from profiling import (
+    PHASE_CONFIGMAP_READ, PHASE_CONFIGMAP_WRITE, PHASE_HEAD_LOOKUP, PHASE_PIPELINERUN_CREATE,
+    PHASE_DECODE, PHASE_ENCODE, PHASE_RETENTION, PHASE_TOKEN, PhaseTimer, profile,
+)
+from resilience import (
+    KUBERNETES_CLAIMS, KUBERNETES_CONFIGMAPS, KUBERNETES_PIPELINERUNS, KUBERNETES_PIPELINES,
+    KUBERNETES_SERVICE_ACCOUNTS, CircuitOpenError, Resilience,
+)
+from retention import Pruner, RetentionPolicy, collect_expired
+from shadow import PRIMARY, SHADOW, ShadowDetector, parse_shadow
+from tags import Tag, TagFilter, TagListing, fetch_matching_tags, newer_than, parse_version, peel
+from templates import commit_variables, compile_template, expand, repo_variables
+from transport import RequestTiming, Transport
+from validation import KIND_PIPELINE, KIND_SERVICE_ACCOUNT, PipelineRunValidator
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,19 +68,71 @@ class GitHubPoller:
         self.namespace = os.getenv('NAMESPACE', 'github-poller')
         self.configmap_name = os.getenv('CONFIGMAP_NAME', 'github-poller-config')
         self.auth_type = os.getenv('GITHUB_AUTH_TYPE', 'app').lower()
-        self.github_token = self._get_github_token()
+        # 'embedded' keeps lastCheckedSHA etc. in config.yaml, 'json' in a separate state.json key
+        self.state_format = os.getenv('STATE_FORMAT', 'embedded').lower()
+        if self.state_format not in ('embedded', 'json'):
+            raise ValueError(f"Invalid STATE_FORMAT: {self.state_format}")
+        # Set when config.yaml still holds state that must be moved to state.json
+        self._migrate_state = False
+        # Hints received in daemon mode (None when the hint receiver is off)
+        self.hint_queue: Optional[HintQueue] = None
+        # Time spent per phase, logged at the end of run()
+        self.timings = PhaseTimer()
+        # ETag to send per tag listing (head key) in the current cycle
+        self._tag_etags: Dict = {}
+        # Retries, backoff and circuit breaking shared by all outbound calls
+        self.resilience = Resilience.from_env()
+        # One keep-alive pool, timeout policy and timing hook for every GitHub request
+        self.transport = Transport.from_env()
+        self.transport.install()
+        # Per-cycle counters, appended to the run history when HISTORY_PATH is set
+        self.recorder = history.CycleRecorder()
+        self.history = history.HistoryStore.from_env()
+        # Secondary head detection compared with the primary (the 'shadow' config section)
+        self.shadow: Optional[ShadowDetector] = None
+        self.transport.add_hook(self._on_github_response)
+        # GitHub App credentials (app id, private key); None with a PAT
+        self._app_credentials: Optional[Tuple[str, str]] = None
+        self.tokens = TokenPool(self._issue_installation_token)
+        # Installation of GITHUB_INSTALLATION_ID, used for unmapped github.com repositories
+        self.default_installation: Optional[str] = None
+        with self.timings.phase(PHASE_TOKEN):
+            self.github_token = self._get_github_token()
         
         # Initialize Kubernetes client
+        self._load_kubernetes_config()
+        
+        self.k8s_core_client = client.CoreV1Api()
+        self.k8s_custom_client = client.CustomObjectsApi()
+        # Retries are handled by self.resilience, not inside PyGithub
+        self.github_client = Github(self.github_token, retry=None, timeout=self.transport.read_timeout)
+        # API endpoint per GitHub host; github.com uses the credentials above
+        self.endpoints: Dict[str, GitHubEndpoint] = {
+            DEFAULT_HOST: self._create_endpoint(HostSettings.for_host(DEFAULT_HOST))
+        }
+        
+    def _on_github_response(self, timing: RequestTiming) -> None:
+        """Count a GitHub response for the run history and shadow detection."""
+        self.recorder.on_request(timing)
+        if self.shadow is not None:
+            self.shadow.on_request(timing)
+    
+    def _load_kubernetes_config(self) -> None:
+        """Load in-cluster or local kubeconfig (or the recorded API server when replaying)."""
+        if cassette.replaying():
+            cassette.configure_kubernetes()
+            return
+        
         try:
             config.load_incluster_config()
         except config.ConfigException:
             # Fallback to local kubeconfig for development
             config.load_kube_config()
         
-        self.k8s_core_client = client.CoreV1Api()
-        self.k8s_custom_client = client.CustomObjectsApi()
-        self.github_client = Github(self.github_token)
-        
+        recording = cassette.active_cassette()
+        if recording is not None:
+            recording.metadata['kubernetesHost'] = client.Configuration.get_default_copy().host
+    
     def _get_github_token(self) -> str:
         """
         Get GitHub token (supports both PAT and GitHub Apps).
@@ -89,7 +176,20 @@ class GitHubPoller:
         jwt_token = self._generate_jwt(app_id, private_key)
         
         # Fetch installation token
-        return self._fetch_installation_token(installation_id, jwt_token)
+        issued = self._fetch_installation_token(installation_id, jwt_token)
+        
+        # Tokens of other installations are issued on demand with the same credentials
+        self._app_credentials = (app_id, private_key)
+        self.default_installation = installation_id
+        self.tokens.put(installation_id, issued)
+        return issued.token
+    
+    def _issue_installation_token(self, installation_id: str) -> InstallationToken:
+        """Issue a token for any installation of the App (used by the token pool)."""
+        if self._app_credentials is None:
+            raise ValueError("GitHub App credentials are not available")
+        app_id, private_key = self._app_credentials
+        return self._fetch_installation_token(installation_id, self._generate_jwt(app_id, private_key))
     
     def _read_secret(self, filename: str, env_var: str) -> str:
         """Read secret from file or environment variable."""
@@ -117,84 +217,251 @@ class GitHubPoller:
         
         return jwt_token
     
-    def _fetch_installation_token(self, installation_id: str, jwt_token: str) -> str:
+    def _fetch_installation_token(self, installation_id: str, jwt_token: str,
+                                  api_url: str = DEFAULT_API_URL) -> InstallationToken:
         """Fetch installation access token from GitHub API."""
-        url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
+        url = f"{api_url}/app/installations/{installation_id}/access_tokens"
         headers = {
             'Authorization': f'Bearer {jwt_token}',
             'Accept': 'application/vnd.github+json',
             'X-GitHub-Api-Version': '2022-11-28'
         }
         
-        try:
-            response = requests.post(url, headers=headers, timeout=10)
+        def fetch() -> requests.Response:
+            response = self.transport.post(url, headers=headers)
             response.raise_for_status()
+            return response
+        
+        try:
+            response = self.resilience.call(urlsplit(api_url).hostname, fetch)
             
             token_data = response.json()
             token = token_data['token']
             expires_at = token_data['expires_at']
             
             logger.info(f"Installation token acquired for installation {installation_id}, expires at {expires_at}")
-            return token
+            return InstallationToken(token, parse_expires_at(expires_at))
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
             logger.error(f"Failed to fetch installation token: {e}")
             raise
     
     def get_configmap(self) -> Dict:
         """Retrieve the ConfigMap containing repository configurations."""
         try:
-            configmap = self.k8s_core_client.read_namespaced_config_map(
-                name=self.configmap_name,
-                namespace=self.namespace
-            )
-            data = configmap.data.get('config.yaml', '{}')
-            return yaml.safe_load(data)
-        except ApiException as e:
+            with self.timings.phase(PHASE_CONFIGMAP_READ):
+                configmap = self.resilience.call(
+                    KUBERNETES_CONFIGMAPS,
+                    self.k8s_core_client.read_namespaced_config_map,
+                    name=self.configmap_name,
+                    namespace=self.namespace
+                )
+            data = configmap.data or {}
+            with self.timings.phase(PHASE_DECODE):
+                config_data = codec.load_yaml(data.get(codec.CONFIG_KEY, '{}')) or {}
+                # State kept in the other format (after STATE_FORMAT was switched) is moved on the next save
+                if self.state_format == 'json':
+                    self._migrate_state = codec.has_embedded_state(config_data)
+                else:
+                    self._migrate_state = codec.STATE_KEY in data
+                if data.get(codec.STATE_KEY):
+                    codec.merge_state(config_data, codec.load_state(data[codec.STATE_KEY]))
+                return config_data
+        except (ApiException, CircuitOpenError) as e:
+            # run() exits on it; the daemon skips the cycle and tries again on the next one
             logger.error(f"Failed to read ConfigMap: {e}")
-            sys.exit(1)
+            raise
+    
+    def _encode_configmap(self, config_data: Dict) -> Dict[str, str]:
+        """Serialise config_data into the ConfigMap keys that need rewriting."""
+        if self.state_format != 'json':
+            return {codec.CONFIG_KEY: codec.dump_yaml(config_data)}
+        config_only, state = codec.split_state(config_data)
+        encoded = {codec.STATE_KEY: codec.dump_state(state)}
+        # config.yaml is left untouched unless state embedded in it has to be removed
+        if self._migrate_state:
+            encoded[codec.CONFIG_KEY] = codec.dump_yaml(config_only)
+        return encoded
     
     def update_configmap(self, config_data: Dict) -> None:
-        """Update the ConfigMap with new SHA values."""
-        try:
+        """
+        Update the ConfigMap with new SHA values.
+        
+        Transient API errors and update conflicts (409) are retried with a
+        fresh read of the ConfigMap.
+        """
+        with self.timings.phase(PHASE_ENCODE):
+            encoded = self._encode_configmap(config_data)
+        
+        def read_and_replace() -> None:
             configmap = self.k8s_core_client.read_namespaced_config_map(
                 name=self.configmap_name,
                 namespace=self.namespace
             )
-            configmap.data['config.yaml'] = yaml.dump(config_data)
+            configmap.data = configmap.data or {}
+            configmap.data.update(encoded)
+            if self._migrate_state and codec.STATE_KEY not in encoded:
+                configmap.data.pop(codec.STATE_KEY, None)
             self.k8s_core_client.replace_namespaced_config_map(
                 name=self.configmap_name,
                 namespace=self.namespace,
                 body=configmap
             )
+        
+        try:
+            with self.timings.phase(PHASE_CONFIGMAP_WRITE):
+                self.resilience.call(KUBERNETES_CONFIGMAPS, read_and_replace, retry_statuses=(409,))
+            if self._migrate_state and codec.CONFIG_KEY in encoded:
+                source, target = ((codec.CONFIG_KEY, codec.STATE_KEY) if self.state_format == 'json'
+                                  else (codec.STATE_KEY, codec.CONFIG_KEY))
+                logger.info(f"Moved state from {source} to {target}")
+                self._migrate_state = False
             logger.info(f"Updated ConfigMap: {self.configmap_name}")
-        except ApiException as e:
+        except (ApiException, CircuitOpenError) as e:
             logger.error(f"Failed to update ConfigMap: {e}")
             raise
     
-    def get_latest_commit_sha(self, repo_url: str, branch: str) -> Optional[str]:
+    def _create_endpoint(self, settings: HostSettings) -> GitHubEndpoint:
+        """
+        Build the API endpoint of a GitHub host with its own credentials.
+        
+        Raises:
+            ValueError: if the host's credentials are missing
+        """
+        floor = int(os.getenv('GITHUB_RATE_LIMIT_FLOOR', '50'))
+        
+        def make_client(token: str) -> Github:
+            # Retries are handled by self.resilience, not inside PyGithub
+            options = {'timeout': self.transport.read_timeout, **settings.client_options()}
+            return Github(token, retry=None, **options)
+        
+        if settings.host == DEFAULT_HOST:
+            tokens = self.tokens if self._app_credentials else None
+            endpoint = GitHubEndpoint(settings, make_client, token=self.github_token, tokens=tokens,
+                                      installations=InstallationMap(default=self.default_installation),
+                                      rate_limit_floor=floor)
+            if not settings.client_options():
+                endpoint.seed(self.default_installation if tokens else None,
+                              self.github_token, self.github_client)
+            return endpoint
+        
+        if settings.auth == 'app':
+            app_id = settings.read_secret('app-id')
+            private_key = settings.read_secret('private-key')
+            installation_id = settings.read_secret('installation-id')
+            if not (app_id and private_key and installation_id):
+                raise ValueError(f"GitHub App credentials (app-id, private-key, installation-id) "
+                                 f"not found in {settings.secret_dir}")
+            tokens = TokenPool(lambda iid: self._fetch_installation_token(
+                iid, self._generate_jwt(app_id, private_key), settings.api_url
+            ))
+            return GitHubEndpoint(settings, make_client, tokens=tokens,
+                                  installations=InstallationMap(default=installation_id),
+                                  rate_limit_floor=floor)
+        
+        token = settings.read_secret('github-token')
+        if not token:
+            raise ValueError(f"token not found in {settings.secret_dir}/github-token")
+        return GitHubEndpoint(settings, make_client, token=token, rate_limit_floor=floor)
+    
+    def _configure_endpoints(self, config_data: Dict, repositories: List[RepositoryConfig]) -> None:
+        """Create or update the endpoint of every host the repositories live on."""
+        try:
+            configured = parse_hosts(config_data)
+        except ValueError as e:
+            logger.error(f"Invalid GitHub host settings, using defaults: {e}")
+            configured = {}
+        
+        by_host: Dict[str, List[RepositoryConfig]] = {DEFAULT_HOST: []}
+        for repo in repositories:
+            by_host.setdefault(repo.host, []).append(repo)
+        
+        for host, hosted in by_host.items():
+            settings = configured.get(host) or HostSettings.for_host(host)
+            endpoint = self.endpoints.get(host)
+            if endpoint is None or endpoint.settings != settings:
+                try:
+                    endpoint = self.endpoints[host] = self._create_endpoint(settings)
+                except ValueError as e:
+                    logger.error(f"Cannot poll {len(hosted)} repositories on {host}: {e}")
+                    self.endpoints.pop(host, None)
+                    continue
+                logger.info(f"GitHub host {host}: API {settings.api_url}")
+            
+            default = endpoint.installations.default
+            if host == DEFAULT_HOST:
+                try:
+                    endpoint.installations = InstallationMap.from_config(config_data, hosted, default)
+                except ValueError as e:
+                    logger.error(f"Invalid GitHub App installation mapping, using the default installation: {e}")
+            else:
+                endpoint.installations = InstallationMap.for_repositories(
+                    dict(settings.installations), hosted, default
+                )
+    
+    def _endpoint(self, host: str) -> GitHubEndpoint:
+        endpoint = self.endpoints.get(host)
+        if endpoint is None:
+            raise ValueError(f"no API endpoint available for {host}")
+        return endpoint
+    
+    def github_for(self, owner: str, repo: str, host: str = DEFAULT_HOST) -> Github:
+        """
+        Return the GitHub client for a repository.
+        
+        Each host has its own clients; with GitHub App authentication the
+        client uses the token of the repository's installation and is
+        rebuilt when that token is refreshed.
+        """
+        return self._endpoint(host).client_for(owner, repo)
+    
+    def _lookup_lane(self, repo: RepositoryConfig) -> str:
+        """Key of the quota a repository's lookups consume (host and installation)."""
+        endpoint = self.endpoints.get(repo.host)
+        return endpoint.lane(repo.owner, repo.repo) if endpoint else repo.host
+    
+    def _lane_concurrency(self, lane: str) -> int:
+        """Lookups running at the same time within a lane."""
+        endpoint = self.endpoints.get(lane.split('/', 1)[0])
+        if endpoint is not None and endpoint.settings.concurrency:
+            return endpoint.settings.concurrency
+        return int(os.getenv('GITHUB_INSTALLATION_CONCURRENCY', '1'))
+    
+    def get_latest_commit_sha(self, repo_url: str, branch: str,
+                              parsed: Optional[Tuple[str, str, str]] = None) -> Optional[str]:
         """
         Get the latest commit SHA for a repository branch using GitHub API.
         
         Args:
             repo_url: GitHub repository URL (e.g., https://github.com/org/repo)
             branch: Branch name
+            parsed: (host, owner, repo) of a RepositoryConfig; parsed from repo_url when omitted
             
         Returns:
             Latest commit SHA or None if error occurs
         """
         try:
-            # Extract owner/repo from URL
-            parts = repo_url.rstrip('/').split('/')
-            owner, repo_name = parts[-2], parts[-1]
-            if repo_name.endswith('.git'):
-                repo_name = repo_name[:-4]
+            host, owner, repo_name = parsed or parse_repo_url(repo_url)
+            full_name = f"{owner}/{repo_name}"
+            
+            endpoint = self._endpoint(host)
+            lane = endpoint.lane(owner, repo_name)
+            wait = endpoint.rate_limits.blocked_for(lane)
+            if wait:
+                logger.warning(f"Rate limit of {lane} nearly used up, skipping {full_name} "
+                               f"until it resets in {wait:.0f}s")
+                return None
+            github = endpoint.client_for(owner, repo_name)
             
-            repo = self.github_client.get_repo(f"{owner}/{repo_name}")
-            branch_obj = repo.get_branch(branch)
-            sha = branch_obj.commit.sha
+            def fetch() -> str:
+                repo = github.get_repo(full_name)
+                head = repo.get_branch(branch)
+                endpoint.rate_limits.observe(lane, head.raw_headers)
+                return head.commit.sha
             
-            logger.info(f"Retrieved SHA for {owner}/{repo_name}@{branch}: {sha[:7]}")
+            sha = self.resilience.call(endpoint.settings.api_host, fetch)
+            
+            logger.info(f"Retrieved SHA for {full_name}@{branch}: {sha[:7]}")
             return sha
             
         except GithubException as e:
@@ -204,7 +471,76 @@ class GitHubPoller:
             logger.error(f"Error getting commit SHA for {repo_url}@{branch}: {e}")
             return None
     
-    def _expand_placeholders(self, value: str, repo_config: Dict) -> str:
+    def _repository_request(self, repo: RepositoryConfig, resilient: bool = True):
+        """
+        GET function for raw API paths of a repository's host.
+        
+        Uses the repository's client (host and installation), observes its
+        rate limit lane and goes through self.resilience (unless
+        ``resilient`` is False, so failures do not count for the host's circuit).
+        """
+        endpoint = self._endpoint(repo.host)
+        lane = endpoint.lane(repo.owner, repo.repo)
+        requester = endpoint.client_for(repo.owner, repo.repo).get_repo(repo.full_name, lazy=True)._requester
+        
+        def request(url: str, parameters: Optional[Dict], headers: Dict):
+            def fetch():
+                response_headers, data = requester.requestJsonAndCheck('GET', url, parameters, headers)
+                endpoint.rate_limits.observe(lane, response_headers)
+                return response_headers, data
+            if not resilient:
+                return fetch()
+            return self.resilience.call(endpoint.settings.api_host, fetch)
+        
+        return request
+    
+    def get_matching_tags(self, repo: RepositoryConfig, tags: TagFilter,
+                          etag: Optional[str] = None) -> Optional[TagListing]:
+        """
+        List the tags under the prefix a tag-watching entry's pattern starts with.
+        
+        Args:
+            repo: Repository entry with ``watch: tags``
+            tags: The entry's tag filter
+            etag: ETag of the previous listing, for a conditional request
+            
+        Returns:
+            The listing, or None if an error occurs
+        """
+        try:
+            endpoint = self._endpoint(repo.host)
+            lane = endpoint.lane(repo.owner, repo.repo)
+            wait = endpoint.rate_limits.blocked_for(lane)
+            if wait:
+                logger.warning(f"Rate limit of {lane} nearly used up, skipping {repo.full_name} "
+                               f"until it resets in {wait:.0f}s")
+                return None
+            listing = fetch_matching_tags(self._repository_request(repo), f"/repos/{repo.full_name}",
+                                          tags.prefix, etag)
+            if listing.unchanged:
+                logger.info(f"Tags of {repo.full_name} matching '{tags.prefix}*' not modified")
+            else:
+                logger.info(f"Retrieved {len(listing.tags)} tags of {repo.full_name} "
+                            f"matching '{tags.prefix}*'")
+            return listing
+        
+        except GithubException as e:
+            logger.error(f"GitHub API error listing tags of {repo.url}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error listing tags of {repo.url}: {e}")
+            return None
+    
+    def _tag_commit(self, repo: RepositoryConfig, tag: Tag) -> Optional[str]:
+        """Commit SHA of a tag, or None if an annotated tag cannot be resolved."""
+        try:
+            return peel(self._repository_request(repo), f"/repos/{repo.full_name}", tag) or None
+        except Exception as e:
+            logger.error(f"Error resolving tag {tag.name} of {repo.url}: {e}")
+            return None
+    
+    def _expand_placeholders(self, value: str, repo_config: Dict,
+                             sha: str = '', previous_sha: str = '') -> str:
         """
         Expand placeholders in parameter values.
         
@@ -212,10 +548,15 @@ class GitHubPoller:
         - ${repo.url}: Repository URL
         - ${repo.branch}: Branch name
         - ${repo.name}: Repository name
+        - ${commit.sha}, ${commit.shortSha}: Commit that triggered the run
+        - ${previous.sha}, ${previous.shortSha}: Previously checked commit
+        - ${tag.name}, ${previous.tag}: New and previously handled tag (entries watching tags)
         
         Args:
             value: Value that may contain placeholders
             repo_config: Repository configuration
+            sha: Commit SHA being built
+            previous_sha: Previously recorded commit SHA
             
         Returns:
             Value with placeholders expanded
@@ -223,179 +564,713 @@ class GitHubPoller:
         if not isinstance(value, str):
             return value
         
-        replacements = {
-            '${repo.url}': repo_config.get('url', ''),
-            '${repo.branch}': repo_config.get('branch', 'main'),
-            '${repo.name}': repo_config.get('name', ''),
-        }
-        
-        result = value
-        for placeholder, replacement in replacements.items():
-            result = result.replace(placeholder, replacement)
-        
-        return result
+        variables = repo_variables(repo_config)
+        variables.update(commit_variables(sha, previous_sha))
+        return expand(value, variables)
     
-    def trigger_tekton_pipeline(self, repo_config: Dict) -> bool:
+    def trigger_tekton_pipeline(self, repo_config: Union[Dict, RepositoryConfig],
+                                sha: str = '', previous_sha: str = '',
+                                tag: str = '', previous_tag: str = '') -> bool:
         """
         Trigger a Tekton pipeline by creating a PipelineRun resource.
         
+        Parsed repositories carry a precompiled template; a raw config dict
+        is compiled on the fly.
+        
         Args:
             repo_config: Repository configuration containing pipeline details
+            sha: Commit SHA being built
+            previous_sha: Previously recorded commit SHA
+            tag: Tag being built (entries watching tags)
+            previous_tag: Previously handled tag
             
         Returns:
             True if pipeline was triggered successfully, False otherwise
         """
-        pipeline_name = repo_config.get('pipeline')
-        if not pipeline_name:
-            logger.error(f"No pipeline specified for repository: {repo_config.get('name')}")
-            return False
+        if isinstance(repo_config, RepositoryConfig):
+            template = repo_config.template
+        else:
+            if not repo_config.get('pipeline'):
+                logger.error(f"No pipeline specified for repository: {repo_config.get('name')}")
+                return False
+            template = compile_template(repo_config)
         
-        repo_name = repo_config.get('name', 'unknown')
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        pipelinerun_name = f"{pipeline_name}-{repo_name}-{timestamp}".lower()[:63]
-        
-        # Build PipelineRun spec
-        pipeline_run = {
-            "apiVersion": "tekton.dev/v1beta1",
-            "kind": "PipelineRun",
-            "metadata": {
-                "name": pipelinerun_name,
-                "namespace": self.namespace,
-                "labels": {
-                    "app.kubernetes.io/managed-by": "github-poller",
-                    "github-poller/repository": repo_name,
-                    "tekton.dev/pipeline": pipeline_name
-                }
-            },
-            "spec": {
-                "pipelineRef": {
-                    "name": pipeline_name
-                }
-            }
-        }
+        pipeline_name = template.pipeline
+        repo_name = template.repo_name
+        if isinstance(repo_config, RepositoryConfig):
+            branch = repo_config.branch
+        else:
+            branch = repo_config.get('branch') or DEFAULT_BRANCH
+        # One name per (entry, ref, commit): triggering the same commit again is a no-op
+        ref = f"refs/tags/{tag}" if tag else branch
+        name = pipelinerun_name(f"{pipeline_name}-{repo_name}", repo_name, ref, sha)
+        pipeline_run = template.render(name, self.namespace,
+                                       commit_variables(sha, previous_sha, tag, previous_tag))
+        if sha:
+            pipeline_run['metadata']['labels'][COMMIT_LABEL] = sha
         
-        # Add service account if specified
-        service_account = repo_config.get('serviceAccount')
-        if service_account:
-            pipeline_run['spec']['serviceAccountName'] = service_account
-        
-        # Add parameters with placeholder expansion
-        params = repo_config.get('params', [])
-        if params:
-            pipeline_run['spec']['params'] = []
-            for param in params:
-                param_name = param.get('name')
-                param_value = param.get('value')
-                if param_name and param_value is not None:
-                    # Expand placeholders in parameter value
-                    expanded_value = self._expand_placeholders(str(param_value), repo_config)
-                    pipeline_run['spec']['params'].append({
-                        "name": param_name,
-                        "value": expanded_value
-                    })
-        
-        # Add workspaces if specified
-        workspaces = repo_config.get('workspaces', [])
-        if workspaces:
-            pipeline_run['spec']['workspaces'] = []
-            for workspace in workspaces:
-                ws_name = workspace.get('name')
-                ws_claim = workspace.get('claimName')
-                if ws_name and ws_claim:
-                    pipeline_run['spec']['workspaces'].append({
-                        "name": ws_name,
-                        "persistentVolumeClaim": {
-                            "claimName": ws_claim
-                        }
-                    })
-        
-        # Add timeout if specified
-        timeout = repo_config.get('timeout')
-        if timeout:
-            pipeline_run['spec']['timeout'] = timeout
-        
-        # Create PipelineRun using Kubernetes API
-        try:
-            logger.info(f"Creating PipelineRun: {pipelinerun_name}")
-            logger.debug(f"PipelineRun spec: {yaml.dump(pipeline_run)}")
-            
-            result = self.k8s_custom_client.create_namespaced_custom_object(
-                group="tekton.dev",
-                version="v1beta1",
+        return self._create_pipelinerun(pipeline_run, repo_name)
+    
+    def _create_pipelinerun(self, pipeline_run: Dict, repo_name: str) -> bool:
+        """
+        Create a rendered PipelineRun using the Kubernetes API.
+        
+        Names are deterministic (see tekton.pipelinerun_name), so the create
+        is retried freely and AlreadyExists means an earlier attempt, a
+        parallel trigger or a previous run already created it.
+        """
+        name = pipeline_run['metadata']['name']
+        
+        def create() -> Dict:
+            return self.k8s_custom_client.create_namespaced_custom_object(
+                group=TEKTON_GROUP,
+                version=TEKTON_VERSION,
                 namespace=self.namespace,
-                plural="pipelineruns",
+                plural=PIPELINERUN_PLURAL,
                 body=pipeline_run
             )
+        
+        try:
+            logger.info(f"Creating PipelineRun: {name}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"PipelineRun spec: {yaml.dump(pipeline_run)}")
             
-            logger.info(f"PipelineRun created successfully: {pipelinerun_name}")
+            with self.timings.phase(PHASE_PIPELINERUN_CREATE, repo_name):
+                self.resilience.call(KUBERNETES_PIPELINERUNS, create)
+            
+            logger.info(f"PipelineRun created successfully: {name}")
+            self.recorder.triggered(repo_name)
             return True
             
         except ApiException as e:
+            if e.status == 409:
+                logger.info(f"PipelineRun {name} already exists, treating the trigger as done")
+                return True
             logger.error(f"Failed to create PipelineRun: {e}")
             logger.error(f"Response body: {e.body}")
-            return False
+        except CircuitOpenError as e:
+            logger.error(f"Failed to create PipelineRun: {e}")
         except Exception as e:
             logger.error(f"Unexpected error creating PipelineRun: {e}", exc_info=True)
+        self.recorder.error(repo_name)
+        return False
+    
+    def trigger_batch(self, batch: Dict, repositories: Dict[str, RepositoryConfig]) -> bool:
+        """
+        Create one PipelineRun for all changes of a batch.
+        
+        The spec is rendered from the template of the first repository that
+        changed, with params listing every change added.
+        
+        Returns:
+            True if the PipelineRun was created; False as well when a change
+            refers to a repository that is not configured
+        """
+        changes = batch.get('changes') or []
+        unknown = [str(change.get('repository')) for change in changes
+                   if change.get('repository') not in repositories]
+        if not changes or unknown:
+            reason = f"unknown repositories {', '.join(unknown)}" if unknown else "no changes"
+            logger.error(f"Cannot trigger batch for pipeline {batch.get('pipeline', '')}: {reason}")
             return False
+        first = repositories[changes[0]['repository']]
+        name = pipelinerun_name(f"{first.pipeline}-batch", first.pipeline, *(
+            f"{change['repository']}@{repositories[change['repository']].branch}@{change['sha']}"
+            for change in changes
+        ))
+        pipeline_run = first.template.render(
+            name, self.namespace,
+            commit_variables(changes[0]['sha'], changes[0].get('previousSHA', ''))
+        )
+        labels = pipeline_run['metadata']['labels']
+        # Batched runs belong to no single repository
+        del labels[REPOSITORY_LABEL]
+        labels[BATCH_LABEL] = 'true'
+        spec = pipeline_run['spec']
+        spec['params'] = spec.get('params', []) + batch_params(changes, repositories)
+        return self._create_pipelinerun(pipeline_run, f"{history.BATCH_PREFIX}{first.pipeline}")
     
-    def poll_repositories(self) -> None:
-        """Main polling logic: check all repositories and trigger pipelines on changes."""
-        config_data = self.get_configmap()
-        repositories = config_data.get('repositories', [])
+    def _build_admission(self, config_data: Dict) -> Optional[TriggerAdmission]:
+        """
+        Set up trigger admission control from the 'admission' section of the config.
         
-        if not repositories:
-            logger.warning("No repositories configured in ConfigMap")
-            return
+        Returns None when admission control is not configured and no backlog
+        is left over, in which case every trigger is created immediately.
+        """
+        settings = config_data.get('admission') or {}
+        if not settings and not config_data.get('backlog'):
+            return None
         
-        logger.info(f"Polling {len(repositories)} repositories...")
-        config_updated = False
+        backlog = config_data.setdefault('backlog', [])
+        if not settings:
+            # Admission control was switched off: drain what is left
+            return TriggerAdmission({}, Counter(), backlog)
         
-        for repo_config in repositories:
-            repo_name = repo_config.get('name', 'unknown')
-            repo_url = repo_config.get('url')
-            branch = repo_config.get('branch', 'main')
-            last_sha = repo_config.get('lastCheckedSHA', '')
-            
-            if not repo_url:
-                logger.warning(f"Repository '{repo_name}' has no URL, skipping")
+        try:
+            running = count_running(self.k8s_custom_client, self.namespace)
+        except ApiException as e:
+            # Without a running count we cannot honour the cap, so queue everything
+            logger.error(f"Failed to count running PipelineRuns, deferring all triggers: {e}")
+            admission = TriggerAdmission(settings, Counter(), backlog)
+            admission.blocked = True
+            return admission
+        
+        logger.info(f"Running PipelineRuns created by the poller: {sum(running.values())}")
+        return TriggerAdmission(settings, running, backlog)
+    
+    def _drain_backlog(self, admission: TriggerAdmission, repositories: List[RepositoryConfig]) -> bool:
+        """
+        Trigger queued PipelineRuns while capacity allows.
+        
+        Returns:
+            True if the backlog was modified
+        """
+        repos_by_key = {repo.key: repo for repo in repositories}
+        changed = False
+        
+        for entry in admission.ordered_backlog():
+            repo = repos_by_key.get(entry.get('repository', ''))
+            if repo is None:
+                logger.warning(f"Dropping backlog entry for removed repository: {entry.get('repository')}")
+                admission.remove(entry)
+                changed = True
                 continue
             
-            logger.info(f"Checking repository: {repo_name} ({branch})")
-            
-            # Get latest commit SHA
-            current_sha = self.get_latest_commit_sha(repo_url, branch)
-            if not current_sha:
-                logger.warning(f"Could not retrieve SHA for {repo_name}, skipping")
+            if not admission.try_admit(repo.pipeline):
                 continue
             
-            # Check if there's a change
-            if last_sha and current_sha == last_sha:
-                logger.info(f"No changes detected for {repo_name}")
+            if self.trigger_tekton_pipeline(repo, entry['sha'], entry.get('previousSHA', '')):
+                logger.info(f"Triggered queued pipeline for {repo.name} ({entry['sha'][:7]})")
+                admission.remove(entry)
+                changed = True
+            else:
+                admission.release(repo.pipeline)
+        
+        if admission.backlog:
+            logger.info(f"{len(admission.backlog)} triggers remain in backlog")
+        return changed
+    
+    def _build_batcher(self, config_data: Dict) -> Optional[TriggerBatcher]:
+        """
+        Set up trigger batching from the 'batching' section of the config.
+        
+        Returns None when batching is not configured and no batch is left open.
+        """
+        if not config_data.get('batching') and not config_data.get('batches'):
+            return None
+        try:
+            windows = parse_windows(config_data)
+        except ValueError as e:
+            # Open batches are still flushed; new changes trigger individually
+            logger.error(f"Invalid batching settings, triggering changes individually: {e}")
+            windows = {}
+        return TriggerBatcher(windows, config_data.setdefault('batches', []))
+    
+    def _build_validator(self, config_data: Dict,
+                         batcher: Optional[TriggerBatcher] = None) -> Optional[PipelineRunValidator]:
+        """
+        Set up PipelineRun validation from the 'validation' section of the config.
+        
+        Returns None unless validation is enabled.
+        """
+        settings = config_data.get('validation') or {}
+        if not isinstance(settings, dict) or not settings.get('enabled'):
+            return None
+        if not isinstance(config_data.get('validations'), dict):
+            config_data['validations'] = {}
+        return PipelineRunValidator(self.namespace, config_data['validations'],
+                                    self._list_referenced, self._dry_run_pipelinerun,
+                                    batcher.windows if batcher is not None else ())
+    
+    def _build_shadow(self, config_data: Dict) -> Optional[ShadowDetector]:
+        """
+        Set up shadow detection from the 'shadow' section of the config.
+        
+        The detector is kept while its settings do not change (it caches ETags).
+        """
+        try:
+            settings = parse_shadow(config_data)
+        except ValueError as e:
+            logger.error(f"Invalid shadow settings, shadow detection is off: {e}")
+            settings = None
+        if settings is None:
+            return None
+        if self.shadow is None or self.shadow.settings != settings:
+            return ShadowDetector(settings)
+        self.shadow.start_cycle()
+        return self.shadow
+    
+    def _list_referenced(self, kind: str) -> Dict[str, Dict]:
+        """Objects of a kind PipelineRuns refer to, by name."""
+        if kind == KIND_PIPELINE:
+            pipelines = self.resilience.call(KUBERNETES_PIPELINES, lambda: list(
+                list_tekton_objects(self.k8s_custom_client, self.namespace, PIPELINE_PLURAL)
+            ))
+            return {(pipeline.get('metadata') or {}).get('name', ''): pipeline for pipeline in pipelines}
+        
+        if kind == KIND_SERVICE_ACCOUNT:
+            breaker, list_objects = KUBERNETES_SERVICE_ACCOUNTS, self.k8s_core_client.list_namespaced_service_account
+        else:
+            breaker, list_objects = KUBERNETES_CLAIMS, self.k8s_core_client.list_namespaced_persistent_volume_claim
+        result = self.resilience.call(breaker, list_objects, self.namespace)
+        return {item.metadata.name: {'metadata': {'resourceVersion': item.metadata.resource_version}}
+                for item in result.items}
+    
+    def _dry_run_pipelinerun(self, pipeline_run: Dict) -> None:
+        """Submit a PipelineRun for server-side validation without creating it."""
+        self.resilience.call(KUBERNETES_PIPELINERUNS, lambda: self.k8s_custom_client.create_namespaced_custom_object(
+            group=TEKTON_GROUP,
+            version=TEKTON_VERSION,
+            namespace=self.namespace,
+            plural=PIPELINERUN_PLURAL,
+            body=pipeline_run,
+            dry_run='All'
+        ))
+    
+    def _flush_batches(self, batcher: TriggerBatcher, repositories: List[RepositoryConfig],
+                       admission: Optional[TriggerAdmission]) -> bool:
+        """
+        Create the PipelineRuns of batches whose window has closed.
+        
+        Returns:
+            True if a batch was modified or removed
+        """
+        repos_by_key = {repo.key: repo for repo in repositories}
+        changed = False
+        for batch in batcher.due():
+            pipeline = batch.get('pipeline', '')
+            changes = batch.get('changes') or []
+            kept = [change for change in changes if change.get('repository') in repos_by_key]
+            if len(kept) < len(changes):
+                removed = sorted({str(change.get('repository')) for change in changes} - set(repos_by_key))
+                logger.warning(f"Dropping batched changes of removed repositories: {', '.join(removed)}")
+                batch['changes'] = kept
+                changed = True
+            if not kept:
+                batcher.remove(batch)
                 continue
+            if admission is not None and not admission.try_admit(pipeline):
+                logger.info(f"Batch for pipeline {pipeline} waits for capacity")
+                continue
+            if self.trigger_batch(batch, repos_by_key):
+                logger.info(f"Triggered batch of {len(batch.get('changes') or [])} changes "
+                            f"for pipeline {pipeline}")
+                batcher.remove(batch)
+                changed = True
+            elif admission is not None:
+                admission.release(pipeline)
+        return changed
+    
+    def _dispatch_trigger(self, repo: RepositoryConfig, current_sha: str, last_sha: str,
+                          admission: Optional[TriggerAdmission],
+                          batcher: Optional[TriggerBatcher] = None) -> bool:
+        """
+        Trigger the pipeline for a detected change, or queue it if over capacity.
+        
+        Changes of batched pipelines are added to the pipeline's open batch.
+        
+        Returns:
+            True if the change was handled (triggered, queued or batched) and its SHA can be recorded
+        """
+        if batcher is not None and batcher.batches_pipeline(repo.pipeline):
+            batcher.add(repo, current_sha, last_sha)
+            return True
+        
+        if admission is not None:
+            # Keep a queued repository queued so it does not overtake older triggers
+            if admission.find(repo.key) or not admission.try_admit(repo.pipeline):
+                admission.enqueue(repo, current_sha, last_sha)
+                return True
+        
+        if self.trigger_tekton_pipeline(repo, current_sha, last_sha):
+            logger.info(f"Successfully triggered pipeline for {repo.name}")
+            return True
+        
+        if admission is not None:
+            admission.release(repo.pipeline)
+        logger.error(f"Failed to trigger pipeline for {repo.name}")
+        return False
+    
+    def _delete_pipelinerun(self, name: str) -> None:
+        """Delete a PipelineRun (and, in the background, its TaskRuns and pods)."""
+        try:
+            self.resilience.call(
+                KUBERNETES_PIPELINERUNS,
+                self.k8s_custom_client.delete_namespaced_custom_object,
+                group=TEKTON_GROUP,
+                version=TEKTON_VERSION,
+                namespace=self.namespace,
+                plural=PIPELINERUN_PLURAL,
+                name=name,
+                body=client.V1DeleteOptions(propagation_policy='Background')
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+    
+    def prune_pipelineruns(self, config_data: Dict, repositories: List[RepositoryConfig],
+                           budget: Optional[CycleBudget] = None) -> int:
+        """
+        Delete completed poller-created PipelineRuns beyond their retention.
+        
+        Returns:
+            Number of PipelineRuns deleted
+        """
+        repository_rules = {repo.name: repo.retention for repo in repositories if repo.retention}
+        try:
+            policy = RetentionPolicy.from_config(config_data, repository_rules)
+        except ValueError as e:
+            logger.error(f"Invalid retention settings, not pruning PipelineRuns: {e}")
+            return 0
+        if policy is None:
+            return 0
+        
+        with self.timings.phase(PHASE_RETENTION):
+            try:
+                expired = collect_expired(
+                    list_pipelineruns(self.k8s_custom_client, self.namespace), policy
+                )
+            except (ApiException, CircuitOpenError) as e:
+                logger.error(f"Failed to list PipelineRuns for pruning: {e}")
+                return 0
+            if not expired:
+                return 0
             
-            if not last_sha:
-                logger.info(f"First check for {repo_name}, recording SHA: {current_sha[:7]}")
-            else:
-                logger.info(f"Change detected for {repo_name}: {last_sha[:7]} -> {current_sha[:7]}")
-                
-                # Trigger pipeline
-                if self.trigger_tekton_pipeline(repo_config):
-                    logger.info(f"Successfully triggered pipeline for {repo_name}")
-                else:
-                    logger.error(f"Failed to trigger pipeline for {repo_name}")
-                    continue
+            if len(expired) > policy.max_deletes:
+                logger.info(f"{len(expired)} PipelineRuns expired, deleting the oldest "
+                            f"{policy.max_deletes} this run")
+            pruner = Pruner(self._delete_pipelinerun, policy.batch_size, policy.deletes_per_second)
+            deleted = pruner.prune(
+                expired[:policy.max_deletes],
+                budget.exhausted if budget is not None else (lambda: False)
+            )
+        
+        logger.info(f"Pruned {deleted} PipelineRuns ({pruner.failed} failed)")
+        return deleted
+    
+    def load_repositories(self, config_data: Dict) -> List[RepositoryConfig]:
+        """
+        Parse and validate the repository entries of the config.
+        
+        Invalid entries are skipped; all of their problems are reported together.
+        """
+        repositories, errors = parse_repositories(config_data.get('repositories') or [])
+        if errors:
+            logger.error(f"Skipping {len(errors)} invalid repository entries:\n  - " + "\n  - ".join(errors))
+        return repositories
+    
+    def _lookup_head(self, repo: RepositoryConfig) -> Union[str, TagListing, None]:
+        """Fetch the head SHA of a repository entry's branch (or its tag listing)."""
+        with self.timings.phase(PHASE_HEAD_LOOKUP, repo.name), self.recorder.track(repo.name):
+            if repo.tags is not None:
+                return self.get_matching_tags(repo, repo.tags, self._tag_etags.get(repo.head_key))
+            shadow = self.shadow
+            if shadow is None or not shadow.settings.samples(repo.head_key):
+                return self.get_latest_commit_sha(repo.url, repo.branch, (repo.host, repo.owner, repo.repo))
+            with shadow.measure(PRIMARY):
+                sha = self.get_latest_commit_sha(repo.url, repo.branch, (repo.host, repo.owner, repo.repo))
+            self._shadow_lookup(shadow, repo, sha)
+            return sha
+    
+    def _shadow_lookup(self, shadow: ShadowDetector, repo: RepositoryConfig, primary_sha: Optional[str]) -> None:
+        """Look the head up with the shadow backend and compare; the result is never used."""
+        endpoint = self._endpoint(repo.host)
+        if primary_sha is None or endpoint.rate_limits.blocked_for(endpoint.lane(repo.owner, repo.repo)):
+            return
+        try:
+            with shadow.measure(SHADOW):
+                shadow_sha = shadow.lookup(self._repository_request(repo, resilient=False),
+                                           f"/repos/{repo.full_name}", repo.branch, repo.head_key)
+        except Exception as e:
+            logger.warning(f"Shadow lookup of {repo.full_name}@{repo.branch} failed: {e}")
+            return
+        shadow.compare(repo.name, repo.branch, primary_sha, shadow_sha,
+                       lambda: self.get_latest_commit_sha(repo.url, repo.branch, (repo.host, repo.owner, repo.repo)))
+    
+    def _check_repository(self, repo: RepositoryConfig, head: Head,
+                          admission: Optional[TriggerAdmission],
+                          batcher: Optional[TriggerBatcher] = None) -> bool:
+        """
+        Compare a repository's head with its recorded SHA and trigger on change.
+        
+        Args:
+            head: Result of the lookup: the branch head SHA, or the tag listing
+                for entries watching tags (None if the lookup failed)
+        
+        Returns:
+            True if the recorded state of the repository was updated
+        """
+        with self.recorder.track(repo.name):
+            if repo.tags is not None:
+                listing = head if isinstance(head, TagListing) else None
+                return self._check_tags(repo, repo.tags, listing, admission)
+            return self._check_branch(repo, head if isinstance(head, str) else None, admission, batcher)
+    
+    def _check_branch(self, repo: RepositoryConfig, current_sha: Optional[str],
+                      admission: Optional[TriggerAdmission],
+                      batcher: Optional[TriggerBatcher] = None) -> bool:
+        """Trigger on a change of the branch head; see _check_repository."""
+        last_sha = repo.raw.get('lastCheckedSHA', '')
+        
+        logger.info(f"Checking repository: {repo.name} ({repo.branch})")
+        
+        if not current_sha:
+            logger.warning(f"Could not retrieve SHA for {repo.name}, skipping")
+            self.recorder.error(repo.name)
+            return False
+        
+        # Saved along with the next state change; orders the next run's checks
+        repo.raw['lastCheckedAt'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        
+        # Check if there's a change
+        if last_sha and current_sha == last_sha:
+            logger.info(f"No changes detected for {repo.name}")
+            return False
+        
+        if not last_sha:
+            logger.info(f"First check for {repo.name}, recording SHA: {current_sha[:7]}")
+        else:
+            logger.info(f"Change detected for {repo.name}: {last_sha[:7]} -> {current_sha[:7]}")
             
-            # Update SHA in config
-            repo_config['lastCheckedSHA'] = current_sha
-            config_updated = True
+            # Trigger pipeline (or queue it when over capacity)
+            if not self._dispatch_trigger(repo, current_sha, last_sha, admission, batcher):
+                return False
+            # Counted once handled; a failed trigger is detected (and counted) again next run
+            self.recorder.changed(repo.name)
         
-        # Save updated ConfigMap if any changes were detected
-        if config_updated:
-            try:
-                self.update_configmap(config_data)
-                logger.info("ConfigMap updated with new SHA values")
-            except Exception as e:
-                logger.error(f"Failed to update ConfigMap: {e}")
+        # Update SHA in config
+        repo.raw['lastCheckedSHA'] = current_sha
+        return True
+    
+    def _check_tags(self, repo: RepositoryConfig, tags: TagFilter, listing: Optional[TagListing],
+                    admission: Optional[TriggerAdmission]) -> bool:
+        """
+        Trigger once for every watched tag above the entry's lastTag, oldest first.
+        
+        The first check only records the newest watched tag. When a trigger
+        has to wait for capacity or fails, the remaining tags are left for
+        the next run (tags are not queued in the backlog or batched).
+        
+        Returns:
+            True if the recorded state of the repository was updated
+        """
+        last_tag = repo.raw.get('lastTag', '')
+        
+        logger.info(f"Checking repository: {repo.name} (tags {tags.pattern})")
+        
+        if listing is None:
+            logger.warning(f"Could not list tags of {repo.name}, skipping")
+            self.recorder.error(repo.name)
+            return False
+        
+        repo.raw['lastCheckedAt'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if listing.unchanged:
+            logger.info(f"No new tags for {repo.name}")
+            return False
+        
+        selected = tags.select(listing.tags)
+        if not last_tag or parse_version(last_tag) is None:
+            if not selected:
+                logger.info(f"No tags of {repo.name} match {tags.pattern} yet")
+                return False
+            newest = selected[-1][1]
+            sha = self._tag_commit(repo, newest)
+            if not sha:
+                return False
+            logger.info(f"First check for {repo.name}, recording tag {newest.name} ({sha[:7]})")
+            repo.raw['lastTag'] = newest.name
+            repo.raw['lastCheckedSHA'] = sha
+            self._record_tags_etag(repo, listing)
+            return True
+        
+        changed = False
+        previous_sha = repo.raw.get('lastCheckedSHA', '')
+        for tag in newer_than(selected, last_tag):
+            sha = self._tag_commit(repo, tag)
+            if not sha:
+                self.recorder.error(repo.name)
+                return changed
+            if admission is not None and not admission.try_admit(repo.pipeline):
+                logger.info(f"Tag {tag.name} of {repo.name} waits for capacity until the next run")
+                return changed
+            logger.info(f"New tag for {repo.name}: {last_tag} -> {tag.name} ({sha[:7]})")
+            if not self.trigger_tekton_pipeline(repo, sha, previous_sha, tag.name, last_tag):
+                if admission is not None:
+                    admission.release(repo.pipeline)
+                logger.error(f"Failed to trigger pipeline for {repo.name} tag {tag.name}")
+                return changed
+            logger.info(f"Successfully triggered pipeline for {repo.name} tag {tag.name}")
+            self.recorder.changed(repo.name)
+            repo.raw['lastTag'] = last_tag = tag.name
+            repo.raw['lastCheckedSHA'] = previous_sha = sha
+            changed = True
+        
+        if not changed:
+            logger.info(f"No new tags for {repo.name}")
+        # Every tag of the listing is handled: the next run may ask for changes only
+        return self._record_tags_etag(repo, listing) or changed
+    
+    @staticmethod
+    def _record_tags_etag(repo: RepositoryConfig, listing: TagListing) -> bool:
+        """Store the listing's ETag for the next conditional request; True if it changed."""
+        if repo.raw.get('tagsETag') == listing.etag:
+            return False
+        if listing.etag:
+            repo.raw['tagsETag'] = listing.etag
+        else:
+            repo.raw.pop('tagsETag', None)
+        return True
+    
+    def _skip_hinted(self, hint_queue: HintQueue, repositories: List[RepositoryConfig]) -> List[RepositoryConfig]:
+        """
+        Drop repositories the regular cycle can leave to hints.
+        
+        A repository that received a hint within HINT_STRETCH_SECONDS is
+        polled again only once its last check is that old.
+        """
+        stretch = float(os.getenv('HINT_STRETCH_SECONDS', '1800'))
+        hint_queue.prune(stretch)
+        now = datetime.now(timezone.utc)
+        due = [repo for repo in repositories
+               if not (hint_queue.hinted_within(repo, stretch) and checked_within(repo, stretch, now))]
+        if len(due) < len(repositories):
+            logger.info(f"Skipping {len(repositories) - len(due)} repositories kept up to date by hints")
+        return due
+    
+    def poll_repositories(self, hints: Optional[List[Hint]] = None) -> None:
+        """
+        Main polling logic: check all repositories and trigger pipelines on changes.
+        
+        Repositories are checked least recently checked first. State is saved
+        every CHECKPOINT_EVERY_REPOS repositories or CHECKPOINT_INTERVAL_SECONDS
+        seconds, and when POLL_DEADLINE_SECONDS is about to run out the cycle
+        stops taking new repositories, saves what it has and returns.
+        Completed PipelineRuns are pruned afterwards if time allows.
+        
+        With ``hints`` only the repositories matching them are checked.
+        With HISTORY_PATH set the cycle's counters are appended to the run history.
+        """
+        self.recorder = history.CycleRecorder(history.KIND_REGULAR if hints is None else history.KIND_HINTED)
+        try:
+            self._poll_cycle(hints)
+        except Exception:
+            self.recorder.failed = True
+            raise
+        finally:
+            self._append_history()
+    
+    def _append_history(self) -> None:
+        if self.history is None:
+            return
+        try:
+            self.history.append(self.recorder)
+        except Exception as e:
+            # History is for analysis only; it never fails a cycle
+            logger.warning(f"Could not append to run history {self.history.path}: {e}")
+    
+    def _poll_cycle(self, hints: Optional[List[Hint]] = None) -> None:
+        """One cycle of poll_repositories."""
+        budget = CycleBudget.from_env()
+        self.resilience.deadline = budget.deadline
+        
+        config_data = self.get_configmap()
+        repositories = self.load_repositories(config_data)
+        
+        if not repositories:
+            logger.warning("No repositories configured in ConfigMap")
+            return
+        
+        batcher = self._build_batcher(config_data)
+        validator = self._build_validator(config_data, batcher)
+        quarantined = {}
+        if validator is not None:
+            # Hinted cycles go by the cached results; new shapes wait for the next regular cycle
+            quarantined = validator.check(repositories) if hints is None else validator.cached(repositories)
+        # Only the lookups are narrowed down; the backlog, batches and pruning need every repository
+        targets = repositories
+        if hints is not None:
+            targets = [repo for repo in repositories if any(hint.matches(repo) for hint in hints)]
+            if not targets:
+                logger.info(f"No configured repositories match {len(hints)} hints")
+                return
+        elif self.hint_queue is not None:
+            targets = self._skip_hinted(self.hint_queue, repositories)
+        
+        self._configure_endpoints(config_data, repositories)
+        self.shadow = self._build_shadow(config_data)
+        
+        checkpointer = Checkpointer.from_env(lambda: self.update_configmap(config_data))
+        admission = self._build_admission(config_data)
+        if admission is not None and admission.backlog:
+            if self._drain_backlog(admission, repositories):
+                checkpointer.mark_dirty()
+        if validator is not None and validator.changed:
+            checkpointer.mark_dirty()
+        
+        polled = [repo for repo in targets if repo.name not in quarantined]
+        self.recorder.repositories = len(polled)
+        details = [f"{repo.name} (pipeline {repo.pipeline}): {quarantined[repo.name].get('reason', '')}"
+                   for repo in targets if repo.name in quarantined]
+        if details:
+            logger.warning(f"Skipping {len(details)} quarantined repositories until their config or "
+                           f"the objects they refer to change:\n  - " + "\n  - ".join(details))
+        
+        logger.info(f"Polling {len(polled)} repositories...")
+        
+        lookup = HeadLookup(self._lookup_head)
+        groups = sorted(group_by_head(polled).values(),
+                        key=lambda subscribers: min(r.raw.get('lastCheckedAt', '') for r in subscribers))
+        # A 304 for a shared tag listing only means "no new tags" if every subscriber saw that listing
+        self._tag_etags = {}
+        for subscribers in groups:
+            etags = {repo.raw.get('tagsETag') for repo in subscribers}
+            if subscribers[0].tags is not None and len(etags) == 1 and \
+                    all(repo.raw.get('lastTag') for repo in subscribers):
+                self._tag_etags[subscribers[0].head_key] = etags.pop()
+        # Hosts and installations have separate rate limits: look their heads up in parallel
+        lanes = {self._lookup_lane(subscribers[0]) for subscribers in groups}
+        if len(lanes) > 1 or any(self._lane_concurrency(lane) > 1 for lane in lanes):
+            logger.info(f"Looking up heads in parallel across {len(lanes)} hosts/installations")
+            lookup.prefetch([subscribers[0] for subscribers in groups], self._lookup_lane,
+                            self._lane_concurrency, budget.exhausted)
+        checked = 0
+        try:
+            for subscribers in groups:
+                if budget.exhausted():
+                    logger.warning(f"Deadline approaching after {budget.elapsed():.0f}s: "
+                                   f"checked {checked} of {len(polled)} repositories, "
+                                   f"the rest will be checked first on the next run")
+                    # Persist the check times so the next run starts where this one stopped
+                    if checkpointer.pending_repos:
+                        checkpointer.mark_dirty()
+                    break
+                for repo in subscribers:
+                    if self._check_repository(repo, lookup.resolve(repo), admission, batcher):
+                        checkpointer.mark_dirty()
+                    checked += 1
+                    checkpointer.repo_done()
+        finally:
+            lookup.close()
+        
+        logger.info(f"Head lookups: {lookup.fetches} for {checked} repositories "
+                    f"({lookup.shared} shared)")
+        if self.shadow is not None:
+            logger.info(self.shadow.report.summary())
+            self.recorder.shadow = self.shadow.report.totals()
+        for endpoint in self.endpoints.values():
+            for lane, (remaining, limit, _) in sorted(endpoint.rate_limits.lanes.items()):
+                logger.info(f"Rate limit {lane}: {remaining}/{limit} remaining")
+        
+        if batcher is not None and batcher.batches:
+            if self._flush_batches(batcher, repositories, admission):
+                checkpointer.mark_dirty()
+        
+        # Save remaining state changes
+        if checkpointer.dirty and checkpointer.flush():
+            logger.info("ConfigMap updated with new SHA values")
+        
+        if hints is None and not budget.exhausted():
+            self.prune_pipelineruns(config_data, repositories, budget)
     
     def run(self) -> None:
         """Run the poller."""
@@ -409,12 +1284,115 @@ class GitHubPoller:
         except Exception as e:
             logger.error(f"Polling failed with error: {e}", exc_info=True)
             sys.exit(1)
+        finally:
+            self.timings.log_summary()
+            self.transport.stats.log_summary()
+            if self.history is not None:
+                self.history.close()
+    
+    def _run_cycle(self, hints: Optional[List[Hint]] = None) -> None:
+        """Run one daemon cycle; failures are logged and the daemon carries on."""
+        try:
+            self.poll_repositories(hints)
+        except Exception as e:
+            logger.error(f"Polling failed with error: {e}", exc_info=True)
+    
+    def serve(self, interval: float, stop: threading.Event, debounce: float = 1.0) -> None:
+        """
+        Poll every ``interval`` seconds until ``stop`` is set.
+        
+        Between regular cycles, hinted repositories are checked as soon as
+        hints arrive; hints arriving within ``debounce`` seconds of each
+        other are checked together.
+        """
+        next_poll = time.monotonic()
+        while not stop.is_set():
+            timeout = next_poll - time.monotonic()
+            if timeout <= 0:
+                self._run_cycle()
+                self.timings.log_summary()
+                self.transport.stats.log_summary()
+                self.timings = PhaseTimer()
+                self.transport.stats.reset()
+                next_poll = time.monotonic() + interval
+            elif self.hint_queue is None:
+                stop.wait(timeout)
+            elif self.hint_queue.wait(timeout) and not stop.wait(debounce):
+                self._run_cycle(self.hint_queue.drain())
+    
+    def run_daemon(self, stop: Optional[threading.Event] = None) -> None:
+        """
+        Run the poller as a long-running process.
+        
+        POLL_INTERVAL_SECONDS sets the regular cycle. With HINT_PORT set,
+        signed change hints (see hints.py) are accepted on that port; the
+        shared secret comes from HINT_SECRET or /secrets/hint-secret.
+        """
+        stop = stop or threading.Event()
+        interval = float(os.getenv('POLL_INTERVAL_SECONDS', '300'))
+        logger.info(f"Starting GitHub Poller daemon (interval {interval:.0f}s)...")
+        logger.info(f"Namespace: {self.namespace}")
+        logger.info(f"ConfigMap: {self.configmap_name}")
+        
+        server = None
+        hint_queue = None
+        hint_port = os.getenv('HINT_PORT')
+        if hint_port:
+            hint_queue = self.hint_queue = HintQueue()
+            secret = self._read_secret('hint-secret', 'HINT_SECRET').encode()
+            server = HintServer(hint_queue, secret, port=int(hint_port))
+            server.start()
+        try:
+            self.serve(interval, stop, float(os.getenv('HINT_DEBOUNCE_SECONDS', '1')))
+        finally:
+            if server is not None and hint_queue is not None:
+                server.stop()
+                logger.info(f"Hints: {hint_queue.received} received, {hint_queue.rejected} rejected")
+            self.timings.log_summary()
+            self.transport.stats.log_summary()
+            if self.history is not None:
+                self.history.close()
 
 
-def main():
-    """Main entry point."""
-    poller = GitHubPoller()
-    poller.run()
+def main(argv: Optional[List[str]] = None):
+    """
+    Main entry point.
+    
+    Set POLLER_CASSETTE_MODE=record|replay (and POLLER_CASSETTE) to capture
+    a cycle's GitHub and Kubernetes traffic or to replay it offline.
+    ``--profile PATH`` (or POLLER_PROFILE=PATH) runs the cycle under cProfile
+    and writes the stats to PATH. ``--daemon`` (or POLLER_DAEMON=true) keeps
+    polling every POLL_INTERVAL_SECONDS until SIGTERM instead of running once.
+    ``stats`` prints the run history recorded with HISTORY_PATH (see history.py).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['stats']:
+        sys.exit(history.main(argv[1:]))
+    
+    parser = argparse.ArgumentParser(description='Poll GitHub repositories and trigger Tekton pipelines.')
+    parser.add_argument('--profile', metavar='PATH', default=os.getenv('POLLER_PROFILE', ''),
+                        help='write cProfile stats of the run to PATH')
+    parser.add_argument('--daemon', action='store_true',
+                        default=os.getenv('POLLER_DAEMON', '').lower() in ('1', 'true', 'yes'),
+                        help='keep running and poll every POLL_INTERVAL_SECONDS')
+    args = parser.parse_args(argv)
+    
+    with cassette.session_from_env(), profile(args.profile):
+        poller = GitHubPoller()
+        if not args.daemon:
+            poller.run()
+            return
+        stop = threading.Event()
+        
+        def shutdown(signum, frame):
+            logger.info("Shutting down...")
+            stop.set()
+            if poller.hint_queue is not None:
+                poller.hint_queue.close()
+        
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        poller.run_daemon(stop)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+"""
+Per-phase timing report and an optional cProfile hook.
+
+PhaseTimer accumulates wall-clock time per phase of a polling cycle (token
+acquisition, ConfigMap read/write, YAML parsing/serialisation, head lookups,
+PipelineRun creation), optionally attributed to a repository, and renders a
+summary table with the slowest repositories at the end of a run.
+
+profile() wraps a block in cProfile and writes the stats to a file that can be
+inspected with ``python -m pstats`` or snakeviz.
+"""
+
+import contextlib
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Phases in the order they are reported
+PHASE_TOKEN = 'token'
+PHASE_CONFIGMAP_READ = 'configmap read'
+PHASE_DECODE = 'config decode'
+PHASE_HEAD_LOOKUP = 'head lookup'
+PHASE_PIPELINERUN_CREATE = 'pipelinerun create'
+PHASE_ENCODE = 'config encode'
+PHASE_CONFIGMAP_WRITE = 'configmap write'
+PHASE_RETENTION = 'retention'
+PHASE_ORDER = (PHASE_TOKEN, PHASE_CONFIGMAP_READ, PHASE_DECODE, PHASE_HEAD_LOOKUP,
+               PHASE_PIPELINERUN_CREATE, PHASE_ENCODE, PHASE_CONFIGMAP_WRITE, PHASE_RETENTION)
+
+
+class _PhaseStats:
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class PhaseTimer:
+    """Accumulates time spent per phase and per repository."""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self.phases: Dict[str, _PhaseStats] = defaultdict(_PhaseStats)
+        self.items: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def record(self, phase: str, seconds: float, item: Optional[str] = None) -> None:
+        with self._lock:
+            stats = self.phases[phase]
+            stats.calls += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            if item is not None:
+                self.items[item][phase] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, phase: str, item: Optional[str] = None) -> Iterator[None]:
+        """Time the block as ``phase``, attributed to ``item`` (e.g. a repository) if given."""
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.record(phase, self._clock() - started, item)
+
+    def slowest(self, top_n: int) -> List[tuple]:
+        """Return [(item, total seconds, {phase: seconds})] for the ``top_n`` slowest items."""
+        with self._lock:
+            totals = [(item, sum(phases.values()), dict(phases)) for item, phases in self.items.items()]
+        return sorted(totals, key=lambda entry: entry[1], reverse=True)[:top_n]
+
+    def summary(self, top_n: int = 10) -> str:
+        """Render the timing summary table."""
+        elapsed = self._clock() - self.started_at
+        lines = [f"Phase timings (run {elapsed:.2f}s):",
+                 f"  {'phase':<20} {'calls':>6} {'total':>9} {'avg':>9} {'max':>9}"]
+        with self._lock:
+            phases = sorted(self.phases.items(),
+                            key=lambda entry: PHASE_ORDER.index(entry[0]) if entry[0] in PHASE_ORDER
+                            else len(PHASE_ORDER))
+        for name, stats in phases:
+            lines.append(f"  {name:<20} {stats.calls:>6} {stats.total:>8.3f}s "
+                         f"{stats.total / stats.calls:>8.3f}s {stats.max:>8.3f}s")
+
+        slowest = self.slowest(top_n)
+        if slowest:
+            lines.append(f"Slowest repositories (top {len(slowest)}):")
+            for item, total, by_phase in slowest:
+                detail = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in by_phase.items())
+                lines.append(f"  {item:<30} {total:>8.3f}s  ({detail})")
+        return '\n'.join(lines)
+
+    def log_summary(self, top_n: Optional[int] = None) -> None:
+        if top_n is None:
+            top_n = int(os.getenv('TIMING_TOP_N', '10'))
+        logger.info(self.summary(top_n))
+
+
+@contextlib.contextmanager
+def profile(path: Optional[str]) -> Iterator[Optional[cProfile.Profile]]:
+    """
+    Run the block under cProfile and write the stats to ``path``.
+
+    A no-op when ``path`` is empty.
+    """
+    if not path:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(15)
+        logger.info(f"Profile written to {path}; top functions by cumulative time:\n{stream.getvalue().strip()}")
+
@@ -0,0 +1,245 @@
+"""
+Shared resilience layer for outbound GitHub and Kubernetes calls.
+
+Calls go through Resilience.call(), which retries transient failures with
+bounded, jittered exponential backoff (honouring Retry-After) and keeps a
+circuit breaker per host so that a degraded upstream fails fast instead of
+making every repository wait for its full timeout.
+"""
+
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple, TypeVar
+
+import requests
+import urllib3
+from github import GithubException
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+GITHUB_API_HOST = 'api.github.com'
+KUBERNETES_HOST = 'kubernetes'
+# The Kubernetes API gets a circuit breaker per resource: failing PipelineRun
+# creations must not block the ConfigMap reads and writes that carry the state
+KUBERNETES_CONFIGMAPS = f'{KUBERNETES_HOST}/configmaps'
+KUBERNETES_PIPELINERUNS = f'{KUBERNETES_HOST}/pipelineruns'
+KUBERNETES_PIPELINES = f'{KUBERNETES_HOST}/pipelines'
+KUBERNETES_SERVICE_ACCOUNTS = f'{KUBERNETES_HOST}/serviceaccounts'
+KUBERNETES_CLAIMS = f'{KUBERNETES_HOST}/persistentvolumeclaims'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"circuit breaker open for {host}, next attempt in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delay in seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header(headers, name: str) -> Optional[str]:
+    if not headers:
+        return None
+    for key, value in dict(headers).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def classify(error: Exception, retry_statuses: Iterable[int] = ()) -> Tuple[bool, Optional[float]]:
+    """
+    Decide whether a failed call is worth retrying.
+
+    Returns:
+        (retryable, Retry-After delay in seconds if the server asked for one)
+    """
+    status = None
+    headers = None
+    if isinstance(error, GithubException):
+        status, headers = error.status, error.headers
+    elif isinstance(error, ApiException):
+        status, headers = error.status, error.headers
+    elif isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status, headers = error.response.status_code, error.response.headers
+    elif isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                            urllib3.exceptions.HTTPError, ConnectionError, TimeoutError, socket.timeout)):
+        return True, None
+    else:
+        return False, None
+
+    retry_after = parse_retry_after(_header(headers, 'Retry-After'))
+    if not status:
+        # ApiException without a status wraps a connection-level failure
+        return True, retry_after
+    if status >= 500 or status == 429 or status in retry_statuses:
+        return True, retry_after
+    # GitHub signals secondary rate limits with 403 + Retry-After
+    if status == 403 and retry_after is not None:
+        return True, retry_after
+    return False, None
+
+
+@dataclass
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff."""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> 'RetryPolicy':
+        return cls(
+            max_attempts=int(os.getenv('RETRY_MAX_ATTEMPTS', '3')),
+            base_delay=float(os.getenv('RETRY_BASE_DELAY', '0.5')),
+            max_delay=float(os.getenv('RETRY_MAX_DELAY', '10')),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    Opens after ``failure_threshold`` consecutive transient failures, rejects
+    calls for ``reset_timeout`` seconds, then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and self.retry_in() <= 0:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+
+class Resilience:
+    """Retry policy plus one circuit breaker per host."""
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, failure_threshold: int = 5,
+                 reset_timeout: float = 60.0, sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        self.policy = policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._sleep = sleep
+        self._clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        # Clock value after which no retry is started (set per polling cycle)
+        self.deadline = math.inf
+
+    @classmethod
+    def from_env(cls) -> 'Resilience':
+        return cls(
+            policy=RetryPolicy.from_env(),
+            failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('CIRCUIT_RESET_SECONDS', '60')),
+        )
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self._clock)
+            return self._breakers[host]
+
+    def call(self, host: str, func: Callable[..., T], *args,
+             retry_statuses: Iterable[int] = (), **kwargs) -> T:
+        """
+        Call ``func`` with retries and circuit breaking for ``host``.
+
+        Args:
+            host: Upstream the call goes to (one circuit breaker per host)
+            func: Callable performing the request
+            retry_statuses: Extra HTTP statuses to treat as transient (e.g. 409)
+
+        Raises:
+            CircuitOpenError: if the host's circuit breaker is open
+            Exception: the last error once retries are exhausted or not worthwhile
+        """
+        breaker = self.breaker(host)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(host, breaker.retry_in())
+            attempt += 1
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                retryable, retry_after = classify(e, retry_statuses)
+                if not retryable:
+                    # The host answered; the request itself was at fault
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt >= self.policy.max_attempts:
+                    raise
+                delay = retry_after if retry_after is not None else self.policy.backoff(attempt)
+                if delay > self.policy.max_delay:
+                    logger.warning(f"{host}: server asked to wait {delay:.0f}s, giving up")
+                    raise
+                if self._clock() + delay > self.deadline:
+                    logger.warning(f"{host}: no time left before the cycle deadline, giving up")
+                    raise
+                logger.warning(f"{host}: attempt {attempt}/{self.policy.max_attempts} failed ({e}), "
+                               f"retrying in {delay:.1f}s")
+                self._sleep(delay)
+                continue
+            breaker.record_success()
+            return result
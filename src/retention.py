@@ -0,0 +1,296 @@
+"""
+Retention (garbage collection) of poller-created PipelineRuns.
+
+Completed PipelineRuns carrying the poller's managed-by label are grouped by
+repository and pipeline and pruned according to rules from config.yaml::
+
+    retention:
+      keepLast: 20            # keep the newest N completed runs per repository/pipeline
+      maxAge: 7d              # delete completed runs older than this (s/m/h/d)
+      keepLastFailed: true    # always keep the newest failed run (default: true)
+      pipelines:
+        integration:
+          keepLast: 5
+      batchSize: 20           # deletes per batch
+      deletesPerSecond: 10    # rate limit across batches
+      maxDeletesPerRun: 500   # cap per polling cycle
+    repositories:
+      - name: my-app
+        retention:
+          maxAge: 30d
+
+Repository rules override pipeline rules, which override the defaults.
+Running PipelineRuns are never deleted.
+"""
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from resilience import CircuitOpenError
+from tekton import PIPELINE_LABEL, REPOSITORY_LABEL, is_running, succeeded_status
+
+logger = logging.getLogger(__name__)
+
+_DURATION_RE = re.compile(r'^\s*(\d+)\s*([smhd]?)\s*$')
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value) -> float:
+    """
+    Parse a duration such as 3600, '90m', '12h' or '7d' into seconds.
+
+    Raises:
+        ValueError: if the value is not a non-negative duration
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"invalid duration '{value}'")
+    if isinstance(value, (int, float)):
+        if value < 0:
+            raise ValueError(f"invalid duration '{value}'")
+        return float(value)
+    match = _DURATION_RE.match(str(value))
+    if not match:
+        raise ValueError(f"invalid duration '{value}' (use e.g. 3600, 90m, 12h, 7d)")
+    return float(int(match.group(1)) * _DURATION_UNITS[match.group(2)])
+
+
+@dataclass(frozen=True)
+class RetentionRule:
+    """Retention settings; None means "inherit from the less specific rule"."""
+    keep_last: Optional[int] = None
+    max_age: Optional[float] = None
+    keep_last_failed: Optional[bool] = None
+
+    def over(self, base: 'RetentionRule') -> 'RetentionRule':
+        """Return this rule with unset fields taken from ``base``."""
+        return RetentionRule(
+            keep_last=self.keep_last if self.keep_last is not None else base.keep_last,
+            max_age=self.max_age if self.max_age is not None else base.max_age,
+            keep_last_failed=(self.keep_last_failed if self.keep_last_failed is not None
+                              else base.keep_last_failed),
+        )
+
+    @property
+    def prunes(self) -> bool:
+        return self.keep_last is not None or self.max_age is not None
+
+
+def parse_rule(settings) -> RetentionRule:
+    """
+    Parse a retention mapping (keepLast, maxAge, keepLastFailed).
+
+    Raises:
+        ValueError: listing every problem found
+    """
+    if not isinstance(settings, dict):
+        raise ValueError("'retention' must be a mapping")
+
+    problems = []
+    keep_last = settings.get('keepLast')
+    if keep_last is not None and (not isinstance(keep_last, int) or isinstance(keep_last, bool)
+                                  or keep_last < 0):
+        problems.append("'keepLast' must be a non-negative integer")
+
+    max_age = settings.get('maxAge')
+    if max_age is not None:
+        try:
+            max_age = parse_duration(max_age)
+        except ValueError as e:
+            problems.append(f"'maxAge': {e}")
+
+    keep_last_failed = settings.get('keepLastFailed')
+    if keep_last_failed is not None and not isinstance(keep_last_failed, bool):
+        problems.append("'keepLastFailed' must be true or false")
+
+    if problems:
+        raise ValueError('; '.join(problems))
+    return RetentionRule(keep_last, max_age, keep_last_failed)
+
+
+# Applied underneath every configured rule
+BASE_RULE = RetentionRule(keep_last_failed=True)
+
+
+class RetentionPolicy:
+    """Resolves the retention rule for each (repository, pipeline) group."""
+
+    def __init__(self, default: RetentionRule = RetentionRule(),
+                 pipelines: Optional[Dict[str, RetentionRule]] = None,
+                 repositories: Optional[Dict[str, RetentionRule]] = None,
+                 batch_size: int = 20, deletes_per_second: float = 10,
+                 max_deletes: int = 500):
+        self.default = default.over(BASE_RULE)
+        self.pipelines = pipelines or {}
+        self.repositories = repositories or {}
+        self.batch_size = batch_size
+        self.deletes_per_second = deletes_per_second
+        self.max_deletes = max_deletes
+
+    @classmethod
+    def from_config(cls, config_data: Dict,
+                    repository_rules: Optional[Dict[str, RetentionRule]] = None) -> Optional['RetentionPolicy']:
+        """
+        Build the policy from config.yaml.
+
+        Args:
+            config_data: Parsed config.yaml
+            repository_rules: Per-repository rules keyed by repository name
+
+        Returns:
+            The policy, or None when no retention is configured
+
+        Raises:
+            ValueError: if the ``retention`` section is invalid
+        """
+        settings = config_data.get('retention')
+        if settings is None and not repository_rules:
+            return None
+        settings = settings or {}
+        if not isinstance(settings, dict):
+            raise ValueError("'retention' must be a mapping")
+
+        problems = []
+        try:
+            default = parse_rule({k: v for k, v in settings.items()
+                                  if k in ('keepLast', 'maxAge', 'keepLastFailed')})
+        except ValueError as e:
+            problems.append(str(e))
+            default = RetentionRule()
+
+        pipelines = {}
+        for name, pipeline_settings in (settings.get('pipelines') or {}).items():
+            try:
+                pipelines[name] = parse_rule(pipeline_settings)
+            except ValueError as e:
+                problems.append(f"pipeline '{name}': {e}")
+
+        limits = {}
+        for key, default_value in (('batchSize', 20), ('deletesPerSecond', 10), ('maxDeletesPerRun', 500)):
+            value = settings.get(key, default_value)
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+                problems.append(f"'{key}' must be a positive number")
+                value = default_value
+            limits[key] = value
+
+        if problems:
+            raise ValueError('; '.join(problems))
+        return cls(default, pipelines, repository_rules,
+                   batch_size=int(limits['batchSize']),
+                   deletes_per_second=float(limits['deletesPerSecond']),
+                   max_deletes=int(limits['maxDeletesPerRun']))
+
+    def rule_for(self, repository: str, pipeline: str) -> RetentionRule:
+        rule = self.default
+        if pipeline in self.pipelines:
+            rule = self.pipelines[pipeline].over(rule)
+        if repository in self.repositories:
+            rule = self.repositories[repository].over(rule)
+        return rule
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def collect_expired(pipeline_runs: Iterable[Dict], policy: RetentionPolicy,
+                    now: Optional[datetime] = None) -> List[str]:
+    """
+    Select the completed PipelineRuns that the policy allows to delete.
+
+    A run is deleted when it is beyond the newest ``keepLast`` completed runs
+    of its repository/pipeline, or older than ``maxAge`` (by completion time).
+    The newest failed run of each group is kept when ``keepLastFailed`` is set.
+
+    Returns:
+        Names of the PipelineRuns to delete, oldest first
+    """
+    now = now or datetime.now(timezone.utc)
+    # Only the fields needed for the decision are kept, not whole objects
+    groups: Dict[Tuple[str, str], List[Tuple[datetime, str, bool]]] = {}
+    for pipeline_run in pipeline_runs:
+        if is_running(pipeline_run):
+            continue
+        metadata = pipeline_run.get('metadata') or {}
+        labels = metadata.get('labels') or {}
+        finished = (_parse_time((pipeline_run.get('status') or {}).get('completionTime'))
+                    or _parse_time(metadata.get('creationTimestamp')))
+        if finished is None or not metadata.get('name'):
+            continue
+        key = (labels.get(REPOSITORY_LABEL, ''), labels.get(PIPELINE_LABEL, ''))
+        groups.setdefault(key, []).append(
+            (finished, metadata['name'], succeeded_status(pipeline_run) == 'False')
+        )
+
+    expired: List[Tuple[datetime, str]] = []
+    for (repository, pipeline), runs in groups.items():
+        rule = policy.rule_for(repository, pipeline)
+        if not rule.prunes:
+            continue
+        runs.sort(reverse=True)
+        last_failed = next((name for _, name, failed in runs if failed), None)
+        for index, (finished, name, _) in enumerate(runs):
+            if rule.keep_last_failed and name == last_failed:
+                continue
+            too_many = rule.keep_last is not None and index >= rule.keep_last
+            too_old = rule.max_age is not None and (now - finished).total_seconds() > rule.max_age
+            if too_many or too_old:
+                expired.append((finished, name))
+
+    return [name for _, name in sorted(expired)]
+
+
+class Pruner:
+    """Deletes PipelineRuns in rate-limited batches."""
+
+    def __init__(self, delete: Callable[[str], None], batch_size: int = 20,
+                 deletes_per_second: float = 10, sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        self._delete = delete
+        self.batch_size = batch_size
+        self.deletes_per_second = deletes_per_second
+        self._sleep = sleep
+        self._clock = clock
+        self.deleted = 0
+        self.failed = 0
+
+    def prune(self, names: List[str], should_stop: Callable[[], bool] = lambda: False) -> int:
+        """
+        Delete ``names`` batch by batch, pausing so that the overall rate stays
+        under ``deletes_per_second``.
+
+        Stops early when ``should_stop()`` returns True or the API server's
+        circuit breaker opens.
+
+        Returns:
+            Number of PipelineRuns deleted
+        """
+        for start in range(0, len(names), self.batch_size):
+            if should_stop():
+                logger.warning(f"Stopping PipelineRun pruning with {len(names) - start} left")
+                break
+            batch_started = self._clock()
+            batch = names[start:start + self.batch_size]
+            for name in batch:
+                try:
+                    self._delete(name)
+                    self.deleted += 1
+                except CircuitOpenError as e:
+                    logger.warning(f"Stopping PipelineRun pruning: {e}")
+                    return self.deleted
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"Failed to delete PipelineRun {name}: {e}")
+            if start + self.batch_size < len(names):
+                pause = len(batch) / self.deletes_per_second - (self._clock() - batch_started)
+                if pause > 0:
+                    self._sleep(pause)
+        return self.deleted
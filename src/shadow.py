@@ -0,0 +1,229 @@
+"""
+Shadow mode: compare a secondary branch-head detection backend with the primary.
+
+The primary backend (``rest``: get_repo + get_branch) is what decides whether
+a pipeline is triggered. With shadow mode on, a sample of the branch heads
+is also looked up with a secondary backend; its result is only compared,
+never used. Per cycle the poller logs how often the two agree, each
+disagreement, and the latency and API cost of both side by side (and stores
+the totals in the run history when HISTORY_PATH is set)::
+
+    shadow:
+      backend: refs     # refs | sha
+      sample: 0.1       # fraction of branch heads (default: 1.0)
+
+Backends:
+
+- ``refs``: ``GET /repos/{owner}/{repo}/git/ref/heads/{branch}``, one call
+- ``sha``: ``GET /repos/{owner}/{repo}/commits/{branch}`` with the
+  ``application/vnd.github.sha`` media type and If-None-Match; the ETags
+  are kept in memory, so in daemon mode an unchanged branch answers 304
+
+Sampling is stable (by repository and branch), so the same heads are
+compared every cycle. A disagreement is looked up once more with the primary
+backend; if that now matches, the branch moved between the two lookups and
+it is counted as a race, not a disagreement.
+"""
+
+import contextlib
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from models import HeadKey
+from transport import RequestTiming
+
+BACKEND_REST = 'rest'
+BACKEND_REFS = 'refs'
+BACKEND_SHA = 'sha'
+SHADOW_BACKENDS = (BACKEND_REFS, BACKEND_SHA)
+
+SHA_MEDIA_TYPE = 'application/vnd.github.sha'
+
+# Sides of a comparison
+PRIMARY = 'primary'
+SHADOW = 'shadow'
+
+# Request function: (url, parameters, headers) -> (response headers, decoded body or None for 304)
+Request = Callable[[str, Optional[Dict], Dict], Tuple[Dict, Any]]
+
+
+@dataclass(frozen=True)
+class ShadowSettings:
+    backend: str
+    sample: float = 1.0
+
+    def samples(self, key: HeadKey) -> bool:
+        """Stable decision whether a branch head is compared."""
+        digest = hashlib.sha256('\0'.join(key).encode()).hexdigest()
+        return int(digest[:8], 16) / 0x100000000 < self.sample
+
+
+def parse_shadow(config_data: Dict) -> Optional[ShadowSettings]:
+    """
+    Parse the ``shadow`` section of the config; None when shadow mode is off.
+
+    Raises:
+        ValueError: listing every problem found
+    """
+    settings = config_data.get('shadow')
+    if not settings:
+        return None
+    if not isinstance(settings, dict):
+        raise ValueError("'shadow' must be a mapping")
+    problems = []
+    backend = str(settings.get('backend'))
+    if backend not in SHADOW_BACKENDS:
+        problems.append(f"'backend' must be one of: {', '.join(SHADOW_BACKENDS)}")
+    sample = settings.get('sample', 1.0)
+    if isinstance(sample, bool) or not isinstance(sample, (int, float)) or not 0 < sample <= 1:
+        problems.append("'sample' must be a number in (0, 1]")
+    if problems:
+        raise ValueError('; '.join(problems))
+    return ShadowSettings(backend, float(sample))
+
+
+@dataclass
+class _SideStats:
+    lookups: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    api_calls: int = 0
+    not_modified: int = 0
+
+
+@dataclass
+class ShadowReport:
+    """Comparison results of one cycle."""
+    backend: str
+    sides: Dict[str, _SideStats] = field(default_factory=lambda: {PRIMARY: _SideStats(), SHADOW: _SideStats()})
+    agreed: int = 0
+    raced: int = 0
+    # (repository, branch, primary SHA, shadow SHA)
+    disagreements: List[Tuple[str, str, str, str]] = field(default_factory=list)
+
+    @property
+    def compared(self) -> int:
+        return self.agreed + self.raced + len(self.disagreements)
+
+    def totals(self) -> Dict[str, Any]:
+        """Flat counters for the run history."""
+        primary, shadow = self.sides[PRIMARY], self.sides[SHADOW]
+        return {
+            'backend': self.backend, 'compared': self.compared, 'disagreed': len(self.disagreements),
+            'raced': self.raced, 'errors': shadow.errors,
+            'primary_seconds': primary.seconds, 'shadow_seconds': shadow.seconds,
+            'primary_calls': primary.api_calls, 'shadow_calls': shadow.api_calls,
+        }
+
+    def summary(self) -> str:
+        lines = [f"Shadow detection ({self.backend} vs {BACKEND_REST}, {self.compared} heads compared):",
+                 f"  {'backend':<8} {'lookups':>7} {'errors':>6} {'avg time':>9} {'max time':>9} "
+                 f"{'api calls':>9} {'304s':>5}"]
+        for side, backend in ((PRIMARY, BACKEND_REST), (SHADOW, self.backend)):
+            stats = self.sides[side]
+            average = stats.seconds / stats.lookups if stats.lookups else 0.0
+            lines.append(f"  {backend:<8} {stats.lookups:>7} {stats.errors:>6} {average:>8.3f}s "
+                         f"{stats.max_seconds:>8.3f}s {stats.api_calls:>9} {stats.not_modified:>5}")
+        lines.append(f"  agreed {self.agreed}, raced {self.raced}, disagreed {len(self.disagreements)}")
+        for name, branch, primary, shadow in self.disagreements:
+            lines.append(f"    - {name}@{branch}: {BACKEND_REST} {primary[:7] or '-'}, "
+                         f"{self.backend} {shadow[:7] or '-'}")
+        return '\n'.join(lines)
+
+
+def refs_head(request: Request, repo_path: str, branch: str) -> str:
+    """Branch head from the git refs API."""
+    _, data = request(f"{repo_path}/git/ref/heads/{quote(branch, safe='/')}", None, {})
+    return (data.get('object') or {}).get('sha', '')
+
+
+class ShadowDetector:
+    """
+    Runs the shadow backend for sampled heads and collects a ShadowReport per cycle.
+
+    Kept across daemon cycles so the ``sha`` backend can send its ETags.
+    """
+
+    def __init__(self, settings: ShadowSettings, timer: Callable[[], float] = time.perf_counter):
+        self.settings = settings
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # head key -> (ETag, SHA) of the last ``sha`` backend response
+        self._etags: Dict[HeadKey, Tuple[str, str]] = {}
+        self.report = ShadowReport(settings.backend)
+
+    def start_cycle(self) -> None:
+        self.report = ShadowReport(self.settings.backend)
+
+    @contextlib.contextmanager
+    def measure(self, side: str) -> Iterator[None]:
+        """Time a lookup of one side; API calls on this thread count for that side."""
+        self._local.side = side
+        started = self._timer()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._local.side = None
+            seconds = self._timer() - started
+            with self._lock:
+                stats = self.report.sides[side]
+                stats.lookups += 1
+                stats.errors += failed
+                stats.seconds += seconds
+                stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def on_request(self, timing: RequestTiming) -> None:
+        """Transport hook: count a GitHub response for the side being measured."""
+        side = getattr(self._local, 'side', None)
+        if side is None:
+            return
+        with self._lock:
+            stats = self.report.sides[side]
+            stats.api_calls += 1
+            stats.not_modified += timing.status == 304
+
+    def lookup(self, request: Request, repo_path: str, branch: str, key: HeadKey) -> str:
+        """Head SHA according to the shadow backend."""
+        if self.settings.backend == BACKEND_REFS:
+            return refs_head(request, repo_path, branch)
+
+        headers = {'Accept': SHA_MEDIA_TYPE}
+        cached = self._etags.get(key)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+        response_headers, data = request(f"{repo_path}/commits/{quote(branch, safe='/')}", None, headers)
+        if data is None and cached is not None:
+            return cached[1]
+        # The sha media type is plain text, which PyGithub wraps as {'data': ...}
+        sha = str(data.get('data', '') if isinstance(data, dict) else data).strip()
+        etag = next((value for name, value in (response_headers or {}).items() if name.lower() == 'etag'), None)
+        with self._lock:
+            if etag and sha:
+                self._etags[key] = (etag, sha)
+            else:
+                self._etags.pop(key, None)
+        return sha
+
+    def compare(self, name: str, branch: str, primary: str, shadow: str,
+                recheck: Callable[[], Optional[str]]) -> None:
+        """Record the outcome; ``recheck`` looks the head up again with the primary backend."""
+        if primary == shadow:
+            with self._lock:
+                self.report.agreed += 1
+            return
+        if recheck() == shadow:
+            with self._lock:
+                self.report.raced += 1
+            return
+        with self._lock:
+            self.report.disagreements.append((name, branch, primary, shadow))
@@ -0,0 +1,249 @@
+"""
+Tag watching: trigger on new version tags instead of branch heads.
+
+A repository entry with ``watch: tags`` lists the repository's tags under a
+prefix with GitHub's matching-refs API (one request per 100 tags, sent as a
+conditional request when the listing fits in one page, so an unchanged
+listing costs no rate limit), keeps the tags matching a glob and an optional
+semver range, and triggers once for every tag newer than the last one
+handled, oldest version first::
+
+    - name: app-release
+      url: https://github.com/org/app
+      pipeline: deploy
+      watch: tags
+      tags:
+        pattern: "v*"               # glob on the tag name (default: *)
+        semver: ">=1.4.0 <2.0.0"    # optional range: >, >=, <, <=, =, ^, ~
+        prereleases: false          # also match 1.5.0-rc.1 etc. (default: false)
+
+Only tags that parse as versions (an optional non-numeric prefix such as
+``v`` or ``release-``, then major[.minor[.patch]][-prerelease][+build]) are
+considered. The state is a high-water mark: the newest tag handled is stored
+in ``lastTag``, not the tag list.
+"""
+
+import fnmatch
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+# Sortable semver precedence key
+Version = Tuple
+
+PAGE_SIZE = 100
+TAG_REF_PREFIX = 'refs/tags/'
+
+VERSION_RE = re.compile(
+    r'^(?P<prefix>[^0-9]*)(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?'
+    r'(?:-(?P<pre>[0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$'
+)
+COMPARATOR_RE = re.compile(r'^(>=|<=|>|<|=|\^|~)?\s*v?(\d+(?:\.\d+){0,2}(?:-[0-9A-Za-z.-]+)?)$')
+LINK_NEXT_RE = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+def parse_version(name: str) -> Optional[Version]:
+    """
+    Semver precedence key of a tag name, or None if it is not a version.
+
+    Missing minor/patch numbers count as 0; a pre-release sorts before its
+    release, numeric identifiers numerically and before alphanumeric ones.
+    """
+    match = VERSION_RE.match(name)
+    if match is None:
+        return None
+    core = (int(match.group('major')), int(match.group('minor') or 0), int(match.group('patch') or 0))
+    pre = match.group('pre')
+    if pre is None:
+        return core + ((1,),)
+    identifiers = tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in pre.split('.'))
+    return core + ((0,) + identifiers,)
+
+
+def is_prerelease(version: Version) -> bool:
+    return version[3][0] == 0
+
+
+def _comparators(text: str) -> List[Tuple[str, Version]]:
+    """Parse a range into (operator, version) pairs that must all hold."""
+    comparators = []
+    for token in re.split(r'[\s,]+', text.strip()):
+        if not token:
+            continue
+        match = COMPARATOR_RE.match(token)
+        if match is None:
+            raise ValueError(f"invalid semver comparator '{token}'")
+        operator, number = match.group(1) or '=', match.group(2)
+        version = parse_version(number)
+        if version is None:
+            raise ValueError(f"invalid semver version '{number}'")
+        major, minor, patch = version[:3]
+        # Parts left out are wildcards: ~1 is 1.x and ^0.1 is 0.1.x
+        given = number.split('-')[0].count('.') + 1
+        if operator == '^':
+            if major or given == 1:
+                upper = (major + 1, 0, 0)
+            elif minor or given == 2:
+                upper = (0, minor + 1, 0)
+            else:
+                upper = (0, 0, patch + 1)
+            comparators += [('>=', version), ('<', upper + ((0,),))]
+        elif operator == '~':
+            upper = (major + 1, 0, 0) if given == 1 else (major, minor + 1, 0)
+            comparators += [('>=', version), ('<', upper + ((0,),))]
+        else:
+            comparators.append((operator, version))
+    if not comparators:
+        raise ValueError("empty semver range")
+    return comparators
+
+
+_OPERATORS: Dict[str, Callable[[Version, Version], bool]] = {
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '=': lambda a, b: a == b,
+}
+
+
+@dataclass(frozen=True)
+class Tag:
+    name: str
+    sha: str
+    # 'commit' for a lightweight tag, 'tag' for an annotated tag object
+    type: str = 'commit'
+
+
+@dataclass(frozen=True)
+class TagFilter:
+    """Which tags of a repository an entry watches."""
+    pattern: str = '*'
+    comparators: Tuple[Tuple[str, Version], ...] = ()
+    prereleases: bool = False
+
+    @property
+    def prefix(self) -> str:
+        """Literal start of the pattern, used to narrow the matching-refs request."""
+        return re.split(r'[*?\[]', self.pattern, maxsplit=1)[0]
+
+    def version_of(self, name: str) -> Optional[Version]:
+        """The tag's version if the tag is watched, else None."""
+        if not fnmatch.fnmatchcase(name, self.pattern):
+            return None
+        version = parse_version(name)
+        if version is None or (is_prerelease(version) and not self.prereleases):
+            return None
+        if not all(_OPERATORS[operator](version, bound) for operator, bound in self.comparators):
+            return None
+        return version
+
+    def select(self, tags: List[Tag]) -> List[Tuple[Version, Tag]]:
+        """Watched tags, oldest version first."""
+        selected = []
+        for tag in tags:
+            version = self.version_of(tag.name)
+            if version is not None:
+                selected.append((version, tag))
+        return sorted(selected, key=lambda entry: (entry[0], entry[1].name))
+
+
+def parse_tag_filter(settings: Optional[Dict]) -> TagFilter:
+    """
+    Parse the ``tags`` mapping of a repository entry.
+
+    Raises:
+        ValueError: listing every problem found
+    """
+    settings = settings if settings is not None else {}
+    if not isinstance(settings, dict):
+        raise ValueError("'tags' must be a mapping")
+    problems = []
+    pattern = settings.get('pattern', '*')
+    if not isinstance(pattern, str) or not pattern:
+        problems.append("'pattern' must be a non-empty string")
+    comparators: Tuple = ()
+    if settings.get('semver') is not None:
+        try:
+            comparators = tuple(_comparators(str(settings['semver'])))
+        except ValueError as e:
+            problems.append(str(e))
+    prereleases = settings.get('prereleases', False)
+    if not isinstance(prereleases, bool):
+        problems.append("'prereleases' must be true or false")
+    if problems:
+        raise ValueError('; '.join(problems))
+    return TagFilter(pattern, comparators, prereleases)
+
+
+def newer_than(selected: List[Tuple[Version, Tag]], last_tag: str) -> List[Tag]:
+    """Tags above the high-water mark ``last_tag``, oldest first."""
+    mark = parse_version(last_tag)
+    if mark is None:
+        return []
+    return [tag for version, tag in selected if version > mark]
+
+
+@dataclass
+class TagListing:
+    """Result of listing a repository's tags."""
+    tags: List[Tag]
+    # ETag to send next time; only set when the listing was a single page
+    etag: Optional[str] = None
+    # True when the server answered 304 Not Modified
+    unchanged: bool = False
+
+
+def _header(headers: Dict, name: str) -> Optional[str]:
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def fetch_matching_tags(request: Callable[[str, Optional[Dict], Dict], Tuple[Dict, Any]],
+                        repo_path: str, prefix: str, etag: Optional[str] = None) -> TagListing:
+    """
+    List the tags starting with ``prefix`` via ``GET <repo>/git/matching-refs/tags/<prefix>``.
+
+    Args:
+        request: performs a GET and returns (response headers, decoded JSON or None for 304)
+        repo_path: API path of the repository, e.g. /repos/org/app
+        prefix: literal tag name prefix
+        etag: ETag of the previous listing; sent as If-None-Match
+    """
+    url: Optional[str] = f"{repo_path}/git/matching-refs/tags/{quote(prefix, safe='/')}"
+    parameters: Optional[Dict] = {'per_page': PAGE_SIZE}
+    headers = {'If-None-Match': etag} if etag else {}
+    tags: List[Tag] = []
+    first_etag = None
+    pages = 0
+    while url:
+        response_headers, data = request(url, parameters, headers)
+        if pages == 0:
+            if data is None and etag:
+                return TagListing([], etag, unchanged=True)
+            first_etag = _header(response_headers, 'etag')
+        pages += 1
+        for ref in data or []:
+            name = ref.get('ref', '')
+            if not name.startswith(TAG_REF_PREFIX):
+                continue
+            target = ref.get('object') or {}
+            tags.append(Tag(name[len(TAG_REF_PREFIX):], target.get('sha', ''), target.get('type', 'commit')))
+        link = LINK_NEXT_RE.search(_header(response_headers, 'link') or '')
+        # The next link already carries the query parameters
+        url, parameters, headers = (link.group(1) if link else None), None, {}
+    # A later page can change without the first page's ETag changing
+    return TagListing(tags, first_etag if pages == 1 else None)
+
+
+def peel(request: Callable[[str, Optional[Dict], Dict], Tuple[Dict, Any]], repo_path: str, tag: Tag) -> str:
+    """Commit SHA a tag points to (annotated tags point to a tag object first)."""
+    sha, kind = tag.sha, tag.type
+    while kind == 'tag':
+        _, data = request(f"{repo_path}/git/tags/{sha}", None, {})
+        target = data.get('object') or {}
+        sha, kind = target.get('sha', ''), target.get('type', 'commit')
+    return sha
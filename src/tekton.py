@@ -0,0 +1,100 @@
+"""
+Tekton PipelineRun helpers shared by the poller subsystems.
+"""
+
+import hashlib
+import re
+from typing import Any, Dict, Iterator, Optional
+
+TEKTON_GROUP = 'tekton.dev'
+TEKTON_VERSION = 'v1beta1'
+PIPELINERUN_PLURAL = 'pipelineruns'
+PIPELINE_PLURAL = 'pipelines'
+
+MANAGED_BY_LABEL = 'app.kubernetes.io/managed-by'
+MANAGED_BY_VALUE = 'github-poller'
+REPOSITORY_LABEL = 'github-poller/repository'
+PIPELINE_LABEL = 'tekton.dev/pipeline'
+# Set on PipelineRuns created for a batch of changes
+BATCH_LABEL = 'github-poller/batch'
+# SHA a single-repository PipelineRun builds
+COMMIT_LABEL = 'github-poller/commit'
+
+MAX_NAME_LENGTH = 63
+NAME_HASH_LENGTH = 10
+
+# Label selector matching every PipelineRun created by the poller
+MANAGED_SELECTOR = f"{MANAGED_BY_LABEL}={MANAGED_BY_VALUE}"
+
+
+def pipelinerun_name(prefix: str, *identity: str) -> str:
+    """
+    Deterministic PipelineRun name: a readable prefix plus a hash of ``identity``.
+
+    The same identity always yields the same name, so creating a PipelineRun
+    twice (a retried create, a parallel trigger, a run that died before saving
+    its state) ends in AlreadyExists instead of a duplicate run. The prefix is
+    shortened, never the hash.
+    """
+    digest = hashlib.sha256('\0'.join(identity).encode()).hexdigest()[:NAME_HASH_LENGTH]
+    prefix = re.sub(r'[^a-z0-9-]+', '-', prefix.lower())
+    prefix = prefix[:MAX_NAME_LENGTH - NAME_HASH_LENGTH - 1].strip('-') or 'run'
+    return f"{prefix}-{digest}"
+
+
+def list_pipelineruns(custom_client, namespace: str,
+                      label_selector: str = MANAGED_SELECTOR,
+                      page_size: int = 500) -> Iterator[Dict]:
+    """
+    Iterate over PipelineRuns matching a label selector, one page at a time.
+
+    Args:
+        custom_client: Kubernetes CustomObjectsApi client
+        namespace: Namespace to list
+        label_selector: Label selector applied server-side
+        page_size: Number of items requested per page
+
+    Yields:
+        PipelineRun objects as dicts
+    """
+    return list_tekton_objects(custom_client, namespace, PIPELINERUN_PLURAL, label_selector, page_size)
+
+
+def list_tekton_objects(custom_client, namespace: str, plural: str,
+                        label_selector: Optional[str] = None,
+                        page_size: int = 500) -> Iterator[Dict]:
+    """Iterate over Tekton objects of ``plural`` (e.g. 'pipelines'), one page at a time."""
+    continue_token = None
+    while True:
+        kwargs: Dict[str, Any] = {'limit': page_size}
+        if label_selector:
+            kwargs['label_selector'] = label_selector
+        if continue_token:
+            kwargs['_continue'] = continue_token
+
+        page = custom_client.list_namespaced_custom_object(
+            group=TEKTON_GROUP,
+            version=TEKTON_VERSION,
+            namespace=namespace,
+            plural=plural,
+            **kwargs
+        )
+        for item in page.get('items', []):
+            yield item
+
+        continue_token = (page.get('metadata') or {}).get('continue')
+        if not continue_token:
+            return
+
+
+def succeeded_status(pipeline_run: Dict) -> Optional[str]:
+    """Return the status of the 'Succeeded' condition ('True', 'False', 'Unknown') or None."""
+    for condition in (pipeline_run.get('status') or {}).get('conditions') or []:
+        if condition.get('type') == 'Succeeded':
+            return condition.get('status')
+    return None
+
+
+def is_running(pipeline_run: Dict) -> bool:
+    """A PipelineRun is running until its 'Succeeded' condition becomes True or False."""
+    return succeeded_status(pipeline_run) not in ('True', 'False')
@@ -0,0 +1,181 @@
+"""
+Precompiled PipelineRun templates.
+
+Each repository entry is compiled once, when the config is loaded, into an
+immutable PipelineRunTemplate. Repository placeholders are resolved at compile
+time; only per-commit values are filled in when a PipelineRun is rendered.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from tekton import (
+    MANAGED_BY_LABEL, MANAGED_BY_VALUE, PIPELINE_LABEL, REPOSITORY_LABEL,
+    TEKTON_GROUP, TEKTON_VERSION,
+)
+
+PLACEHOLDER_RE = re.compile(r'\$\{([^}]*)\}')
+
+# Placeholders resolved when the template is compiled
+REPO_VARIABLES = frozenset({'repo.url', 'repo.branch', 'repo.name'})
+# Placeholders resolved for each trigger
+COMMIT_VARIABLES = frozenset({'commit.sha', 'commit.shortSha', 'previous.sha', 'previous.shortSha',
+                              'tag.name', 'previous.tag'})
+KNOWN_VARIABLES = REPO_VARIABLES | COMMIT_VARIABLES
+
+
+@dataclass(frozen=True)
+class Variable:
+    """A placeholder left in a compiled value, filled in at render time."""
+    name: str
+
+
+# A compiled value is a sequence of literal strings and Variables
+CompiledValue = Tuple[Union[str, Variable], ...]
+
+
+def repo_variables(repo_config: Dict) -> Dict[str, str]:
+    """Placeholder values derived from a repository entry."""
+    return {
+        'repo.url': repo_config.get('url', '') or '',
+        'repo.branch': repo_config.get('branch', 'main') or 'main',
+        'repo.name': repo_config.get('name', '') or '',
+    }
+
+
+def commit_variables(sha: str = '', previous_sha: str = '', tag: str = '',
+                     previous_tag: str = '') -> Dict[str, str]:
+    """Placeholder values describing the commit (and, for tag entries, the tag) being built."""
+    return {
+        'commit.sha': sha,
+        'commit.shortSha': sha[:7],
+        'previous.sha': previous_sha,
+        'previous.shortSha': previous_sha[:7],
+        'tag.name': tag,
+        'previous.tag': previous_tag,
+    }
+
+
+def expand(value: str, variables: Dict[str, str]) -> str:
+    """
+    Expand placeholders in a single regex pass.
+
+    Unknown placeholders are left untouched.
+    """
+    return PLACEHOLDER_RE.sub(lambda m: variables.get(m.group(1), m.group(0)), value)
+
+
+def compile_value(value: str, static: Dict[str, str], unknown: List[str]) -> CompiledValue:
+    """
+    Split a value into literal and placeholder segments.
+
+    Placeholders found in ``static`` are substituted immediately; per-commit
+    placeholders become Variables; anything else is kept literally and its
+    name appended to ``unknown``.
+    """
+    segments: List[Union[str, Variable]] = []
+    literal = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(value):
+        literal.append(value[position:match.start()])
+        name = match.group(1)
+        if name in static:
+            literal.append(static[name])
+        elif name in COMMIT_VARIABLES:
+            segments.append(''.join(literal))
+            literal = []
+            segments.append(Variable(name))
+        else:
+            unknown.append(name)
+            literal.append(match.group(0))
+        position = match.end()
+    literal.append(value[position:])
+    segments.append(''.join(literal))
+    return tuple(segment for segment in segments if segment != '')
+
+
+def render_value(compiled: CompiledValue, variables: Dict[str, str]) -> str:
+    """Join a compiled value, filling in per-commit Variables."""
+    if len(compiled) == 1 and isinstance(compiled[0], str):
+        return compiled[0]
+    return ''.join(
+        variables.get(segment.name, '') if isinstance(segment, Variable) else segment
+        for segment in compiled
+    )
+
+
+@dataclass(frozen=True)
+class PipelineRunTemplate:
+    """Immutable PipelineRun skeleton for one repository entry."""
+    repo_name: str
+    pipeline: str
+    params: Tuple[Tuple[str, CompiledValue], ...]
+    workspaces: Tuple[Tuple[str, str], ...]
+    service_account: Optional[str]
+    timeout: Optional[str]
+    unknown_placeholders: Tuple[str, ...]
+
+    def render(self, name: str, namespace: str, variables: Dict[str, str]) -> Dict:
+        """Build the PipelineRun body for one trigger."""
+        spec: Dict = {"pipelineRef": {"name": self.pipeline}}
+        if self.service_account:
+            spec['serviceAccountName'] = self.service_account
+        if self.params:
+            spec['params'] = [
+                {"name": param_name, "value": render_value(compiled, variables)}
+                for param_name, compiled in self.params
+            ]
+        if self.workspaces:
+            spec['workspaces'] = [
+                {"name": ws_name, "persistentVolumeClaim": {"claimName": ws_claim}}
+                for ws_name, ws_claim in self.workspaces
+            ]
+        if self.timeout:
+            spec['timeout'] = self.timeout
+
+        return {
+            "apiVersion": f"{TEKTON_GROUP}/{TEKTON_VERSION}",
+            "kind": "PipelineRun",
+            "metadata": {
+                "name": name,
+                "namespace": namespace,
+                "labels": {
+                    MANAGED_BY_LABEL: MANAGED_BY_VALUE,
+                    REPOSITORY_LABEL: self.repo_name,
+                    PIPELINE_LABEL: self.pipeline
+                }
+            },
+            "spec": spec
+        }
+
+
+def compile_template(repo_config: Dict) -> PipelineRunTemplate:
+    """Compile a repository entry into a PipelineRunTemplate."""
+    static = repo_variables(repo_config)
+    unknown: List[str] = []
+
+    params = []
+    for param in repo_config.get('params') or []:
+        param_name = param.get('name')
+        param_value = param.get('value')
+        if param_name and param_value is not None:
+            params.append((param_name, compile_value(str(param_value), static, unknown)))
+
+    workspaces = []
+    for workspace in repo_config.get('workspaces') or []:
+        ws_name = workspace.get('name')
+        ws_claim = workspace.get('claimName')
+        if ws_name and ws_claim:
+            workspaces.append((ws_name, ws_claim))
+
+    return PipelineRunTemplate(
+        repo_name=repo_config.get('name', 'unknown'),
+        pipeline=repo_config.get('pipeline', ''),
+        params=tuple(params),
+        workspaces=tuple(workspaces),
+        service_account=repo_config.get('serviceAccount') or None,
+        timeout=repo_config.get('timeout') or None,
+        unknown_placeholders=tuple(dict.fromkeys(unknown)),
+    )
+
@@ -0,0 +1,364 @@
+"""
+Shared, instrumented HTTP transport for every outbound GitHub call.
+
+The installation token fetch and every PyGithub client (REST and GraphQL
+alike) send their requests through one requests Session, so connection
+reuse, timeouts and compression behave the same on every code path:
+
+- a keep-alive pool per host (GITHUB_POOL_SIZE connections, or a host's
+  ``poolSize``); retries are left to resilience.py
+- separate connect and read timeouts (GITHUB_CONNECT_TIMEOUT,
+  GITHUB_READ_TIMEOUT, or a host's ``timeout`` for reads)
+- gzip-compressed responses
+
+Every response is timed by phase (DNS, TCP connect, TLS handshake and time to
+first byte, the first three only on a new connection) and its rate-limit
+headers are captured. The resulting RequestTiming is added to per-host
+TransportStats and passed to the hooks registered with add_hook().
+"""
+
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+from urllib.parse import urlsplit
+
+import requests
+from github.Requester import Requester, RequestsResponse
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util import connection
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_HEADERS = ('x-ratelimit-remaining', 'x-ratelimit-limit', 'x-ratelimit-reset',
+                      'x-ratelimit-resource')
+
+
+@dataclass
+class ConnectionTiming:
+    """Time spent opening a connection, in seconds."""
+    dns: float = 0.0
+    connect: float = 0.0
+    tls: float = 0.0
+
+
+@dataclass
+class RequestTiming:
+    """Timings and rate-limit headers of one request."""
+    method: str
+    host: str
+    status: int
+    ttfb: float
+    total: float
+    # None when the request went over a reused keep-alive connection
+    connection: Optional[ConnectionTiming] = None
+    rate_limit: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def reused(self) -> bool:
+        return self.connection is None
+
+
+def _netloc(scheme: str, host: str, port: Optional[int]) -> str:
+    """host[:port], leaving out the scheme's default port."""
+    if port is None or port == (443 if scheme == 'https' else 80):
+        return host
+    return f"{host}:{port}"
+
+
+class _TimedConnectionMixin:
+    """Records DNS/connect(/TLS) time of new connections and the time to first byte."""
+
+    timing: Optional[ConnectionTiming] = None
+    _sent_at: float = 0.0
+
+    def _new_conn(self):
+        # Same as urllib3's HTTPConnection._new_conn, with name resolution
+        # done (and timed) separately from the TCP connect
+        extra_kw = {}
+        if self.source_address:
+            extra_kw['source_address'] = self.source_address
+        if self.socket_options:
+            extra_kw['socket_options'] = self.socket_options
+
+        timing = ConnectionTiming()
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, connection.allowed_gai_family(),
+                                           socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}")
+        resolved = time.perf_counter()
+        timing.dns = resolved - started
+
+        error = None
+        for _, _, _, _, address in addresses:
+            try:
+                conn = connection.create_connection((address[0], self.port), self.timeout, **extra_kw)
+                break
+            except socket.timeout:
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})")
+            except OSError as e:
+                error = e
+        else:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {error}")
+
+        timing.connect = time.perf_counter() - resolved
+        self.timing = timing
+        return conn
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        self._sent_at = time.perf_counter()
+
+    def request_chunked(self, *args, **kwargs):
+        super().request_chunked(*args, **kwargs)
+        self._sent_at = time.perf_counter()
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        # Picked up by Transport._on_response via response.raw._original_response
+        response.poller_ttfb = time.perf_counter() - self._sent_at
+        response.poller_connection = self.timing
+        self.timing = None
+        return response
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        timing = self.timing
+        timing.tls = max(0.0, time.perf_counter() - started - timing.dns - timing.connect)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools use the timed connections."""
+
+    _pool_classes = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+    def proxy_manager_for(self, *args, **kwargs):
+        manager = super().proxy_manager_for(*args, **kwargs)
+        manager.pool_classes_by_scheme = self._pool_classes
+        return manager
+
+
+class _HostStats:
+    __slots__ = ('requests', 'connections', 'dns', 'connect', 'tls', 'ttfb', 'max_ttfb', 'rate_limit')
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.max_ttfb = 0.0
+        self.rate_limit: Dict[str, str] = {}
+
+
+class TransportStats:
+    """Per-host request counts, connection reuse and phase timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts: Dict[str, _HostStats] = defaultdict(_HostStats)
+
+    def record(self, timing: RequestTiming) -> None:
+        with self._lock:
+            stats = self.hosts[timing.host]
+            stats.requests += 1
+            stats.ttfb += timing.ttfb
+            stats.max_ttfb = max(stats.max_ttfb, timing.ttfb)
+            if timing.connection is not None:
+                stats.connections += 1
+                stats.dns += timing.connection.dns
+                stats.connect += timing.connection.connect
+                stats.tls += timing.connection.tls
+            if timing.rate_limit:
+                stats.rate_limit = timing.rate_limit
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hosts = defaultdict(_HostStats)
+
+    def summary(self) -> str:
+        """Render the per-host table (average connection phases are per new connection)."""
+        lines = ["HTTP transport:",
+                 f"  {'host':<24} {'requests':>8} {'new conn':>8} {'dns':>8} {'connect':>8} "
+                 f"{'tls':>8} {'ttfb avg':>9} {'ttfb max':>9}  rate limit"]
+        with self._lock:
+            hosts = sorted(self.hosts.items())
+        for host, stats in hosts:
+            opened = stats.connections or 1
+            rate_limit = ''
+            if stats.rate_limit:
+                rate_limit = (f"{stats.rate_limit.get('x-ratelimit-remaining', '?')}/"
+                              f"{stats.rate_limit.get('x-ratelimit-limit', '?')}")
+            lines.append(f"  {host:<24} {stats.requests:>8} {stats.connections:>8} "
+                         f"{stats.dns / opened:>7.3f}s {stats.connect / opened:>7.3f}s "
+                         f"{stats.tls / opened:>7.3f}s {stats.ttfb / stats.requests:>8.3f}s "
+                         f"{stats.max_ttfb:>8.3f}s  {rate_limit}")
+        return '\n'.join(lines)
+
+    def log_summary(self) -> None:
+        if self.hosts:
+            logger.info(self.summary())
+
+
+class Transport:
+    """One requests Session (and keep-alive pools) shared by all GitHub calls."""
+
+    def __init__(self, pool_size: int = DEFAULT_POOLSIZE, connect_timeout: float = 5.0,
+                 read_timeout: int = 15):
+        if pool_size <= 0 or connect_timeout <= 0 or read_timeout <= 0:
+            raise ValueError("pool size and timeouts must be positive")
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.stats = TransportStats()
+        self._hooks: List[Callable[[RequestTiming], None]] = []
+        self._lock = threading.Lock()
+        # URL prefix -> pool size of hosts with a dedicated pool
+        self._mounted: Dict[str, int] = {}
+
+        self.session = requests.Session()
+        # Keeps requests from falling back to credentials in ~/.netrc
+        self.session.auth = Requester.noopAuth
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        self.session.hooks['response'].append(self._on_response)
+        adapter = self._adapter(pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_env(cls) -> 'Transport':
+        return cls(
+            pool_size=int(os.getenv('GITHUB_POOL_SIZE', str(DEFAULT_POOLSIZE))),
+            connect_timeout=float(os.getenv('GITHUB_CONNECT_TIMEOUT', '5')),
+            # PyGithub takes whole seconds
+            read_timeout=int(os.getenv('GITHUB_READ_TIMEOUT', '15')),
+        )
+
+    @staticmethod
+    def _adapter(pool_size: int) -> HTTPAdapter:
+        # Retries are handled by resilience.py, not inside urllib3
+        return _TimedAdapter(pool_connections=DEFAULT_POOLSIZE, pool_maxsize=pool_size,
+                             max_retries=0, pool_block=DEFAULT_POOLBLOCK)
+
+    def add_hook(self, hook: Callable[[RequestTiming], None]) -> None:
+        """Call ``hook`` with the RequestTiming of every response."""
+        self._hooks.append(hook)
+
+    def timeout(self, read_timeout: Optional[float] = None) -> Tuple[float, float]:
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+    def use_pool_size(self, scheme: str, host: str, port: Optional[int], pool_size: Optional[int]) -> None:
+        """Give a host its own pool size (when it differs from the shared default)."""
+        if not pool_size or pool_size == self.pool_size:
+            return
+        prefix = f"{scheme}://{_netloc(scheme, host, port)}/"
+        with self._lock:
+            if self._mounted.get(prefix) == pool_size:
+                return
+            self._mounted[prefix] = pool_size
+            # requests picks the adapter with the longest matching prefix
+            self.session.mount(prefix, self._adapter(pool_size))
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout())
+        return self.session.post(url, **kwargs)
+
+    def _on_response(self, response: requests.Response, *args, **kwargs) -> None:
+        # Responses built by the cassette harness carry the timings themselves
+        original = getattr(response.raw, '_original_response', None) or response.raw
+        ttfb = getattr(original, 'poller_ttfb', None)
+        if ttfb is None:
+            return
+        headers = response.headers
+        timing = RequestTiming(
+            method=response.request.method or '',
+            host=urlsplit(response.url).hostname or '',
+            status=response.status_code,
+            ttfb=ttfb,
+            total=response.elapsed.total_seconds(),
+            connection=getattr(original, 'poller_connection', None),
+            rate_limit={name: headers[name] for name in RATE_LIMIT_HEADERS if name in headers},
+        )
+        self.stats.record(timing)
+        for hook in self._hooks:
+            try:
+                hook(timing)
+            except Exception as e:
+                logger.warning(f"Transport hook failed: {e}")
+
+    def install(self) -> None:
+        """Route every PyGithub client's requests through this transport."""
+        # PyGithub only calls the injected classes to create connections, so partials will do
+        Requester.injectConnectionClasses(cast(Any, functools.partial(_GithubConnection, self, 'http')),
+                                          cast(Any, functools.partial(_GithubConnection, self, 'https')))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class _GithubConnection:
+    """
+    PyGithub connection (it mimics an httplib connection) backed by a Transport.
+
+    PyGithub's retry argument is ignored: retries are handled by resilience.py.
+    """
+
+    def __init__(self, transport: Transport, scheme: str, host: str, port: Optional[int] = None,
+                 strict: bool = False, timeout: Optional[float] = None, retry=None,
+                 pool_size: Optional[int] = None, **kwargs):
+        self.transport = transport
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = transport.timeout(timeout)
+        self.verify = kwargs.get('verify', True)
+        transport.use_pool_size(scheme, host, port, pool_size)
+
+    def request(self, verb: str, url: str, input, headers: Dict[str, str]) -> None:
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+
+    def getresponse(self) -> RequestsResponse:
+        response = self.transport.session.request(
+            self.verb, f"{self.scheme}://{_netloc(self.scheme, self.host, self.port)}{self.url}", headers=self.headers, data=self.input,
+            timeout=self.timeout, verify=self.verify, allow_redirects=False,
+        )
+        return RequestsResponse(response)
+
+    def close(self) -> None:
+        # The pools belong to the shared transport
+        pass
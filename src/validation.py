@@ -0,0 +1,250 @@
+"""
+Cached validation of compiled PipelineRun shapes.
+
+A typo in a repository's ``pipeline``, a missing PVC or a param the Pipeline
+does not get would otherwise only surface when a real change fails to create
+its PipelineRun (and then on every run after it). With validation enabled,
+every distinct PipelineRun shape (pipeline, param names, workspaces, service
+account and timeout) is checked once, before it is needed:
+
+- the referenced Pipeline, ServiceAccount and PVCs must exist
+- the Pipeline's params without a default and its non-optional workspaces
+  must be provided (the batch params count as provided for batched pipelines)
+- a server-side dry-run create must be accepted (schema and admission webhooks)
+
+Configured in config.yaml::
+
+    validation:
+      enabled: true
+
+Results are kept in the ``validations`` mapping of the config (shape hash ->
+result), together with the resourceVersions of the referenced objects. A
+shape is checked again only when the config changes it or one of those
+objects is created, changed or deleted. Repositories whose shape failed are
+quarantined: they are not looked up or triggered until then.
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Set
+
+from kubernetes.client.rest import ApiException
+
+from batching import BATCH_PARAMS
+from models import RepositoryConfig
+from tekton import pipelinerun_name
+from templates import PipelineRunTemplate, commit_variables
+
+logger = logging.getLogger(__name__)
+
+STATUS_VALID = 'valid'
+STATUS_QUARANTINED = 'quarantined'
+
+KIND_PIPELINE = 'Pipeline'
+KIND_SERVICE_ACCOUNT = 'ServiceAccount'
+KIND_CLAIM = 'PersistentVolumeClaim'
+
+# Statuses of a rejected dry-run that mean the PipelineRun itself is invalid
+INVALID_STATUSES = (400, 422)
+# SHA rendered into the dry-run body in place of a real commit
+PLACEHOLDER_SHA = '0' * 40
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def shape_key(template: PipelineRunTemplate, batched: bool = False) -> str:
+    """Hash of everything that decides whether a PipelineRun can be created."""
+    shape: Dict[str, Any] = {
+        'pipeline': template.pipeline,
+        'params': sorted(name for name, _ in template.params),
+        'workspaces': sorted(template.workspaces),
+        'serviceAccount': template.service_account,
+        'timeout': template.timeout,
+    }
+    if batched:
+        shape['batched'] = True
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def references(template: PipelineRunTemplate) -> List[str]:
+    """``Kind/name`` of the objects a PipelineRun of the template refers to."""
+    refs = [f"{KIND_PIPELINE}/{template.pipeline}"]
+    if template.service_account:
+        refs.append(f"{KIND_SERVICE_ACCOUNT}/{template.service_account}")
+    refs.extend(f"{KIND_CLAIM}/{claim}" for _, claim in template.workspaces)
+    return sorted(set(refs))
+
+
+def rejection_reason(error: Exception) -> Optional[str]:
+    """The API server's message if ``error`` rejects the PipelineRun itself, else None."""
+    if not isinstance(error, ApiException) or error.status not in INVALID_STATUSES:
+        return None
+    try:
+        message = json.loads(error.body).get('message')
+    except (TypeError, ValueError, AttributeError):
+        message = None
+    return message or error.reason or f"HTTP {error.status}"
+
+
+@dataclass
+class ShapeResult:
+    status: str
+    reason: str = ''
+
+
+def check_pipeline(template: PipelineRunTemplate, pipeline: Dict, extra_params: Sequence[str] = ()) -> List[str]:
+    """Problems binding the template's params (plus ``extra_params``) and workspaces to the Pipeline."""
+    spec = pipeline.get('spec') or {}
+    params = {name for name, _ in template.params} | set(extra_params)
+    workspaces = {name for name, _ in template.workspaces}
+    problems = []
+    missing = [param.get('name') for param in spec.get('params') or []
+               if 'default' not in param and param.get('name') not in params]
+    if missing:
+        problems.append(f"params without default not provided: {', '.join(missing)}")
+    unbound = [workspace.get('name') for workspace in spec.get('workspaces') or []
+               if not workspace.get('optional') and workspace.get('name') not in workspaces]
+    if unbound:
+        problems.append(f"workspaces not bound: {', '.join(unbound)}")
+    return problems
+
+
+class PipelineRunValidator:
+    """
+    Validates the shapes of the configured repositories, caching the results.
+
+    ``list_objects(kind)`` returns ``{name: object}`` of a kind in the
+    namespace; ``dry_run(body)`` submits a dry-run create and raises the
+    ApiException if it is rejected. PipelineRuns of ``batched_pipelines``
+    also get the batch params (see batching.py).
+    """
+
+    def __init__(self, namespace: str, cache: Dict[str, Dict],
+                 list_objects: Callable[[str], Dict[str, Dict]],
+                 dry_run: Callable[[Dict], None],
+                 batched_pipelines: Collection[str] = ()):
+        self.namespace = namespace
+        self.cache = cache
+        self.batched_pipelines = set(batched_pipelines)
+        self._list_objects = list_objects
+        self._dry_run = dry_run
+        self.changed = False
+        self.validated = 0
+
+    def check(self, repositories: List[RepositoryConfig],
+              now: Optional[datetime] = None) -> Dict[str, Dict]:
+        """
+        Validate every shape that is new or whose referenced objects changed.
+
+        Returns:
+            repository name -> cache entry, for the quarantined repositories
+        """
+        now = now or datetime.now(timezone.utc)
+        shapes: Dict[str, List[RepositoryConfig]] = {}
+        for repo in repositories:
+            shapes.setdefault(self._key(repo.template), []).append(repo)
+
+        objects = self._list(shapes)
+        quarantined = {}
+        for key, repos in shapes.items():
+            template = repos[0].template
+            versions = self._versions(template, objects)
+            entry = self.cache.get(key)
+            if entry is None or (versions is not None and entry.get('references') != versions):
+                result = self._validate(key, template, objects)
+                if result is None:
+                    # Could not tell; the repositories are polled as usual
+                    continue
+                entry = {'status': result.status, 'pipeline': template.pipeline,
+                         'references': versions, 'checkedAt': now.strftime(TIME_FORMAT)}
+                if result.reason:
+                    entry['reason'] = result.reason
+                self._record(key, entry, repos)
+            if entry.get('status') == STATUS_QUARANTINED:
+                for repo in repos:
+                    quarantined[repo.name] = entry
+
+        for key in [key for key in self.cache if key not in shapes]:
+            # Shapes no longer used by any repository
+            del self.cache[key]
+            self.changed = True
+        return quarantined
+
+    def cached(self, repositories: List[RepositoryConfig]) -> Dict[str, Dict]:
+        """Quarantined repositories according to the cached results alone (no API calls)."""
+        quarantined = {}
+        for repo in repositories:
+            entry = self.cache.get(self._key(repo.template))
+            if entry is not None and entry.get('status') == STATUS_QUARANTINED:
+                quarantined[repo.name] = entry
+        return quarantined
+
+    def _key(self, template: PipelineRunTemplate) -> str:
+        return shape_key(template, template.pipeline in self.batched_pipelines)
+
+    def _list(self, shapes: Dict[str, List[RepositoryConfig]]) -> Optional[Dict[str, Dict[str, Dict]]]:
+        kinds: Set[str] = set()
+        for repos in shapes.values():
+            kinds.update(ref.split('/', 1)[0] for ref in references(repos[0].template))
+        try:
+            return {kind: self._list_objects(kind) for kind in sorted(kinds)}
+        except Exception as e:
+            # Without the objects only the dry-run can be checked; cached results are kept
+            logger.warning(f"Could not list objects referenced by PipelineRuns: {e}")
+            return None
+
+    @staticmethod
+    def _versions(template: PipelineRunTemplate,
+                  objects: Optional[Dict[str, Dict[str, Dict]]]) -> Optional[Dict[str, Optional[str]]]:
+        """resourceVersion (None if missing) of each referenced object."""
+        if objects is None:
+            return None
+        versions = {}
+        for ref in references(template):
+            kind, name = ref.split('/', 1)
+            obj = objects[kind].get(name)
+            versions[ref] = None if obj is None else str((obj.get('metadata') or {}).get('resourceVersion', ''))
+        return versions
+
+    def _validate(self, key: str, template: PipelineRunTemplate,
+                  objects: Optional[Dict[str, Dict[str, Dict]]]) -> Optional[ShapeResult]:
+        self.validated += 1
+        if objects is not None:
+            missing = [ref for ref in references(template)
+                       if ref.split('/', 1)[1] not in objects[ref.split('/', 1)[0]]]
+            if missing:
+                return ShapeResult(STATUS_QUARANTINED, f"not found: {', '.join(missing)}")
+            batch_params = BATCH_PARAMS if template.pipeline in self.batched_pipelines else ()
+            problems = check_pipeline(template, objects[KIND_PIPELINE][template.pipeline], batch_params)
+            if problems:
+                return ShapeResult(STATUS_QUARANTINED, '; '.join(problems))
+
+        body = template.render(pipelinerun_name(f"{template.pipeline}-validate", key), self.namespace,
+                               commit_variables(PLACEHOLDER_SHA, PLACEHOLDER_SHA))
+        if template.pipeline in self.batched_pipelines:
+            spec = body['spec']
+            spec['params'] = spec.get('params', []) + [{'name': name, 'value': ''} for name in BATCH_PARAMS]
+        try:
+            self._dry_run(body)
+        except Exception as e:
+            if isinstance(e, ApiException) and e.status == 409:
+                # Only an existing object of the same name stopped it
+                return ShapeResult(STATUS_VALID)
+            reason = rejection_reason(e)
+            if reason is None:
+                logger.warning(f"Dry-run of pipeline {template.pipeline} failed, not validated: {e}")
+                return None
+            return ShapeResult(STATUS_QUARANTINED, f"dry-run rejected: {reason}")
+        return ShapeResult(STATUS_VALID)
+
+    def _record(self, key: str, entry: Dict, repos: List[RepositoryConfig]) -> None:
+        previous = self.cache.get(key, {}).get('status')
+        self.cache[key] = entry
+        self.changed = True
+        names = ', '.join(repo.name for repo in repos)
+        if entry['status'] == STATUS_QUARANTINED:
+            logger.error(f"Quarantined {names} (pipeline {entry['pipeline']}): {entry['reason']}")
+        elif previous == STATUS_QUARANTINED:
+            logger.info(f"Released {names} (pipeline {entry['pipeline']}) from quarantine")
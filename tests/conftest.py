@@ -0,0 +1,38 @@
+"""
+テスト共通のフィクスチャ
+"""
+
+import pytest
+from unittest.mock import patch
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from poller import GitHubPoller
+
+
+@pytest.fixture
+def poller_env(monkeypatch):
+    """GitHubPoller 作成前の環境変数（PAT 認証）。モジュールごとの設定はこれを上書きして追加する"""
+    monkeypatch.setenv('GITHUB_TOKEN', 'test-token-123')
+    monkeypatch.setenv('GITHUB_AUTH_TYPE', 'pat')
+    return monkeypatch
+
+
+@pytest.fixture
+def github():
+    """GitHub クライアントを作る関数（None の場合は Mock をそのまま使う）"""
+    return None
+
+
+@pytest.fixture
+def poller(poller_env, github):
+    """Kubernetes と GitHub のクライアントをモックした GitHubPoller インスタンスを作成"""
+    with patch('poller.config.load_incluster_config'), \
+            patch('poller.client.CoreV1Api'), \
+            patch('poller.client.CustomObjectsApi'), \
+            patch('poller.Github', side_effect=github):
+        poller = GitHubPoller()
+        yield poller
+        if poller.history is not None:
+            poller.history.close()
@@ -0,0 +1,164 @@
+"""
+トリガー流量制御（アドミッション制御とバックログ）のテスト
+"""
+
+from collections import Counter
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from kubernetes.client.rest import ApiException
+
+from admission import TriggerAdmission, count_running
+from models import parse_repository
+
+
+def _pipeline_run(pipeline, status=None):
+    """テスト用の PipelineRun を作成"""
+    run = {'metadata': {'labels': {'tekton.dev/pipeline': pipeline}}}
+    if status is not None:
+        run['status'] = {'conditions': [{'type': 'Succeeded', 'status': status}]}
+    return run
+
+
+class TestTriggerAdmission:
+    """TriggerAdmission クラスのテスト"""
+
+    def test_count_running_paginates(self):
+        """ページングしながら実行中の PipelineRun を数える"""
+        custom_client = Mock()
+        custom_client.list_namespaced_custom_object.side_effect = [
+            {'items': [_pipeline_run('build', 'Unknown'), _pipeline_run('build', 'True')],
+             'metadata': {'continue': 'next'}},
+            {'items': [_pipeline_run('scan'), _pipeline_run('build', 'False')],
+             'metadata': {}},
+        ]
+
+        running = count_running(custom_client, 'test-namespace')
+
+        assert running == Counter({'build': 1, 'scan': 1})
+        second_call = custom_client.list_namespaced_custom_object.call_args_list[1]
+        assert second_call[1]['_continue'] == 'next'
+        assert second_call[1]['label_selector'] == 'app.kubernetes.io/managed-by=github-poller'
+
+    def test_global_and_pipeline_limits(self):
+        """全体上限とパイプライン別上限"""
+        admission = TriggerAdmission(
+            {'maxRunning': 3, 'pipelines': {'integration': 1}},
+            Counter({'build': 1}),
+            []
+        )
+
+        assert admission.try_admit('integration') is True
+        assert admission.try_admit('integration') is False  # パイプライン上限
+        assert admission.try_admit('build') is True
+        assert admission.try_admit('build') is False        # 全体上限
+
+        admission.release('build')
+        assert admission.try_admit('build') is True
+
+    def test_enqueue_coalesces_per_repository(self):
+        """同じリポジトリのエントリは最新 SHA に置き換わる"""
+        backlog = []
+        admission = TriggerAdmission({}, Counter(), backlog)
+        repo = parse_repository({'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                                 'pipeline': 'build', 'priority': 3})
+
+        admission.enqueue(repo, 'sha-1', 'sha-0')
+        admission.enqueue(repo, 'sha-2', 'sha-1')
+
+        assert len(backlog) == 1
+        assert backlog[0]['sha'] == 'sha-2'
+        assert backlog[0]['previousSHA'] == 'sha-0'
+        assert backlog[0]['priority'] == 3
+
+    def test_ordered_backlog_by_priority(self):
+        """優先度の高い順、同じ優先度なら古い順"""
+        backlog = [
+            {'repository': 'a', 'sha': '1', 'priority': 0, 'enqueuedAt': '2024-01-01T00:00:00Z'},
+            {'repository': 'b', 'sha': '2', 'priority': 5, 'enqueuedAt': '2024-01-02T00:00:00Z'},
+            {'repository': 'c', 'sha': '3', 'priority': 0, 'enqueuedAt': '2023-12-31T00:00:00Z'},
+        ]
+        admission = TriggerAdmission({}, Counter(), backlog)
+
+        assert [e['repository'] for e in admission.ordered_backlog()] == ['b', 'c', 'a']
+
+
+class TestPollerAdmission:
+    """GitHubPoller とアドミッション制御の連携テスト"""
+
+    def _set_config(self, poller, config_data):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump(config_data)}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        return mock_configmap
+
+    def _saved_config(self, mock_configmap):
+        return yaml.safe_load(mock_configmap.data['config.yaml'])
+
+    def test_change_over_capacity_is_queued(self, poller):
+        """上限を超えた変更はバックログに入り、SHA は記録される"""
+        mock_configmap = self._set_config(poller, {
+            'admission': {'maxRunning': 1},
+            'repositories': [
+                {'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                 'pipeline': 'build', 'lastCheckedSHA': 'old-1'},
+                {'name': 'repo2', 'url': 'https://github.com/org/repo2',
+                 'pipeline': 'build', 'lastCheckedSHA': 'old-2'},
+            ]
+        })
+        poller.k8s_custom_client.list_namespaced_custom_object.return_value = {'items': []}
+        poller.get_latest_commit_sha = Mock(side_effect=['new-1', 'new-2'])
+        poller.trigger_tekton_pipeline = Mock(return_value=True)
+
+        poller.poll_repositories()
+
+        poller.trigger_tekton_pipeline.assert_called_once()
+        saved = self._saved_config(mock_configmap)
+        assert [r['lastCheckedSHA'] for r in saved['repositories']] == ['new-1', 'new-2']
+        assert len(saved['backlog']) == 1
+        assert saved['backlog'][0]['repository'] == 'repo2'
+        assert saved['backlog'][0]['sha'] == 'new-2'
+
+    def test_backlog_drains_when_capacity_frees(self, poller):
+        """空きができたらバックログから起動される"""
+        mock_configmap = self._set_config(poller, {
+            'admission': {'maxRunning': 1},
+            'backlog': [{'repository': 'repo1', 'pipeline': 'build', 'sha': 'new-1',
+                         'previousSHA': 'old-1', 'priority': 0,
+                         'enqueuedAt': '2024-01-01T00:00:00Z'}],
+            'repositories': [
+                {'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                 'pipeline': 'build', 'lastCheckedSHA': 'new-1'},
+            ]
+        })
+        poller.k8s_custom_client.list_namespaced_custom_object.return_value = {
+            'items': [_pipeline_run('build', 'True')]
+        }
+        poller.get_latest_commit_sha = Mock(return_value='new-1')
+        poller.trigger_tekton_pipeline = Mock(return_value=True)
+
+        poller.poll_repositories()
+
+        poller.trigger_tekton_pipeline.assert_called_once()
+        assert self._saved_config(mock_configmap)['backlog'] == []
+
+    def test_count_failure_defers_triggers(self, poller):
+        """実行数が取得できない場合はすべてバックログに入る"""
+        mock_configmap = self._set_config(poller, {
+            'admission': {'maxRunning': 5},
+            'repositories': [
+                {'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                 'pipeline': 'build', 'lastCheckedSHA': 'old-1'},
+            ]
+        })
+        poller.k8s_custom_client.list_namespaced_custom_object.side_effect = ApiException(status=500)
+        poller.get_latest_commit_sha = Mock(return_value='new-1')
+        poller.trigger_tekton_pipeline = Mock(return_value=True)
+
+        poller.poll_repositories()
+
+        poller.trigger_tekton_pipeline.assert_not_called()
+        assert self._saved_config(mock_configmap)['backlog'][0]['sha'] == 'new-1'
@@ -33,7 +33,7 @@ class TestAuthentication:
             
             assert poller.auth_type == 'pat'
             assert poller.github_token == 'ghp_test_token_123'
-            mock_github.assert_called_once_with('ghp_test_token_123')
+            mock_github.assert_called_once_with('ghp_test_token_123', retry=None, timeout=15)
     
     def test_pat_authentication_from_file(self, monkeypatch, mock_k8s_clients):
         """ファイルからの PAT 認証"""
@@ -46,7 +46,7 @@ class TestAuthentication:
                 poller = GitHubPoller()
                 
                 assert poller.github_token == 'ghp_file_token_456'
-                mock_github.assert_called_once_with('ghp_file_token_456')
+                mock_github.assert_called_once_with('ghp_file_token_456', retry=None, timeout=15)
     
     def test_github_app_authentication(self, monkeypatch, mock_k8s_clients):
         """GitHub Apps 認証"""
@@ -65,13 +65,13 @@ MIIEpAIBAAKCAQEA1234567890
         mock_response.raise_for_status = Mock()
         
         with patch('poller.jwt.encode', return_value='jwt_token'):
-            with patch('poller.requests.post', return_value=mock_response):
+            with patch('poller.Transport.post', return_value=mock_response):
                 with patch('poller.Github') as mock_github:
                     poller = GitHubPoller()
                     
                     assert poller.auth_type == 'app'
                     assert poller.github_token == 'ghs_installation_token_xyz'
-                    mock_github.assert_called_once_with('ghs_installation_token_xyz')
+                    mock_github.assert_called_once_with('ghs_installation_token_xyz', retry=None, timeout=15)
     
     def test_github_app_jwt_generation(self, monkeypatch, mock_k8s_clients):
         """JWT 生成のテスト"""
@@ -91,7 +91,7 @@ MIIEpAIBAAKCAQEA1234567890
         
         with patch('poller.jwt.encode') as mock_jwt_encode:
             mock_jwt_encode.return_value = 'generated_jwt_token'
-            with patch('poller.requests.post', return_value=mock_response):
+            with patch('poller.Transport.post', return_value=mock_response):
                 with patch('poller.Github'):
                     with patch('poller.time.time', return_value=1000000):
                         poller = GitHubPoller()
@@ -126,7 +126,7 @@ KEY
         mock_response.raise_for_status = Mock()
         
         with patch('poller.jwt.encode', return_value='jwt_token'):
-            with patch('poller.requests.post') as mock_post:
+            with patch('poller.Transport.post') as mock_post:
                 mock_post.return_value = mock_response
                 with patch('poller.Github'):
                     poller = GitHubPoller()
@@ -157,7 +157,7 @@ KEY
                 
                 # PAT にフォールバックしていることを確認
                 assert poller.github_token == 'ghp_fallback_token'
-                mock_github.assert_called_once_with('ghp_fallback_token')
+                mock_github.assert_called_once_with('ghp_fallback_token', retry=None, timeout=15)
     
     def test_default_auth_type_is_app(self, monkeypatch, mock_k8s_clients):
         """デフォルトの認証タイプが 'app' であることを確認"""
@@ -177,7 +177,7 @@ KEY
         mock_response.raise_for_status = Mock()
         
         with patch('poller.jwt.encode', return_value='jwt'):
-            with patch('poller.requests.post', return_value=mock_response):
+            with patch('poller.Transport.post', return_value=mock_response):
                 with patch('poller.Github'):
                     poller = GitHubPoller()
                     
@@ -233,7 +233,7 @@ KEY
         
         with patch('builtins.open', side_effect=mock_open_side_effect):
             with patch('poller.jwt.encode', return_value='jwt'):
-                with patch('poller.requests.post', return_value=mock_response):
+                with patch('poller.Transport.post', return_value=mock_response):
                     with patch('poller.Github'):
                         poller = GitHubPoller()
                         assert poller.auth_type == 'app'
@@ -0,0 +1,164 @@
+"""
+パイプライン単位のバッチ起動のテスト
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from batching import TriggerBatcher, parse_windows
+from hints import Hint
+from models import parse_repository
+
+NOW = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _repo(name, pipeline='integration'):
+    return parse_repository({'name': name, 'url': f'https://github.com/org/{name}', 'pipeline': pipeline,
+                             'params': [{'name': 'git-url', 'value': '${repo.url}'}]})
+
+
+class TestTriggerBatcher:
+    """TriggerBatcher のテスト"""
+
+    def test_parse_windows(self):
+        """パイプラインごとのウィンドウを秒に変換し、不正な値はまとめて報告する"""
+        assert parse_windows({'batching': {'pipelines': {'integration': '10m', 'e2e': 30}}}) == \
+            {'integration': 600.0, 'e2e': 30.0}
+        with pytest.raises(ValueError, match="'a'.*'b'"):
+            parse_windows({'batching': {'pipelines': {'a': 'soon', 'b': -1}}})
+
+    def test_changes_are_collected_until_window_closes(self):
+        """ウィンドウ内の変更は1つのバッチにまとめられ、同じリポジトリの再変更は SHA だけ更新する"""
+        batcher = TriggerBatcher({'integration': 600}, [])
+
+        batcher.add(_repo('a'), 'sha-a1', 'old-a', now=NOW)
+        batcher.add(_repo('b'), 'sha-b', 'old-b', now=NOW + timedelta(minutes=3))
+        batcher.add(_repo('a'), 'sha-a2', 'sha-a1', now=NOW + timedelta(minutes=5))
+
+        assert batcher.due(NOW + timedelta(minutes=9)) == []
+        [batch] = batcher.due(NOW + timedelta(minutes=10))
+        assert batch['changes'] == [
+            {'repository': 'a', 'sha': 'sha-a2', 'previousSHA': 'old-a'},
+            {'repository': 'b', 'sha': 'sha-b', 'previousSHA': 'old-b'},
+        ]
+
+    def test_batches_of_unbatched_pipelines_are_due(self):
+        """バッチ設定が外されたパイプラインの残りのバッチはすぐに起動される"""
+        batcher = TriggerBatcher({}, [{'pipeline': 'integration', 'openedAt': '2024-01-01T12:00:00Z',
+                                       'changes': []}])
+
+        assert len(batcher.due(NOW)) == 1
+
+
+class TestPollerBatching:
+    """GitHubPoller のバッチ起動のテスト"""
+
+    @pytest.fixture
+    def poller(self, poller):
+        poller.github_client.get_repo.return_value.get_branch.return_value.commit.sha = 'new-sha'
+        return poller
+
+    def _poll(self, poller, config_data, hints=None):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump(config_data)}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.poll_repositories(hints)
+        return yaml.safe_load(mock_configmap.data['config.yaml'])
+
+    def _repositories(self, pipeline='integration'):
+        return [
+            {'name': name, 'url': f'https://github.com/org/{name}', 'pipeline': pipeline,
+             'lastCheckedSHA': 'old-sha', 'params': [{'name': 'git-url', 'value': '${repo.url}'}]}
+            for name in ('a', 'b')
+        ]
+
+    def test_changes_open_a_batch(self, poller):
+        """バッチ対象のパイプラインの変更は、ウィンドウが閉じるまで起動されない"""
+        saved = self._poll(poller, {'batching': {'pipelines': {'integration': '10m'}},
+                                    'repositories': self._repositories()})
+
+        poller.k8s_custom_client.create_namespaced_custom_object.assert_not_called()
+        assert [r['lastCheckedSHA'] for r in saved['repositories']] == ['new-sha', 'new-sha']
+        assert [c['repository'] for c in saved['batches'][0]['changes']] == ['a', 'b']
+
+    def test_closed_window_creates_one_pipelinerun(self, poller):
+        """ウィンドウが閉じたバッチは、全変更を params に持つ1つの PipelineRun になる"""
+        opened = (datetime.now(timezone.utc) - timedelta(minutes=11)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        repositories = self._repositories()
+        for repo in repositories:
+            repo['lastCheckedSHA'] = 'new-sha'
+
+        saved = self._poll(poller, {
+            'batching': {'pipelines': {'integration': '10m'}},
+            'batches': [{'pipeline': 'integration', 'openedAt': opened, 'changes': [
+                {'repository': 'a', 'sha': 'sha-a', 'previousSHA': 'old-a'},
+                {'repository': 'b', 'sha': 'sha-b', 'previousSHA': 'old-b'},
+            ]}],
+            'repositories': repositories,
+        })
+
+        poller.k8s_custom_client.create_namespaced_custom_object.assert_called_once()
+        body = poller.k8s_custom_client.create_namespaced_custom_object.call_args[1]['body']
+        params = {p['name']: p['value'] for p in body['spec']['params']}
+        assert params['git-url'] == 'https://github.com/org/a'
+        assert params['batch-repositories'] == 'a,b'
+        assert params['batch-shas'] == 'sha-a,sha-b'
+        assert [c['previousSHA'] for c in json.loads(params['batch-changes'])] == ['old-a', 'old-b']
+        assert body['metadata']['name'].startswith('integration-batch-')
+        assert body['metadata']['labels']['github-poller/batch'] == 'true'
+        assert 'github-poller/repository' not in body['metadata']['labels']
+        assert saved['batches'] == []
+
+    def test_hinted_cycle_flushes_batch_without_changes_of_removed_repositories(self, poller):
+        """ヒントのサイクルでも全リポジトリのバッチを起動し、設定から消えたリポジトリの変更だけを除く"""
+        opened = (datetime.now(timezone.utc) - timedelta(minutes=11)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        repositories = self._repositories()
+        for repo in repositories:
+            repo['lastCheckedSHA'] = 'new-sha'
+
+        saved = self._poll(poller, {
+            'batching': {'pipelines': {'integration': '10m'}},
+            'batches': [{'pipeline': 'integration', 'openedAt': opened, 'changes': [
+                {'repository': 'removed', 'sha': 'sha-removed'},
+                {'repository': 'a', 'sha': 'sha-a'},
+                {'repository': 'b', 'sha': 'sha-b'},
+            ]}],
+            'repositories': repositories,
+        }, hints=[Hint('github.com', 'org', 'a')])
+
+        body = poller.k8s_custom_client.create_namespaced_custom_object.call_args[1]['body']
+        assert {p['name']: p['value'] for p in body['spec']['params']}['batch-repositories'] == 'a,b'
+        assert saved['batches'] == []
+
+    def test_failed_batch_is_kept(self, poller):
+        """作成に失敗したバッチは変更を残したまま次回に再び起動される"""
+        opened = (datetime.now(timezone.utc) - timedelta(minutes=11)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        repositories = self._repositories()
+        for repo in repositories:
+            repo['lastCheckedSHA'] = 'new-sha'
+        poller.k8s_custom_client.create_namespaced_custom_object.side_effect = Exception('boom')
+
+        saved = self._poll(poller, {
+            'batching': {'pipelines': {'integration': '10m'}},
+            'batches': [{'pipeline': 'integration', 'openedAt': opened, 'changes': [
+                {'repository': 'a', 'sha': 'sha-a'},
+                {'repository': 'removed', 'sha': 'sha-removed'},
+            ]}],
+            'repositories': repositories,
+        })
+
+        assert [c['repository'] for c in saved['batches'][0]['changes']] == ['a']
+
+    def test_other_pipelines_trigger_immediately(self, poller):
+        """バッチ対象でないパイプラインはこれまで通りすぐに起動される"""
+        self._poll(poller, {'batching': {'pipelines': {'integration': '10m'}},
+                            'repositories': self._repositories(pipeline='build')})
+
+        assert poller.k8s_custom_client.create_namespaced_custom_object.call_count == 2
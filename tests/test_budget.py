@@ -0,0 +1,140 @@
+"""
+サイクルの時間予算とチェックポイント保存のテスト
+"""
+
+from unittest.mock import Mock, patch
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from budget import Checkpointer, CycleBudget
+
+
+class FakeClock:
+    """テスト用の時計"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCycleBudget:
+    """CycleBudget のテスト"""
+
+    def test_no_deadline(self):
+        """デッドライン未設定なら時間切れにならない"""
+        clock = FakeClock()
+        budget = CycleBudget(0, 30, clock=clock)
+        clock.now += 10 ** 6
+        assert budget.exhausted() is False
+
+    def test_reserve_kept_for_saving(self):
+        """保存用の残り時間を確保した時点で時間切れと判定"""
+        clock = FakeClock()
+        budget = CycleBudget(100, 30, clock=clock)
+
+        clock.now += 69
+        assert budget.exhausted() is False
+        clock.now += 1
+        assert budget.exhausted() is True
+        assert budget.remaining() == 30
+
+
+class TestCheckpointer:
+    """Checkpointer のテスト"""
+
+    def test_saves_every_n_repos_when_dirty(self):
+        """変更がある場合のみ N 件ごとに保存"""
+        save = Mock()
+        checkpointer = Checkpointer(save, every_repos=2, interval_seconds=0, clock=FakeClock())
+
+        checkpointer.repo_done()
+        checkpointer.repo_done()
+        save.assert_not_called()  # 変更なし
+
+        checkpointer.mark_dirty()
+        checkpointer.repo_done()
+        assert save.call_count == 1
+        assert checkpointer.dirty is False
+
+    def test_saves_after_interval(self):
+        """一定時間ごとに保存"""
+        clock = FakeClock()
+        save = Mock()
+        checkpointer = Checkpointer(save, every_repos=0, interval_seconds=60, clock=clock)
+
+        checkpointer.mark_dirty()
+        checkpointer.repo_done()
+        save.assert_not_called()
+
+        clock.now += 60
+        checkpointer.repo_done()
+        save.assert_called_once()
+
+    def test_failed_save_stays_dirty(self):
+        """保存に失敗した場合は次回に再試行"""
+        save = Mock(side_effect=[Exception('conflict'), None])
+        checkpointer = Checkpointer(save, every_repos=1, interval_seconds=0, clock=FakeClock())
+
+        checkpointer.mark_dirty()
+        assert checkpointer.flush() is False
+        assert checkpointer.dirty is True
+        assert checkpointer.flush() is True
+        assert checkpointer.saves == 1
+
+
+class TestPollerDeadline:
+    """GitHubPoller の時間予算のテスト"""
+
+    def _set_config(self, poller, repositories):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': repositories})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        return mock_configmap
+
+    def test_least_recently_checked_first(self, poller):
+        """最後にチェックされたのが古い順（未チェックが最優先）に処理"""
+        self._set_config(poller, [
+            {'name': 'recent', 'url': 'https://github.com/org/recent', 'pipeline': 'p',
+             'lastCheckedAt': '2024-01-02T00:00:00Z'},
+            {'name': 'never', 'url': 'https://github.com/org/never', 'pipeline': 'p'},
+            {'name': 'old', 'url': 'https://github.com/org/old', 'pipeline': 'p',
+             'lastCheckedAt': '2024-01-01T00:00:00Z'},
+        ])
+        poller.get_latest_commit_sha = Mock(return_value='sha')
+
+        poller.poll_repositories()
+
+        order = [c[0][2][2] for c in poller.get_latest_commit_sha.call_args_list]
+        assert order == ['never', 'old', 'recent']
+
+    def test_stops_and_saves_before_deadline(self, poller, monkeypatch):
+        """時間切れが近づいたら新しいリポジトリを処理せず、状態を保存して終了"""
+        monkeypatch.setenv('CHECKPOINT_EVERY_REPOS', '1')
+        clock = FakeClock()
+        mock_configmap = self._set_config(poller, [
+            {'name': f'repo{i}', 'url': f'https://github.com/org/repo{i}', 'pipeline': 'p',
+             'lastCheckedSHA': 'old', 'lastCheckedAt': f'2024-01-0{i + 1}T00:00:00Z'}
+            for i in range(4)
+        ])
+
+        def slow_lookup(*args):
+            clock.now += 30
+            return 'new'
+
+        poller.get_latest_commit_sha = Mock(side_effect=slow_lookup)
+        poller.trigger_tekton_pipeline = Mock(return_value=True)
+
+        with patch('poller.CycleBudget.from_env', return_value=CycleBudget(100, 30, clock=clock)):
+            poller.poll_repositories()
+
+        # 30 秒 × 2 件で残り 40 秒、3 件目で予約分（30 秒）に達する
+        assert poller.get_latest_commit_sha.call_count == 3
+        assert poller.trigger_tekton_pipeline.call_count == 3
+        # チェックポイントごとに保存されている
+        assert poller.k8s_core_client.replace_namespaced_config_map.call_count == 3
+        saved = yaml.safe_load(mock_configmap.data['config.yaml'])['repositories']
+        assert [r['lastCheckedSHA'] for r in saved] == ['new', 'new', 'new', 'old']
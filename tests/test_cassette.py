@@ -0,0 +1,143 @@
+"""
+記録・再生ハーネス（cassette）のテスト
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import cassette
+from cassette import Cassette, CassetteMiss
+from history import CycleRecorder
+from transport import Transport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """固定のレスポンスを返すテスト用 HTTP ハンドラ"""
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        if self.path.startswith('/token'):
+            body = {'token': 'ghs_secret', 'expires_at': '2024-01-01T00:00:00Z'}
+        else:
+            body = {'sha': f'sha-{type(self).hits}'}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Set-Cookie', 'session=secret')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """ローカル HTTP サーバーを起動"""
+    _Handler.hits = 0
+    httpd = HTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestCassette:
+    """Cassette のテスト"""
+
+    def test_record_then_replay(self, server, tmp_path):
+        """記録したレスポンスがネットワークなしで再生される"""
+        path = str(tmp_path / 'cycle.cassette.json.gz')
+
+        with cassette.session('record', path):
+            assert requests.get(f"{server}/commit").json() == {'sha': 'sha-1'}
+            assert requests.get(f"{server}/commit").json() == {'sha': 'sha-2'}
+
+        with cassette.session('replay', path, speed=0):
+            assert requests.get(f"{server}/commit").json() == {'sha': 'sha-1'}
+            assert requests.get(f"{server}/commit").json() == {'sha': 'sha-2'}
+            # 記録が尽きたら最後のレスポンスを使い回す
+            assert requests.get(f"{server}/commit").json() == {'sha': 'sha-2'}
+
+        assert _Handler.hits == 2
+
+    def test_secrets_are_not_recorded(self, server, tmp_path):
+        """トークンと Cookie はカセットに書き込まれない"""
+        path = str(tmp_path / 'cycle.cassette.json.gz')
+
+        with cassette.session('record', path):
+            response = requests.get(f"{server}/token", headers={'Authorization': 'Bearer ghp_secret'})
+            # 記録中も呼び出し元には本物のレスポンスが返る
+            assert response.json()['token'] == 'ghs_secret'
+
+        interaction = Cassette.load(path).interactions[0]
+        assert interaction['json']['token'] == cassette.REDACTED
+        assert interaction['json']['expires_at'] == '2024-01-01T00:00:00Z'
+        assert 'Set-Cookie' not in interaction['headers']
+        assert 'secret' not in json.dumps(interaction)
+
+    def test_replay_fires_transport_hooks(self, tmp_path):
+        """再生したレスポンスでもトランスポートのフックが呼ばれ、履歴の API 呼び出しと 304 が数えられる"""
+        path = str(tmp_path / 'cycle.cassette.json.gz')
+        Cassette([
+            {'method': 'GET', 'url': 'https://api.github.com/repos/org/app', 'status': 200,
+             'headers': {'X-RateLimit-Remaining': '4999'}, 'json': {}, 'elapsed': 0.2},
+            {'method': 'GET', 'url': 'https://api.github.com/repos/org/lib', 'status': 304,
+             'headers': {}, 'body': '', 'elapsed': 0.1},
+        ]).save(path)
+        transport = Transport()
+        recorder = CycleRecorder()
+        timings = []
+        transport.add_hook(timings.append)
+        transport.add_hook(recorder.on_request)
+
+        with cassette.session('replay', path, speed=0):
+            with recorder.track('app'):
+                transport.session.get('https://api.github.com/repos/org/app')
+            with recorder.track('lib'):
+                transport.session.get('https://api.github.com/repos/org/lib')
+        transport.close()
+
+        assert (recorder.api_calls, recorder.not_modified) == (2, 1)
+        assert (recorder.repos['lib'].api_calls, recorder.repos['lib'].not_modified) == (1, 1)
+        assert [(timing.status, timing.ttfb) for timing in timings] == [(200, 0), (304, 0)]
+        assert timings[0].rate_limit == {'x-ratelimit-remaining': '4999'}
+
+    def test_unrecorded_request_raises(self, tmp_path):
+        """記録にないリクエストは CassetteMiss になる"""
+        recorded = Cassette([{'method': 'GET', 'url': 'https://api.github.com/a',
+                              'status': 200, 'headers': {}, 'json': {}}])
+
+        assert recorded.match('GET', 'https://api.github.com/a')['status'] == 200
+        with pytest.raises(CassetteMiss):
+            recorded.match('GET', 'https://api.github.com/b')
+
+    def test_session_restores_urlopen(self, tmp_path):
+        """セッション終了後は通常の通信に戻る"""
+        from urllib3.connectionpool import HTTPConnectionPool
+
+        original = HTTPConnectionPool.urlopen
+        with cassette.session('record', str(tmp_path / 'c.json.gz')):
+            assert HTTPConnectionPool.urlopen is not original
+            assert cassette.active_cassette() is not None
+
+        assert HTTPConnectionPool.urlopen is original
+        assert cassette.active_cassette() is None
+        assert not cassette.replaying()
+
+    def test_session_from_env_disabled_by_default(self, monkeypatch):
+        """環境変数がなければ何もしない"""
+        monkeypatch.delenv('POLLER_CASSETTE_MODE', raising=False)
+
+        with cassette.session_from_env() as active:
+            assert active is None
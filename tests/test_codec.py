@@ -0,0 +1,117 @@
+"""
+config.yaml / state.json のシリアライズのテスト
+"""
+
+import json
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import codec
+from poller import GitHubPoller
+
+
+CONFIG = {
+    'backlog': [{'name': 'app', 'sha': 'abc'}],
+    'repositories': [
+        {'name': 'app', 'url': 'https://github.com/org/app', 'pipeline': 'build',
+         'lastCheckedSHA': 'abc', 'lastCheckedAt': '2024-01-01T00:00:00+00:00'},
+        {'name': 'new', 'url': 'https://github.com/org/new', 'pipeline': 'build'},
+    ]
+}
+
+
+class TestCodec:
+    """codec モジュールのテスト"""
+
+    def test_yaml_round_trip(self):
+        """libyaml の有無にかかわらず同じ内容で読み書きできる"""
+        assert codec.load_yaml(codec.dump_yaml(CONFIG)) == CONFIG
+        assert codec.load_yaml(codec.dump_yaml({'name': 'アプリ'})) == {'name': 'アプリ'}
+
+    def test_split_and_merge_state(self):
+        """状態を分離して、再び適用すると元の設定に戻る"""
+        config_only, state = codec.split_state(CONFIG)
+
+        assert not codec.has_embedded_state(config_only)
+        assert codec.has_embedded_state(CONFIG)
+        assert state['repositories'] == {
+            'app': {'lastCheckedSHA': 'abc', 'lastCheckedAt': '2024-01-01T00:00:00+00:00'}
+        }
+        assert 'lastCheckedSHA' in CONFIG['repositories'][0]  # 元の設定は変更しない
+
+        restored = codec.load_yaml(codec.dump_yaml(config_only))
+        codec.merge_state(restored, codec.load_state(codec.dump_state(state)))
+        assert restored == CONFIG
+
+    def test_unknown_state_version(self):
+        """未知のバージョンの state.json はエラーになる"""
+        with pytest.raises(ValueError):
+            codec.merge_state({}, {'version': 99})
+
+
+class TestPollerStateFormat:
+    """STATE_FORMAT=json のテスト"""
+
+    @pytest.fixture
+    def poller_env(self, poller_env):
+        poller_env.setenv('STATE_FORMAT', 'json')
+        return poller_env
+
+    def test_state_is_migrated_once(self, poller):
+        """埋め込まれた状態は最初の保存で state.json に移され、以降 config.yaml は書き換えない"""
+        original = yaml.dump(CONFIG)
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': original}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+
+        config_data = poller.get_configmap()
+        poller.update_configmap(config_data)
+
+        migrated = mock_configmap.data['config.yaml']
+        assert not codec.has_embedded_state(yaml.safe_load(migrated))
+        state = json.loads(mock_configmap.data['state.json'])
+        assert state['repositories']['app']['lastCheckedSHA'] == 'abc'
+        assert state['backlog'] == CONFIG['backlog']
+
+        config_data = poller.get_configmap()
+        assert config_data == CONFIG
+        config_data['repositories'][1]['lastCheckedSHA'] = 'def'
+        mock_configmap.data['config.yaml'] = migrated + '# edited\n'
+        poller.update_configmap(config_data)
+
+        assert mock_configmap.data['config.yaml'] == migrated + '# edited\n'
+        state = json.loads(mock_configmap.data['state.json'])
+        assert state['repositories']['new'] == {'lastCheckedSHA': 'def'}
+
+    def test_invalid_state_format(self, monkeypatch):
+        """不正な STATE_FORMAT は起動時にエラーになる"""
+        monkeypatch.setenv('GITHUB_TOKEN', 'test-token-123')
+        monkeypatch.setenv('GITHUB_AUTH_TYPE', 'pat')
+        monkeypatch.setenv('STATE_FORMAT', 'toml')
+
+        with pytest.raises(ValueError):
+            GitHubPoller()
+
+
+class TestPollerEmbeddedState:
+    """STATE_FORMAT=embedded に戻した場合のテスト"""
+
+    def test_state_json_is_moved_back(self, poller):
+        """残っている state.json の状態は config.yaml に戻され、state.json は削除される"""
+        config_only, state = codec.split_state(CONFIG)
+        state['repositories']['app']['lastCheckedSHA'] = 'newer'
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump(config_only), 'state.json': codec.dump_state(state)}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+
+        config_data = poller.get_configmap()
+        assert config_data['repositories'][0]['lastCheckedSHA'] == 'newer'
+        assert config_data['backlog'] == CONFIG['backlog']
+        poller.update_configmap(config_data)
+
+        assert list(mock_configmap.data) == ['config.yaml']
+        assert yaml.safe_load(mock_configmap.data['config.yaml']) == config_data
@@ -0,0 +1,203 @@
+"""
+変更ヒントの受信（デーモンモード）のテスト
+"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from hints import SIGNATURE_HEADER, Hint, HintQueue, HintServer, parse_hint, sign
+from models import parse_repository
+
+
+def _repo(name, url, branch='main'):
+    return parse_repository({'name': name, 'url': url, 'branch': branch, 'pipeline': 'build'})
+
+
+class TestParseHint:
+    """parse_hint のテスト"""
+
+    def test_repository_forms(self):
+        """owner/name・URL・ホスト指定のいずれでも指定できる"""
+        assert parse_hint({'repository': 'My-Org/App', 'ref': 'refs/heads/main', 'sha': 'ignored'}) == \
+            Hint('github.com', 'my-org', 'app', 'main')
+        assert parse_hint({'repository': 'https://ghes.example.com/team/app.git'}) == \
+            Hint('ghes.example.com', 'team', 'app', None)
+        assert parse_hint({'repository': 'team/app', 'host': 'ghes.example.com', 'ref': 'dev'}) == \
+            Hint('ghes.example.com', 'team', 'app', 'dev')
+
+    def test_invalid_payloads(self):
+        """リポジトリがない・ブランチとタグ以外の ref はエラーになる"""
+        for payload in ([], {}, {'repository': 'app'}, {'repository': 'org/app', 'ref': 'refs/pull/1/head'}):
+            with pytest.raises(ValueError):
+                parse_hint(payload)
+
+    def test_matches(self):
+        """ブランチ指定なしのヒントはリポジトリの全ブランチに一致する"""
+        main = _repo('main', 'https://github.com/Org/App')
+        dev = _repo('dev', 'https://github.com/org/app', branch='dev')
+
+        assert Hint('github.com', 'org', 'app', 'main').matches(main)
+        assert not Hint('github.com', 'org', 'app', 'main').matches(dev)
+        assert Hint('github.com', 'org', 'app').matches(dev)
+
+    def test_tag_hints(self):
+        """タグのヒントはプレフィックスが一致するタグ監視のエントリだけに一致する"""
+        main = _repo('main', 'https://github.com/org/app')
+        releases = parse_repository({'name': 'releases', 'url': 'https://github.com/org/app', 'pipeline': 'deploy',
+                                     'watch': 'tags', 'tags': {'pattern': 'v*'}})
+        hint = parse_hint({'repository': 'org/app', 'ref': 'refs/tags/v1.2.0'})
+
+        assert hint == Hint('github.com', 'org', 'app', None, 'v1.2.0')
+        assert hint.matches(releases)
+        assert not hint.matches(main)
+        assert not Hint('github.com', 'org', 'app', tag='release-1').matches(releases)
+        assert not Hint('github.com', 'org', 'app', 'main').matches(releases)
+
+
+class TestHintQueue:
+    """HintQueue のテスト"""
+
+    def test_received_hints_expire(self):
+        """受信時刻はリポジトリごとに引かれ、ストレッチ期間より古いものは削除される"""
+        now = [1000.0]
+        queue = HintQueue(clock=lambda: now[0])
+        main = _repo('main', 'https://github.com/org/app')
+        queue.put(Hint('github.com', 'org', 'app', 'main'))
+        queue.put(Hint('github.com', 'org', 'other'))
+
+        now[0] += 100
+        assert queue.hinted_within(main, 600)
+        assert not queue.hinted_within(_repo('dev', 'https://github.com/org/app', branch='dev'), 600)
+        assert not queue.hinted_within(main, 60)
+
+        queue.put(Hint('github.com', 'org', 'other'))
+        now[0] += 550
+        queue.prune(600)
+        assert list(queue._received_at) == [('github.com', 'org', 'other')]
+        assert not queue.hinted_within(main, 600)
+
+
+class TestHintServer:
+    """HintServer のテスト"""
+
+    @pytest.fixture
+    def server(self):
+        server = HintServer(HintQueue(), b'secret', host='127.0.0.1', port=0)
+        server.start()
+        yield server
+        server.stop()
+
+    def _post(self, server, payload, secret=b'secret'):
+        body = json.dumps(payload).encode()
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{server.port}/hints', data=body,
+            headers={'Content-Type': 'application/json', SIGNATURE_HEADER: sign(secret, body)})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def test_signed_hints_are_queued(self, server):
+        """署名が正しいヒントだけがキューに入り、重複はまとめられる"""
+        assert self._post(server, {'repository': 'org/app', 'ref': 'main'}) == 202
+        assert self._post(server, {'repository': 'org/app', 'ref': 'main'}) == 202
+        assert self._post(server, {'repository': 'org/app'}, secret=b'wrong') == 401
+        assert self._post(server, {'ref': 'main'}) == 400
+
+        assert server.queue.wait(0)
+        assert server.queue.drain() == [Hint('github.com', 'org', 'app', 'main')]
+        assert (server.queue.received, server.queue.rejected) == (2, 2)
+
+    def test_secret_is_required(self):
+        """シークレットなしでは起動できない"""
+        with pytest.raises(ValueError):
+            HintServer(HintQueue(), b'', port=0)
+
+
+class TestPollerHints:
+    """GitHubPoller のヒント処理のテスト"""
+
+    @pytest.fixture
+    def poller(self, poller):
+        poller.github_client.get_repo.return_value.get_branch.return_value.commit.sha = 'new-sha'
+        return poller
+
+    def _configmap(self, poller, checked_at):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [
+            {'name': 'hinted', 'url': 'https://github.com/org/hinted', 'pipeline': 'build',
+             'lastCheckedSHA': 'old-sha', 'lastCheckedAt': checked_at},
+            {'name': 'other', 'url': 'https://github.com/org/other', 'pipeline': 'build',
+             'lastCheckedSHA': 'old-sha', 'lastCheckedAt': checked_at},
+        ]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        return mock_configmap
+
+    def test_hinted_cycle_checks_only_matching_repositories(self, poller):
+        """ヒントのサイクルでは一致するリポジトリだけを GitHub から取得し直す"""
+        mock_configmap = self._configmap(poller, '2024-01-01T00:00:00Z')
+
+        poller.poll_repositories([Hint('github.com', 'org', 'hinted', 'main')])
+
+        poller.github_client.get_repo.assert_called_once_with('org/hinted')
+        poller.k8s_custom_client.create_namespaced_custom_object.assert_called_once()
+        saved = yaml.safe_load(mock_configmap.data['config.yaml'])['repositories']
+        assert [r['lastCheckedSHA'] for r in saved] == ['new-sha', 'old-sha']
+
+    def test_hinted_cycle_keeps_backlog_of_other_repositories(self, poller):
+        """ヒントのサイクルでも、ヒントのないリポジトリのバックログは削除されずに起動される"""
+        mock_configmap = self._configmap(poller, '2024-01-01T00:00:00Z')
+        config_data = yaml.safe_load(mock_configmap.data['config.yaml'])
+        config_data['admission'] = {'maxRunning': 5}
+        config_data['backlog'] = [{'repository': 'other', 'pipeline': 'build', 'sha': 'queued-sha',
+                                   'previousSHA': 'old-sha', 'priority': 0,
+                                   'enqueuedAt': '2024-01-01T00:00:00Z'}]
+        mock_configmap.data = {'config.yaml': yaml.dump(config_data)}
+        poller.k8s_custom_client.list_namespaced_custom_object.return_value = {'items': []}
+
+        poller.poll_repositories([Hint('github.com', 'org', 'hinted', 'main')])
+
+        created = [c[1]['body'] for c in poller.k8s_custom_client.create_namespaced_custom_object.call_args_list]
+        assert sorted(run['metadata']['labels']['github-poller/commit'] for run in created) == \
+            ['new-sha', 'queued-sha']
+        assert yaml.safe_load(mock_configmap.data['config.yaml'])['backlog'] == []
+
+    def test_regular_cycle_stretches_for_hinted_repositories(self, poller, monkeypatch):
+        """ヒントが届いているリポジトリは、最終チェックから HINT_STRETCH_SECONDS まで通常のポーリングを省く"""
+        monkeypatch.setenv('HINT_STRETCH_SECONDS', '600')
+        poller.hint_queue = HintQueue()
+        poller.hint_queue.put(Hint('github.com', 'org', 'hinted'))
+        self._configmap(poller, datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+        poller.poll_repositories()
+
+        poller.github_client.get_repo.assert_called_once_with('org/other')
+
+    def test_serve_runs_hinted_cycles_between_regular_cycles(self, poller):
+        """デーモンは通常のサイクルの合間にヒントのサイクルを実行する"""
+        poller.hint_queue = HintQueue()
+        stop = threading.Event()
+        calls = []
+
+        def poll(hints=None):
+            calls.append(hints)
+            if hints is None:
+                poller.hint_queue.put(Hint('github.com', 'org', 'hinted'))
+            else:
+                stop.set()
+
+        poller.poll_repositories = poll
+        poller.serve(interval=60, stop=stop, debounce=0)
+
+        assert calls == [None, [Hint('github.com', 'org', 'hinted')]]
@@ -0,0 +1,153 @@
+"""
+実行履歴の保存と poller stats のテスト
+"""
+
+import sqlite3
+import threading
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import poller as poller_module
+from history import KIND_HINTED, CycleRecorder, HistoryStore
+from transport import RequestTiming
+
+
+def _timing(status=200):
+    return RequestTiming('GET', 'api.github.com', status, 0.01, 0.02)
+
+
+class TestCycleRecorder:
+    """CycleRecorder のテスト"""
+
+    def test_requests_are_attributed_per_thread(self):
+        """API 呼び出しは同じスレッドで追跡中のリポジトリに数えられる"""
+        recorder = CycleRecorder()
+
+        def lookup():
+            with recorder.track('a'):
+                recorder.on_request(_timing(304))
+
+        with recorder.track('b'):
+            worker = threading.Thread(target=lookup)
+            worker.start()
+            worker.join()
+            recorder.on_request(_timing())
+        recorder.on_request(_timing())
+
+        assert (recorder.api_calls, recorder.not_modified) == (3, 1)
+        assert (recorder.repos['a'].api_calls, recorder.repos['a'].not_modified) == (1, 1)
+        assert recorder.repos['b'].api_calls == 1
+
+
+class TestHistoryStore:
+    """HistoryStore のテスト"""
+
+    def _cycle(self, clock, changes=0):
+        recorder = CycleRecorder(clock=lambda: clock)
+        recorder.repositories = 2
+        with recorder.track('app'):
+            recorder.on_request(_timing())
+        for _ in range(changes):
+            recorder.changed('app')
+            recorder.triggered('app')
+        recorder.error('lib')
+        return recorder
+
+    def test_rotation(self, tmp_path):
+        """保持期間と最大サイクル数を超えた記録は削除される"""
+        now = [1_700_000_000.0]
+        store = HistoryStore(str(tmp_path / 'history.db'), retention_days=1, max_cycles=3, clock=lambda: now[0])
+        store.append(self._cycle(now[0] - 2 * 86400))
+        for offset in range(4):
+            store.append(self._cycle(now[0] + offset))
+
+        cycles = store.connection.execute("SELECT started_at, checked, api_calls, errors FROM cycles").fetchall()
+        assert cycles == [(now[0] + offset, 2, 1, 1) for offset in (1, 2, 3)]
+        assert store.connection.execute("SELECT COUNT(*) FROM repo_checks").fetchone()[0] == 6
+
+    def test_batches_are_not_checked_repositories(self, tmp_path):
+        """バッチの記録はサイクルの合計に入るが、チェックしたリポジトリには数えない"""
+        store = HistoryStore(str(tmp_path / 'history.db'))
+        recorder = self._cycle(1_700_000_000.0, changes=1)
+        recorder.triggered('batch:build')
+        recorder.error('batch:deploy')
+        store.append(recorder)
+
+        assert store.connection.execute("SELECT checked, triggers, errors FROM cycles").fetchone() == (2, 2, 2)
+        assert [row[0] for row in store.connection.execute("SELECT repo FROM repo_checks ORDER BY repo")] == \
+            ['app', 'lib']
+
+    def test_report(self, tmp_path):
+        """サイクル時間・日別の推移・リポジトリごとの集計を出力する"""
+        now = 1_700_000_000.0
+        store = HistoryStore(str(tmp_path / 'history.db'), clock=lambda: now)
+        store.append(self._cycle(now - 10 * 86400, changes=5))
+        store.append(self._cycle(now - 60, changes=2))
+        hinted = self._cycle(now - 30)
+        hinted.kind = KIND_HINTED
+        store.append(hinted)
+
+        report = store.report(days=7, top=5)
+
+        assert 'regular       1' in report and 'hinted        1' in report
+        assert '2023-11-14' in report
+        lines = report.splitlines()
+        changes = lines.index('Repositories with the most changes (top 1):')
+        assert lines[changes + 2].split()[:5] == ['app', '2', '2', '0', '2']
+        assert lines[lines.index('Repositories with the most errors (top 1):') + 2].split()[0] == 'lib'
+        assert HistoryStore(str(tmp_path / 'empty.db')).report().startswith('No cycles recorded')
+
+
+class TestPollerHistory:
+    """GitHubPoller の実行履歴のテスト"""
+
+    @pytest.fixture
+    def poller_env(self, poller_env, tmp_path):
+        poller_env.setenv('HISTORY_PATH', str(tmp_path / 'history.db'))
+        return poller_env
+
+    @pytest.fixture
+    def poller(self, poller):
+        poller.github_client.get_repo.return_value.get_branch.return_value.commit.sha = 'new-sha'
+        return poller
+
+    def test_cycles_are_recorded(self, poller, capsys):
+        """各サイクルの記録が追記され、stats サブコマンドで集計できる"""
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [
+            {'name': 'app', 'url': 'https://github.com/org/app', 'pipeline': 'build', 'lastCheckedSHA': 'old'},
+            {'name': 'lib', 'url': 'https://github.com/org/lib', 'pipeline': 'build', 'lastCheckedSHA': 'new-sha'},
+        ]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+
+        poller.poll_repositories()
+
+        rows = sqlite3.connect(poller.history.path).execute(
+            "SELECT repo, changes, triggers, errors FROM repo_checks ORDER BY repo").fetchall()
+        assert rows == [('app', 1, 1, 0), ('lib', 0, 0, 0)]
+
+        with pytest.raises(SystemExit) as excinfo:
+            poller_module.main(['stats', '--db', poller.history.path])
+        assert excinfo.value.code == 0
+        assert 'Repositories with the most changes (top 1):' in capsys.readouterr().out
+
+    def test_failed_trigger_is_not_counted_as_change(self, poller):
+        """起動できなかった変更は数えず、次の実行で起動できたときに1回だけ数える"""
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [
+            {'name': 'app', 'url': 'https://github.com/org/app', 'pipeline': 'build', 'lastCheckedSHA': 'old'},
+        ]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.k8s_custom_client.create_namespaced_custom_object.side_effect = [Exception('boom'), {}]
+
+        poller.poll_repositories()
+        poller.poll_repositories()
+
+        rows = sqlite3.connect(poller.history.path).execute(
+            "SELECT changes, triggers, errors FROM repo_checks ORDER BY cycle_id").fetchall()
+        assert rows == [(0, 0, 1), (1, 1, 0)]
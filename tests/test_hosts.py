@@ -0,0 +1,138 @@
+"""
+GitHub Enterprise Server を含む複数ホスト対応のテスト
+"""
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from hosts import HostSettings, RateLimits, parse_hosts
+
+
+class TestHostSettings:
+    """HostSettings のテスト"""
+
+    def test_default_api_urls(self):
+        """github.com は api.github.com、GHES は /api/v3 を使う"""
+        github_com = HostSettings.for_host('github.com')
+        ghes = HostSettings.for_host('ghes.example.com')
+
+        assert github_com.api_url == 'https://api.github.com'
+        assert github_com.client_options() == {}
+        assert ghes.api_url == 'https://ghes.example.com/api/v3'
+        assert ghes.api_host == 'ghes.example.com'
+        assert ghes.client_options() == {'base_url': 'https://ghes.example.com/api/v3'}
+        assert ghes.secret_dir == '/etc/github-poller/hosts/ghes.example.com'
+
+    def test_connection_options(self):
+        """接続プールとタイムアウトの設定"""
+        settings = HostSettings.for_host('ghes.example.com', {
+            'apiUrl': 'https://ghes-api.example.com/api/v3/', 'poolSize': 4, 'timeout': 5, 'concurrency': 2,
+        })
+
+        assert settings.client_options() == {
+            'base_url': 'https://ghes-api.example.com/api/v3', 'timeout': 5, 'pool_size': 4,
+        }
+
+    def test_invalid_settings_are_collected(self):
+        """不正な設定はホストごとにまとめて報告される"""
+        with pytest.raises(ValueError) as excinfo:
+            parse_hosts({'github': {'hosts': {'ghes.example.com': {'auth': 'oauth', 'concurrency': 0}}}})
+
+        message = str(excinfo.value)
+        assert 'ghes.example.com' in message and 'auth' in message and 'concurrency' in message
+
+
+class TestRateLimits:
+    """RateLimits のテスト"""
+
+    def test_blocked_when_down_to_floor(self):
+        """残りが下限以下になったらリセットまで待つ"""
+        limits = RateLimits(floor=50, clock=lambda: 1000.0)
+
+        limits.observe('github.com/', {'X-RateLimit-Remaining': '51', 'X-RateLimit-Limit': '5000',
+                                       'X-RateLimit-Reset': '1600'})
+        assert limits.blocked_for('github.com/') == 0
+        limits.observe('github.com/', {'x-ratelimit-remaining': '50', 'x-ratelimit-limit': '5000',
+                                       'x-ratelimit-reset': '1600'})
+        assert limits.blocked_for('github.com/') == 600
+        # ヘッダーがない（レート制限が無効な GHES など）場合は無視する
+        limits.observe('ghes.example.com/', {})
+        assert limits.blocked_for('ghes.example.com/') == 0
+
+
+class TestPollerHosts:
+    """GitHubPoller の複数ホスト対応のテスト"""
+
+    @pytest.fixture
+    def github(self):
+        """ホストごとに別の SHA とレート制限を返す GitHub クライアントを作る"""
+        def github(token, retry, **options):
+            client = Mock()
+            client.token = token
+            client.options = options
+            branch = client.get_repo.return_value.get_branch.return_value
+            branch.commit.sha = f"sha-{options.get('base_url', 'github.com')}"
+            branch.raw_headers = {'X-RateLimit-Remaining': '10', 'X-RateLimit-Limit': '5000',
+                                  'X-RateLimit-Reset': '9999999999'}
+            return client
+        return github
+
+    def _poll(self, poller, config_data):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump(config_data)}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.poll_repositories()
+        return yaml.safe_load(mock_configmap.data['config.yaml'])['repositories']
+
+    def test_repositories_use_their_host(self, poller, tmp_path):
+        """URL のホストごとに API エンドポイント・認証情報・クライアントが分かれる"""
+        (tmp_path / 'github-token').write_text('ghes-token\n')
+
+        saved = self._poll(poller, {
+            'github': {'hosts': {'ghes.example.com': {'secretDir': str(tmp_path), 'concurrency': 2}}},
+            'repositories': [
+                {'name': 'public', 'url': 'https://github.com/org/app', 'pipeline': 'build'},
+                {'name': 'internal', 'url': 'https://ghes.example.com/team/app', 'pipeline': 'build'},
+            ]
+        })
+
+        assert [r['lastCheckedSHA'] for r in saved] == [
+            'sha-github.com', 'sha-https://ghes.example.com/api/v3'
+        ]
+        ghes_client = poller.github_for('team', 'app', 'ghes.example.com')
+        assert ghes_client.token == 'ghes-token'
+        assert poller.github_for('org', 'app') is poller.github_client
+        # サーキットブレーカーもホストごと
+        assert poller.resilience.breaker('ghes.example.com') is not poller.resilience.breaker('api.github.com')
+
+    def test_host_without_credentials_is_skipped(self, poller, tmp_path):
+        """認証情報のないホストのリポジトリだけがスキップされる"""
+        saved = self._poll(poller, {
+            'github': {'hosts': {'ghes.example.com': {'secretDir': str(tmp_path)}}},
+            'repositories': [
+                {'name': 'public', 'url': 'https://github.com/org/app', 'pipeline': 'build'},
+                {'name': 'internal', 'url': 'https://ghes.example.com/team/app', 'pipeline': 'build'},
+            ]
+        })
+
+        assert saved[0]['lastCheckedSHA'] == 'sha-github.com'
+        assert 'lastCheckedSHA' not in saved[1]
+
+    def test_lookups_stop_at_rate_limit_floor(self, poller, monkeypatch):
+        """レート制限の残りが下限を下回ったら、そのトークンでの取得を止める"""
+        poller.endpoints['github.com'].rate_limits.floor = 10
+
+        saved = self._poll(poller, {
+            'repositories': [
+                {'name': 'first', 'url': 'https://github.com/org/first', 'pipeline': 'build'},
+                {'name': 'second', 'url': 'https://github.com/org/second', 'pipeline': 'build'},
+            ]
+        })
+
+        assert saved[0]['lastCheckedSHA'] == 'sha-github.com'
+        assert 'lastCheckedSHA' not in saved[1]
+        assert poller.github_client.get_repo.call_count == 1
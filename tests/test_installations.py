@@ -0,0 +1,127 @@
+"""
+複数の GitHub App インストールとトークンプールのテスト
+"""
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from installations import InstallationMap, InstallationToken, TokenPool, parse_installation_id
+from models import ConfigError, parse_repository
+
+
+class TestTokenPool:
+    """TokenPool のテスト"""
+
+    def test_tokens_are_cached_until_refresh_margin(self):
+        """有効期限の手前までキャッシュし、期限が近づいたら再発行する"""
+        now = [1000.0]
+        issue = Mock(side_effect=lambda iid: InstallationToken(f'token-{iid}-{now[0]:.0f}', now[0] + 3600))
+        pool = TokenPool(issue, refresh_margin=300, clock=lambda: now[0])
+
+        assert pool.get('1') == 'token-1-1000'
+        assert pool.get('2') == 'token-2-1000'
+        now[0] += 3000
+        assert pool.get('1') == 'token-1-1000'
+        now[0] += 400
+        assert pool.get('1') == 'token-1-4400'
+
+        assert pool.issued == 3
+
+    def test_seeded_token_is_used(self):
+        """起動時に取得したトークンはそのまま使われる"""
+        issue = Mock()
+        pool = TokenPool(issue, clock=lambda: 0.0)
+        pool.put('1', InstallationToken('seeded', 3600))
+
+        assert pool.get('1') == 'seeded'
+        issue.assert_not_called()
+
+
+class TestInstallationMap:
+    """InstallationMap のテスト"""
+
+    def test_repository_then_owner_then_default(self):
+        """リポジトリ指定 > オーナー指定 > デフォルトの順に解決する"""
+        repos = [
+            parse_repository({'name': 'special', 'url': 'https://github.com/org-a/special',
+                              'pipeline': 'build', 'installationId': 300}),
+        ]
+        installations = InstallationMap.from_config(
+            {'github': {'installations': {'Org-A': 100, 'org-b': '200'}}}, repos, default='1'
+        )
+
+        assert installations.resolve('org-a', 'app') == '100'
+        assert installations.resolve('ORG-B', 'app') == '200'
+        assert installations.resolve('org-a', 'special') == '300'
+        assert installations.resolve('org-c', 'app') == '1'
+
+    def test_invalid_ids_are_rejected(self):
+        """不正なインストール ID はエラーになる"""
+        with pytest.raises(ValueError):
+            parse_installation_id('abc')
+        with pytest.raises(ValueError, match='org-a'):
+            InstallationMap.from_config({'github': {'installations': {'org-a': -1}}}, [])
+        with pytest.raises(ConfigError, match='installation id'):
+            parse_repository({'name': 'r', 'url': 'https://github.com/o/r', 'pipeline': 'p',
+                              'installationId': 'x'})
+
+
+class TestPollerInstallations:
+    """GitHubPoller の複数インストール対応のテスト"""
+
+    @pytest.fixture
+    def mock_post(self):
+        """インストールごとのトークンを発行する Transport.post"""
+        def post(url, headers):
+            installation_id = url.split('/')[-2]
+            response = Mock()
+            response.json.return_value = {'token': f'token-{installation_id}',
+                                          'expires_at': '2099-01-01T00:00:00Z'}
+            return response
+        return Mock(side_effect=post)
+
+    @pytest.fixture
+    def poller_env(self, poller_env, mock_post):
+        """GitHub App 認証の環境変数"""
+        poller_env.delenv('GITHUB_TOKEN')
+        poller_env.setenv('GITHUB_AUTH_TYPE', 'app')
+        poller_env.setenv('GITHUB_APP_ID', '123456')
+        poller_env.setenv('GITHUB_INSTALLATION_ID', '1')
+        poller_env.setenv('GITHUB_PRIVATE_KEY', 'dummy-key')
+        poller_env.setattr('poller.jwt.encode', Mock(return_value='jwt'))
+        poller_env.setattr('poller.Transport.post', mock_post)
+        return poller_env
+
+    @pytest.fixture
+    def github(self):
+        def github(token, retry, **options):
+            client = Mock()
+            client.token = token
+            client.get_repo.return_value.get_branch.return_value.commit.sha = f'sha-{token}'
+            return client
+        return github
+
+    def test_repositories_use_their_installation(self, poller, mock_post):
+        """各リポジトリは自身のインストールのトークンで参照される"""
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({
+            'github': {'installations': {'org-b': 2}},
+            'repositories': [
+                {'name': 'a', 'url': 'https://github.com/org-a/app', 'pipeline': 'build'},
+                {'name': 'b', 'url': 'https://github.com/org-b/app', 'pipeline': 'build'},
+                {'name': 'b2', 'url': 'https://github.com/org-b/lib', 'pipeline': 'build'},
+            ]
+        })}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+
+        poller.poll_repositories()
+
+        saved = yaml.safe_load(mock_configmap.data['config.yaml'])['repositories']
+        assert [r['lastCheckedSHA'] for r in saved] == ['sha-token-1', 'sha-token-2', 'sha-token-2']
+        # デフォルトは起動時、org-b のトークンは必要になった時点で1回だけ発行される
+        issued_for = [c[0][0].split('/')[-2] for c in mock_post.call_args_list]
+        assert issued_for == ['1', '2']
@@ -0,0 +1,119 @@
+"""
+ブランチ HEAD 取得の重複排除のテスト
+"""
+
+import threading
+
+from unittest.mock import Mock, patch
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lookup import HeadLookup, group_by_head
+from models import parse_repository
+from poller import GitHubPoller
+
+
+def _repo(name, url, branch='main', pipeline='build'):
+    return parse_repository({'name': name, 'url': url, 'branch': branch, 'pipeline': pipeline})
+
+
+class TestHeadLookup:
+    """HeadLookup のテスト"""
+
+    def test_group_by_normalised_head(self):
+        """URL 表記や大文字小文字が違っても同じ HEAD にまとめられる"""
+        repos = [
+            _repo('build', 'https://github.com/Org/App'),
+            _repo('scan', 'git@github.com:org/app.git'),
+            _repo('docs', 'https://github.com/org/app', branch='gh-pages'),
+        ]
+
+        groups = list(group_by_head(repos).values())
+
+        assert [[r.name for r in group] for group in groups] == [['build', 'scan'], ['docs']]
+
+    def test_resolve_fetches_once(self):
+        """同じ HEAD は1サイクルに1回だけ取得する（失敗も含む）"""
+        fetch = Mock(side_effect=['sha-1', None])
+        lookup = HeadLookup(fetch)
+        build = _repo('build', 'https://github.com/org/app')
+        scan = _repo('scan', 'https://github.com/org/app')
+        other = _repo('other', 'https://github.com/org/other')
+
+        assert lookup.resolve(build) == 'sha-1'
+        assert lookup.resolve(scan) == 'sha-1'
+        assert lookup.resolve(other) is None
+        assert lookup.resolve(other) is None
+
+        assert fetch.call_count == 2
+        assert lookup.fetches == 2
+        assert lookup.shared == 2
+
+    def test_prefetch_runs_lanes_in_parallel(self):
+        """レーン（インストール）ごとに並列で先行取得し、レーン内は順番に処理する"""
+        started = []
+        release = threading.Event()
+
+        def fetch(repo):
+            started.append(repo.name)
+            if repo.name == 'a1':
+                # a レーンが止まっていても b レーンは進む
+                assert release.wait(5)
+            return f'sha-{repo.name}'
+
+        repos = [_repo('a1', 'https://github.com/a/one'), _repo('a2', 'https://github.com/a/two'),
+                 _repo('b1', 'https://github.com/b/one')]
+        lookup = HeadLookup(fetch)
+        lookup.prefetch(repos, lambda repo: repo.owner)
+
+        assert lookup._pending[repos[2].head_key].result(timeout=5) == 'sha-b1'
+        assert 'a2' not in started
+        release.set()
+
+        assert [lookup.resolve(repo) for repo in repos] == ['sha-a1', 'sha-a2', 'sha-b1']
+        assert lookup.fetches == 3
+        lookup.close()
+
+    def test_prefetch_skips_after_stop(self):
+        """停止条件を満たした後の先行取得は行わない"""
+        fetch = Mock(return_value='sha')
+        lookup = HeadLookup(fetch)
+        repos = [_repo('one', 'https://github.com/org/one'), _repo('two', 'https://github.com/org/two')]
+
+        lookup.prefetch(repos, lambda repo: '', should_stop=Mock(side_effect=[False, True]))
+
+        assert [lookup.resolve(repo) for repo in repos] == ['sha', None]
+        fetch.assert_called_once()
+
+    def test_poller_fans_out_to_subscribers(self, monkeypatch):
+        """各エントリは独自の lastCheckedSHA とトリガーを持つ"""
+        monkeypatch.setenv('GITHUB_TOKEN', 'test-token-123')
+        monkeypatch.setenv('GITHUB_AUTH_TYPE', 'pat')
+        with patch('poller.config.load_incluster_config'), \
+                patch('poller.client.CoreV1Api'), \
+                patch('poller.client.CustomObjectsApi'), \
+                patch('poller.Github'):
+            poller = GitHubPoller()
+
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [
+            {'name': 'app-build', 'url': 'https://github.com/org/app', 'pipeline': 'build',
+             'lastCheckedSHA': 'old'},
+            {'name': 'app-scan', 'url': 'https://github.com/org/app.git', 'pipeline': 'scan',
+             'lastCheckedSHA': 'new'},
+            {'name': 'app-docs', 'url': 'https://github.com/org/app', 'pipeline': 'docs',
+             'lastCheckedSHA': 'old'},
+        ]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.get_latest_commit_sha = Mock(return_value='new')
+        poller.trigger_tekton_pipeline = Mock(return_value=True)
+
+        poller.poll_repositories()
+
+        poller.get_latest_commit_sha.assert_called_once()
+        triggered = [c[0][0].name for c in poller.trigger_tekton_pipeline.call_args_list]
+        assert triggered == ['app-build', 'app-docs']
+        saved = yaml.safe_load(mock_configmap.data['config.yaml'])
+        assert [r['lastCheckedSHA'] for r in saved['repositories']] == ['new', 'new', 'new']
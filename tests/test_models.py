@@ -0,0 +1,109 @@
+"""
+リポジトリ設定モデルのテスト
+"""
+
+import pytest
+import dataclasses
+import logging
+from unittest.mock import Mock, patch
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from models import ConfigError, parse_repo_url, parse_repositories, parse_repository
+from poller import GitHubPoller
+
+
+class TestRepositoryModel:
+    """RepositoryConfig の解析と検証のテスト"""
+
+    @pytest.mark.parametrize('url, expected', [
+        ('https://github.com/org/repo', ('github.com', 'org', 'repo')),
+        ('https://github.com/org/repo.git', ('github.com', 'org', 'repo')),
+        ('https://GitHub.com/org/repo/', ('github.com', 'org', 'repo')),
+        ('git@github.com:org/repo.git', ('github.com', 'org', 'repo')),
+        ('https://ghes.example.com:8443/team/app', ('ghes.example.com:8443', 'team', 'app')),
+    ])
+    def test_parse_repo_url(self, url, expected):
+        """さまざまな形式の URL を owner/repo に分解"""
+        assert parse_repo_url(url) == expected
+
+    def test_parse_repo_url_invalid(self):
+        """owner/repo を含まない URL はエラー"""
+        with pytest.raises(ConfigError):
+            parse_repo_url('https://github.com/only-owner')
+
+    def test_defaults_applied(self):
+        """デフォルト値が適用され、URL が正規化される"""
+        entry = {'name': 'app', 'url': 'https://github.com/org/app.git/', 'pipeline': 'build'}
+        repo = parse_repository(entry)
+
+        assert repo.branch == 'main'
+        assert repo.priority == 0
+        assert repo.url == 'https://github.com/org/app'
+        assert repo.full_name == 'org/app'
+        assert repo.key == 'app'
+        assert repo.raw is entry
+        assert not hasattr(repo, '__dict__')  # __slots__ でメモリを節約
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            repo.branch = 'develop'
+
+    def test_all_errors_reported_in_one_pass(self):
+        """不正なエントリはすべてまとめて報告される"""
+        entries = [
+            {'name': 'ok', 'url': 'https://github.com/org/ok', 'pipeline': 'build'},
+            {'name': 'no-url', 'pipeline': 'build'},
+            {'name': 'bad', 'url': 'https://github.com/org', 'priority': 'high',
+             'params': [{'value': 'x'}], 'workspaces': [{'name': 'source'}]},
+            {'name': 'ok', 'url': 'https://github.com/org/dup', 'pipeline': 'build'},
+            'not-a-mapping',
+        ]
+
+        repositories, errors = parse_repositories(entries)
+
+        assert [r.name for r in repositories] == ['ok']
+        assert len(errors) == 4
+        assert "'no-url': missing 'url'" in errors[0]
+        for problem in ("cannot parse owner/repository", "missing 'pipeline'",
+                        "'priority' must be an integer", "params[0] has no 'name'",
+                        "workspaces[0] has no 'claimName'"):
+            assert problem in errors[1]
+        assert 'duplicate name' in errors[2]
+        assert "'#4'" in errors[3]
+
+    def test_unknown_placeholders_are_kept(self, caplog):
+        """未知のプレースホルダーは警告だけでエントリは有効なまま、値はそのまま残る"""
+        with caplog.at_level(logging.WARNING):
+            repo = parse_repository({'name': 'typo', 'url': 'https://github.com/org/typo', 'pipeline': 'build',
+                                     'params': [{'name': 'p', 'value': '${HOME}/${repo.name}'}]})
+
+        assert repo.template.render('run', 'ns', {})['spec']['params'][0]['value'] == '${HOME}/typo'
+        assert "'typo': unknown placeholders kept as literal text: ${HOME}" in caplog.text
+
+    def test_poller_skips_invalid_entries(self, monkeypatch, caplog):
+        """ポーラーは不正なエントリをスキップし、まとめてログに出す"""
+        monkeypatch.setenv('GITHUB_TOKEN', 'test-token-123')
+        monkeypatch.setenv('GITHUB_AUTH_TYPE', 'pat')
+        with patch('poller.config.load_incluster_config'), \
+                patch('poller.client.CoreV1Api'), \
+                patch('poller.client.CustomObjectsApi'), \
+                patch('poller.Github'):
+            poller = GitHubPoller()
+
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [
+            {'name': 'good', 'url': 'https://github.com/org/good.git', 'pipeline': 'build'},
+            {'name': 'broken'},
+        ]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.get_latest_commit_sha = Mock(return_value='sha-1')
+
+        with caplog.at_level(logging.ERROR):
+            poller.poll_repositories()
+
+        poller.get_latest_commit_sha.assert_called_once_with(
+            'https://github.com/org/good', 'main', ('github.com', 'org', 'good')
+        )
+        assert 'Skipping 1 invalid repository entries' in caplog.text
+        assert "'broken'" in caplog.text
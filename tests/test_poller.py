@@ -14,6 +14,8 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from poller import GitHubPoller
+from resilience import Resilience
+from tekton import pipelinerun_name
 
 
 class TestGitHubPoller:
@@ -473,3 +475,47 @@ class TestPipelineRunNaming:
                             assert name.startswith('build-pipeline-my-app-')
                             assert len(name) <= 63  # Kubernetes の名前長制限
 
+    
+    @pytest.fixture
+    def poller(self, poller):
+        """リトライの待機なし"""
+        poller.resilience = Resilience(sleep=lambda seconds: None)
+        return poller
+    
+    def _names(self, poller):
+        return [c[1]['body']['metadata']['name']
+                for c in poller.k8s_custom_client.create_namespaced_custom_object.call_args_list]
+    
+    def test_name_is_deterministic(self, poller):
+        """同じエントリ・ブランチ・コミットは同じ名前になり、長い名前でもハッシュは切り詰められない"""
+        long_name = 'a-very-long-repository-name-that-would-push-the-timestamp-out'
+        repo = {'name': long_name, 'pipeline': 'build-pipeline'}
+        
+        poller.trigger_tekton_pipeline(repo, 'sha-1')
+        poller.trigger_tekton_pipeline(repo, 'sha-1')
+        poller.trigger_tekton_pipeline(repo, 'sha-2')
+        poller.trigger_tekton_pipeline(dict(repo, branch='dev'), 'sha-1')
+        
+        first, again, other_sha, other_branch = self._names(poller)
+        assert first == again
+        assert len({first, other_sha, other_branch}) == 3
+        assert all(len(name) <= 63 for name in (first, other_sha, other_branch))
+        assert first == pipelinerun_name(f'build-pipeline-{long_name}', long_name, 'main', 'sha-1')
+    
+    def test_already_exists_counts_as_success(self, poller):
+        """AlreadyExists (409) は以前の試行で作成済みとみなして成功扱いにする"""
+        from kubernetes.client.rest import ApiException
+        poller.k8s_custom_client.create_namespaced_custom_object.side_effect = ApiException(status=409)
+        
+        assert poller.trigger_tekton_pipeline({'name': 'my-app', 'pipeline': 'build'}, 'sha-1') is True
+    
+    def test_transient_create_errors_are_retried(self, poller):
+        """一時的なエラーは同じ名前で再試行される"""
+        from kubernetes.client.rest import ApiException
+        poller.k8s_custom_client.create_namespaced_custom_object.side_effect = [ApiException(status=503), {}]
+        
+        assert poller.trigger_tekton_pipeline({'name': 'my-app', 'pipeline': 'build'}, 'sha-1') is True
+        first, retried = self._names(poller)
+        assert first == retried
+        body = poller.k8s_custom_client.create_namespaced_custom_object.call_args[1]['body']
+        assert body['metadata']['labels']['github-poller/commit'] == 'sha-1'
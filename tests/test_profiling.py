@@ -0,0 +1,123 @@
+"""
+フェーズ別計測とプロファイラ連携のテスト
+"""
+
+import logging
+import pstats
+
+import pytest
+from unittest.mock import Mock, patch
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from poller import main
+from profiling import PHASE_CONFIGMAP_READ, PHASE_HEAD_LOOKUP, PHASE_TOKEN, PhaseTimer, profile
+
+
+class FakeClock:
+    """手動で進めるテスト用の時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPhaseTimer:
+    """PhaseTimer のテスト"""
+
+    def test_accumulates_per_phase_and_item(self):
+        """フェーズ別・リポジトリ別に時間を集計する"""
+        clock = FakeClock()
+        timer = PhaseTimer(clock=clock)
+
+        for repo, seconds in (('repo1', 0.5), ('repo2', 2.0), ('repo1', 1.0)):
+            with timer.phase(PHASE_HEAD_LOOKUP, repo):
+                clock.now += seconds
+
+        stats = timer.phases[PHASE_HEAD_LOOKUP]
+        assert stats.calls == 3
+        assert stats.total == pytest.approx(3.5)
+        assert stats.max == pytest.approx(2.0)
+        assert [item for item, _, _ in timer.slowest(2)] == ['repo2', 'repo1']
+
+    def test_records_time_on_error(self):
+        """例外が発生しても時間は記録される"""
+        clock = FakeClock()
+        timer = PhaseTimer(clock=clock)
+
+        with pytest.raises(RuntimeError):
+            with timer.phase(PHASE_TOKEN):
+                clock.now += 1.0
+                raise RuntimeError('boom')
+
+        assert timer.phases[PHASE_TOKEN].total == pytest.approx(1.0)
+
+    def test_summary_lists_phases_in_cycle_order(self):
+        """サマリーはサイクルの順序でフェーズを並べ、遅いリポジトリを示す"""
+        timer = PhaseTimer(clock=FakeClock())
+        timer.record(PHASE_HEAD_LOOKUP, 0.2, 'repo1')
+        timer.record(PHASE_TOKEN, 0.1)
+        timer.record(PHASE_CONFIGMAP_READ, 0.05)
+
+        summary = timer.summary(top_n=5)
+
+        assert summary.index(PHASE_TOKEN) < summary.index(PHASE_CONFIGMAP_READ) < summary.index(PHASE_HEAD_LOOKUP)
+        assert 'Slowest repositories (top 1)' in summary
+        assert 'repo1' in summary
+
+
+class TestProfile:
+    """cProfile 連携のテスト"""
+
+    def test_profile_writes_stats(self, tmp_path):
+        """プロファイル結果がファイルに書き出される"""
+        path = str(tmp_path / 'poller.prof')
+
+        with profile(path) as profiler:
+            assert profiler is not None
+            sum(range(1000))
+
+        assert pstats.Stats(path).total_calls > 0
+
+    def test_profile_disabled_without_path(self):
+        """パスが空なら何もしない"""
+        with profile('') as profiler:
+            assert profiler is None
+
+    def test_main_profile_option(self, tmp_path):
+        """--profile でポーリング全体がプロファイルされる"""
+        path = str(tmp_path / 'poller.prof')
+
+        with patch('poller.GitHubPoller') as mock_poller:
+            main(['--profile', path])
+
+        mock_poller.return_value.run.assert_called_once()
+        assert os.path.exists(path)
+
+
+class TestPollerTimings:
+    """GitHubPoller のフェーズ計測のテスト"""
+
+    def test_run_logs_timing_summary(self, poller, caplog):
+        """実行の最後にフェーズ別の集計がログに出力される"""
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [
+            {'name': 'repo1', 'url': 'https://github.com/org/repo1',
+             'pipeline': 'build', 'lastCheckedSHA': 'old'},
+        ]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.get_latest_commit_sha = Mock(return_value='new')
+        poller.trigger_tekton_pipeline = Mock(return_value=True)
+
+        with caplog.at_level(logging.INFO):
+            poller.run()
+
+        assert poller.timings.phases[PHASE_TOKEN].calls == 1
+        assert poller.timings.phases[PHASE_HEAD_LOOKUP].calls == 1
+        assert 'repo1' in poller.timings.items
+        assert 'Phase timings' in caplog.text
+        assert 'configmap write' in caplog.text
@@ -0,0 +1,211 @@
+"""
+リトライ・バックオフ・サーキットブレーカーのテスト
+"""
+
+import threading
+
+import pytest
+from unittest.mock import Mock, patch
+import requests
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from github import GithubException
+from kubernetes.client.rest import ApiException
+
+from resilience import (
+    CircuitBreaker, CircuitOpenError, Resilience, RetryPolicy, classify, parse_retry_after,
+)
+
+
+class FakeClock:
+    """テスト用の時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def resilience(clock):
+    return Resilience(RetryPolicy(max_attempts=3, base_delay=1, max_delay=10),
+                      failure_threshold=3, reset_timeout=30, sleep=clock.sleep, clock=clock)
+
+
+class TestClassify:
+    """エラー分類のテスト"""
+
+    def test_transient_errors(self):
+        """5xx・429・タイムアウトはリトライ対象"""
+        assert classify(GithubException(502, {}))[0] is True
+        assert classify(ApiException(status=429))[0] is True
+        assert classify(requests.exceptions.Timeout())[0] is True
+        assert classify(requests.exceptions.ConnectionError())[0] is True
+
+    def test_client_errors_not_retried(self):
+        """404 やその他の例外はリトライしない"""
+        assert classify(GithubException(404, {}))[0] is False
+        assert classify(ApiException(status=409))[0] is False
+        assert classify(ApiException(status=409), retry_statuses=(409,))[0] is True
+        assert classify(ValueError('bug'))[0] is False
+
+    def test_secondary_rate_limit(self):
+        """Retry-After 付きの 403 はリトライ対象"""
+        error = GithubException(403, {'message': 'secondary rate limit'}, {'retry-after': '7'})
+        assert classify(error) == (True, 7.0)
+        assert classify(GithubException(403, {}, {}))[0] is False
+
+    def test_parse_retry_after(self):
+        """秒数と HTTP 日付の両方に対応"""
+        assert parse_retry_after('3') == 3.0
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0  # 過去の日付
+        assert parse_retry_after(None) is None
+
+
+class TestResilience:
+    """Resilience.call のテスト"""
+
+    def test_retries_then_succeeds(self, resilience, clock):
+        """一時的なエラーはバックオフ後にリトライされる"""
+        func = Mock(side_effect=[GithubException(503, {}), GithubException(500, {}), 'ok'])
+
+        with patch('resilience.random.uniform', side_effect=lambda low, high: high):
+            assert resilience.call('api.github.com', func) == 'ok'
+
+        assert func.call_count == 3
+        assert clock.now == 1 + 2  # 指数バックオフ（ジッターの上限）
+        assert resilience.breaker('api.github.com').state == CircuitBreaker.CLOSED
+
+    def test_retry_after_is_honoured(self, resilience, clock):
+        """Retry-After ヘッダーの秒数だけ待つ"""
+        error = ApiException(status=429)
+        error.headers = {'Retry-After': '4'}
+        func = Mock(side_effect=[error, 'ok'])
+
+        assert resilience.call('kubernetes', func) == 'ok'
+        assert clock.now == 4
+
+    def test_long_retry_after_gives_up(self, resilience, clock):
+        """待ち時間が上限を超える場合はすぐに諦める"""
+        error = GithubException(403, {}, {'Retry-After': '3600'})
+        func = Mock(side_effect=error)
+
+        with pytest.raises(GithubException):
+            resilience.call('api.github.com', func)
+        assert func.call_count == 1
+        assert clock.now == 0
+
+    def test_non_retryable_error_raised_immediately(self, resilience):
+        """404 はリトライせず、ブレーカーの失敗にも数えない"""
+        func = Mock(side_effect=GithubException(404, {}))
+
+        with pytest.raises(GithubException):
+            resilience.call('api.github.com', func)
+        assert func.call_count == 1
+        assert resilience.breaker('api.github.com').failures == 0
+
+    def test_circuit_opens_and_recovers(self, resilience, clock):
+        """連続失敗でブレーカーが開き、一定時間後に試行を再開する"""
+        failing = Mock(side_effect=GithubException(503, {}))
+        with pytest.raises(GithubException):
+            resilience.call('api.github.com', failing)
+        assert resilience.breaker('api.github.com').state == CircuitBreaker.OPEN
+
+        # 開いている間は呼び出さずに即座に失敗
+        func = Mock(return_value='ok')
+        with pytest.raises(CircuitOpenError):
+            resilience.call('api.github.com', func)
+        func.assert_not_called()
+
+        # 他のホストには影響しない
+        assert resilience.call('kubernetes', func) == 'ok'
+
+        clock.now += 30
+        assert resilience.call('api.github.com', func) == 'ok'
+        assert resilience.breaker('api.github.com').state == CircuitBreaker.CLOSED
+
+
+class TestPollerResilience:
+    """GitHubPoller への組み込みのテスト"""
+
+    @pytest.fixture
+    def poller(self, poller, resilience):
+        poller.resilience = resilience
+        return poller
+
+    def test_get_latest_commit_sha_retries(self, poller):
+        """GitHub の 5xx はリトライされる"""
+        mock_repo = Mock()
+        mock_repo.get_branch.return_value.commit.sha = 'abc123'
+        poller.github_client.get_repo.side_effect = [GithubException(502, {}), mock_repo]
+
+        assert poller.get_latest_commit_sha('https://github.com/org/repo', 'main') == 'abc123'
+        assert poller.github_client.get_repo.call_count == 2
+
+    def test_update_configmap_retries_conflict(self, poller):
+        """ConfigMap 更新の競合（409）は再読み込みしてリトライ"""
+        mock_configmap = Mock()
+        mock_configmap.data = {}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.k8s_core_client.replace_namespaced_config_map.side_effect = [
+            ApiException(status=409), None
+        ]
+
+        poller.update_configmap({'repositories': []})
+
+        assert poller.k8s_core_client.read_namespaced_config_map.call_count == 2
+        assert poller.k8s_core_client.replace_namespaced_config_map.call_count == 2
+
+    def test_daemon_survives_configmap_read_failure(self, poller, clock):
+        """ConfigMap の読み込みに失敗したサイクルはスキップされ、デーモンは次のサイクルを実行する"""
+        stop = threading.Event()
+        cycles = []
+        poll_repositories = poller.poll_repositories
+
+        def poll(hints=None):
+            cycles.append(hints)
+            if len(cycles) == 2:
+                # 次のサイクルまでにブレーカーが半開になる
+                clock.now += 30
+                stop.set()
+            poll_repositories(hints)
+
+        def read(**kwargs):
+            if len(cycles) == 1:
+                raise ApiException(status=503)
+            return Mock(data={'config.yaml': 'repositories: []'})
+
+        poller.poll_repositories = poll
+        poller.k8s_core_client.read_namespaced_config_map.side_effect = read
+
+        poller.serve(interval=0, stop=stop)
+
+        assert len(cycles) == 2
+        assert poller.k8s_core_client.read_namespaced_config_map.call_count == 4
+        assert poller.resilience.breaker('kubernetes/configmaps').state == CircuitBreaker.CLOSED
+
+    def test_pipelinerun_failures_do_not_block_configmap(self, poller):
+        """PipelineRun の作成失敗でブレーカーが開いても、ConfigMap の読み書きは続けられる"""
+        poller.k8s_custom_client.create_namespaced_custom_object.side_effect = ApiException(status=500)
+        for _ in range(2):
+            poller.trigger_tekton_pipeline({'name': 'app', 'url': 'https://github.com/org/app',
+                                            'pipeline': 'build'}, 'sha')
+        assert poller.resilience.breaker('kubernetes/pipelineruns').state == CircuitBreaker.OPEN
+
+        mock_configmap = Mock()
+        mock_configmap.data = {}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.update_configmap({'repositories': []})
+
+        poller.k8s_core_client.replace_namespaced_config_map.assert_called_once()
@@ -0,0 +1,188 @@
+"""
+PipelineRun の保持ポリシー（ガベージコレクション）のテスト
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from kubernetes.client.rest import ApiException
+
+from models import ConfigError, parse_repository
+from resilience import CircuitOpenError
+from retention import (
+    Pruner, RetentionPolicy, RetentionRule, collect_expired, parse_duration, parse_rule,
+)
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def _run(name, repository='repo1', pipeline='build', status='True', age_hours=0, now=NOW):
+    """テスト用の完了済み PipelineRun を作成"""
+    finished = (now - timedelta(hours=age_hours)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {
+        'metadata': {
+            'name': name,
+            'creationTimestamp': finished,
+            'labels': {'github-poller/repository': repository, 'tekton.dev/pipeline': pipeline},
+        },
+        'status': {
+            'completionTime': finished if status != 'Unknown' else None,
+            'conditions': [{'type': 'Succeeded', 'status': status}],
+        },
+    }
+
+
+class TestRetentionRules:
+    """保持ルールの解析と解決のテスト"""
+
+    def test_parse_duration(self):
+        """秒数と単位付きの期間を解析する"""
+        assert parse_duration(3600) == 3600
+        assert parse_duration('90m') == 5400
+        assert parse_duration('7d') == 7 * 86400
+        with pytest.raises(ValueError):
+            parse_duration('1w')
+
+    def test_parse_rule_collects_problems(self):
+        """不正な値はまとめて報告される"""
+        with pytest.raises(ValueError) as excinfo:
+            parse_rule({'keepLast': -1, 'maxAge': 'forever', 'keepLastFailed': 'yes'})
+
+        message = str(excinfo.value)
+        assert 'keepLast' in message and 'maxAge' in message and 'keepLastFailed' in message
+
+    def test_repository_overrides_pipeline_and_default(self):
+        """リポジトリ > パイプライン > デフォルトの順に優先される"""
+        policy = RetentionPolicy.from_config(
+            {'retention': {'keepLast': 10, 'maxAge': '7d', 'pipelines': {'integration': {'keepLast': 3}}}},
+            {'repo1': RetentionRule(max_age=3600)}
+        )
+
+        assert policy.rule_for('repo2', 'build') == RetentionRule(10, 7 * 86400, True)
+        assert policy.rule_for('repo2', 'integration') == RetentionRule(3, 7 * 86400, True)
+        assert policy.rule_for('repo1', 'integration') == RetentionRule(3, 3600, True)
+
+    def test_no_retention_configured(self):
+        """設定がなければポリシーは作られない"""
+        assert RetentionPolicy.from_config({'repositories': []}) is None
+
+    def test_invalid_repository_retention_is_rejected(self):
+        """リポジトリ単位の不正な保持設定は検証エラーになる"""
+        with pytest.raises(ConfigError, match='retention'):
+            parse_repository({'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                              'pipeline': 'build', 'retention': {'keepLast': 'all'}})
+
+
+class TestCollectExpired:
+    """削除対象の選定のテスト"""
+
+    def test_keep_last(self):
+        """リポジトリ・パイプラインごとに新しい N 件を残す"""
+        runs = [_run(f'a-{i}', age_hours=i) for i in range(4)] + [_run('b-0', repository='repo2')]
+        policy = RetentionPolicy(RetentionRule(keep_last=2))
+
+        assert collect_expired(runs, policy, NOW) == ['a-3', 'a-2']
+
+    def test_max_age_and_running_runs(self):
+        """期限切れのみ削除し、実行中のものは削除しない"""
+        runs = [_run('old', age_hours=48), _run('new', age_hours=1),
+                _run('running', status='Unknown', age_hours=72)]
+        policy = RetentionPolicy(RetentionRule(max_age=86400))
+
+        assert collect_expired(runs, policy, NOW) == ['old']
+
+    def test_keep_last_failed(self):
+        """最新の失敗した実行は常に残す"""
+        runs = [_run('ok-0', age_hours=0), _run('ok-1', age_hours=1),
+                _run('failed-2', status='False', age_hours=2), _run('failed-3', status='False', age_hours=3)]
+
+        kept_failed = RetentionPolicy(RetentionRule(keep_last=1))
+        assert collect_expired(runs, kept_failed, NOW) == ['failed-3', 'ok-1']
+
+        not_kept = RetentionPolicy(RetentionRule(keep_last=1, keep_last_failed=False))
+        assert collect_expired(runs, not_kept, NOW) == ['failed-3', 'failed-2', 'ok-1']
+
+
+class TestPruner:
+    """バッチ削除とレート制限のテスト"""
+
+    def test_batches_are_rate_limited(self):
+        """バッチ間で待機してレートを守る"""
+        delete = Mock()
+        sleep = Mock()
+        pruner = Pruner(delete, batch_size=2, deletes_per_second=4, sleep=sleep, clock=lambda: 0.0)
+
+        assert pruner.prune(['a', 'b', 'c', 'd', 'e']) == 5
+        assert delete.call_count == 5
+        # 2件 / 4件毎秒 = 0.5秒 をバッチ間（最後のバッチの後を除く）で待つ
+        assert [c[0][0] for c in sleep.call_args_list] == [0.5, 0.5]
+
+    def test_stops_on_open_circuit_and_deadline(self):
+        """サーキットが開いたら、または時間切れなら中断する"""
+        delete = Mock(side_effect=[None, CircuitOpenError('kubernetes', 60)])
+        pruner = Pruner(delete, batch_size=10, sleep=Mock())
+        assert pruner.prune(['a', 'b', 'c']) == 1
+        assert delete.call_count == 2
+
+        delete = Mock()
+        pruner = Pruner(delete, batch_size=1, sleep=Mock())
+        assert pruner.prune(['a', 'b'], should_stop=Mock(side_effect=[False, True])) == 1
+
+    def test_failures_do_not_stop_pruning(self):
+        """個別の削除失敗は記録して続行する"""
+        delete = Mock(side_effect=[ApiException(status=403), None])
+        pruner = Pruner(delete, sleep=Mock())
+
+        assert pruner.prune(['a', 'b']) == 1
+        assert pruner.failed == 1
+
+
+class TestPollerRetention:
+    """GitHubPoller と保持ポリシーの連携テスト"""
+
+    def _poll(self, poller, config_data, runs):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump(config_data)}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.k8s_custom_client.list_namespaced_custom_object.return_value = {'items': runs}
+        poller.get_latest_commit_sha = Mock(return_value='sha')
+        poller.poll_repositories()
+
+    def test_poll_prunes_expired_runs(self, poller):
+        """ポーリング後に期限切れの PipelineRun を削除する"""
+        now = datetime.now(timezone.utc)
+        runs = [_run('build-repo1-new', age_hours=1, now=now), _run('build-repo1-old', age_hours=500, now=now)]
+        self._poll(poller, {
+            'retention': {'maxAge': '7d'},
+            'repositories': [{'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                              'pipeline': 'build', 'lastCheckedSHA': 'sha'}],
+        }, runs)
+
+        delete = poller.k8s_custom_client.delete_namespaced_custom_object
+        delete.assert_called_once()
+        assert delete.call_args[1]['name'] == 'build-repo1-old'
+        assert delete.call_args[1]['body'].propagation_policy == 'Background'
+        list_call = poller.k8s_custom_client.list_namespaced_custom_object.call_args
+        assert list_call[1]['label_selector'] == 'app.kubernetes.io/managed-by=github-poller'
+
+    def test_poll_without_retention_does_not_list(self, poller):
+        """保持設定がなければ一覧取得も削除も行わない"""
+        self._poll(poller, {
+            'repositories': [{'name': 'repo1', 'url': 'https://github.com/org/repo1',
+                              'pipeline': 'build', 'lastCheckedSHA': 'sha'}],
+        }, [])
+
+        poller.k8s_custom_client.list_namespaced_custom_object.assert_not_called()
+        poller.k8s_custom_client.delete_namespaced_custom_object.assert_not_called()
+
+    def test_already_deleted_run_counts_as_deleted(self, poller):
+        """既に削除済み（404）の PipelineRun はエラーにしない"""
+        poller.k8s_custom_client.delete_namespaced_custom_object.side_effect = ApiException(status=404)
+
+        poller._delete_pipelinerun('gone')
@@ -0,0 +1,115 @@
+"""
+検出バックエンドのシャドーモードのテスト
+"""
+
+import sqlite3
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from history import HistoryStore
+from shadow import PRIMARY, SHADOW, ShadowDetector, ShadowSettings, parse_shadow
+from transport import RequestTiming
+
+KEY = ('github.com', 'org', 'app', 'main')
+
+
+class TestShadowSettings:
+    """parse_shadow のテスト"""
+
+    def test_parse(self):
+        assert parse_shadow({}) is None
+        assert parse_shadow({'shadow': {'backend': 'sha', 'sample': 0.25}}) == ShadowSettings('sha', 0.25)
+        with pytest.raises(ValueError) as excinfo:
+            parse_shadow({'shadow': {'backend': 'graphql', 'sample': 0}})
+        assert str(excinfo.value).count(';') == 1
+
+    def test_sampling_is_stable(self):
+        """同じブランチは毎回同じ判定になり、指定した割合に近い数が選ばれる"""
+        settings = ShadowSettings('refs', 0.2)
+        keys = [('github.com', 'org', f'repo-{index}', 'main') for index in range(1000)]
+
+        sampled = [key for key in keys if settings.samples(key)]
+
+        assert 150 < len(sampled) < 250
+        assert sampled == [key for key in keys if settings.samples(key)]
+        assert all(ShadowSettings('refs').samples(key) for key in keys)
+
+
+class TestShadowDetector:
+    """ShadowDetector のテスト"""
+
+    def test_sha_backend_uses_etags(self):
+        """sha バックエンドは前回の ETag を送り、304 では前回の SHA を返す"""
+        detector = ShadowDetector(ShadowSettings('sha'))
+        request = Mock(return_value=({'ETag': '"a"'}, {'data': 'abc123'}))
+
+        assert detector.lookup(request, '/repos/org/app', 'main', KEY) == 'abc123'
+        assert request.call_args[0] == ('/repos/org/app/commits/main', None,
+                                        {'Accept': 'application/vnd.github.sha'})
+
+        request.return_value = ({}, None)
+        assert detector.lookup(request, '/repos/org/app', 'main', KEY) == 'abc123'
+        assert request.call_args[0][2]['If-None-Match'] == '"a"'
+
+    def test_comparison(self):
+        """一致・競合（再取得で一致）・不一致を区別し、呼び出し数と時間を側ごとに数える"""
+        detector = ShadowDetector(ShadowSettings('refs'))
+        with detector.measure(PRIMARY):
+            detector.on_request(RequestTiming('GET', 'api.github.com', 200, 0.1, 0.1))
+            detector.on_request(RequestTiming('GET', 'api.github.com', 200, 0.1, 0.1))
+        with detector.measure(SHADOW):
+            detector.on_request(RequestTiming('GET', 'api.github.com', 304, 0.1, 0.1))
+        detector.on_request(RequestTiming('GET', 'api.github.com', 200, 0.1, 0.1))
+
+        detector.compare('a', 'main', 'sha-1', 'sha-1', Mock())
+        detector.compare('b', 'main', 'sha-1', 'sha-2', Mock(return_value='sha-2'))
+        detector.compare('c', 'main', 'sha-1', 'sha-2', Mock(return_value='sha-1'))
+
+        report = detector.report
+        assert (report.agreed, report.raced, report.disagreements) == (1, 1, [('c', 'main', 'sha-1', 'sha-2')])
+        assert (report.sides[PRIMARY].api_calls, report.sides[SHADOW].api_calls) == (2, 1)
+        assert report.sides[SHADOW].not_modified == 1
+        assert '- c@main: rest sha-1, refs sha-2' in report.summary()
+
+
+class TestPollerShadow:
+    """GitHubPoller のシャドーモードのテスト"""
+
+    @pytest.fixture
+    def poller_env(self, poller_env, tmp_path):
+        poller_env.setenv('HISTORY_PATH', str(tmp_path / 'history.db'))
+        return poller_env
+
+    @pytest.fixture
+    def poller(self, poller):
+        repository = poller.github_client.get_repo.return_value
+        repository.get_branch.return_value.commit.sha = 'new-sha'
+        repository._requester.requestJsonAndCheck.return_value = ({}, {'object': {'sha': 'stale-sha'}})
+        return poller
+
+    def test_shadow_never_triggers(self, poller):
+        """シャドーの結果は比較と記録だけに使われ、起動や状態には影響しない"""
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({
+            'shadow': {'backend': 'refs'},
+            'repositories': [
+                {'name': 'app', 'url': 'https://github.com/org/app', 'pipeline': 'build', 'lastCheckedSHA': 'new-sha'},
+            ],
+        })}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+
+        poller.poll_repositories()
+
+        poller.k8s_custom_client.create_namespaced_custom_object.assert_not_called()
+        assert poller.shadow.report.disagreements == [('app', 'main', 'new-sha', 'stale-sha')]
+        url = poller.github_client.get_repo.return_value._requester.requestJsonAndCheck.call_args[0][1]
+        assert url == '/repos/org/app/git/ref/heads/main'
+        rows = sqlite3.connect(poller.history.path).execute(
+            "SELECT backend, compared, disagreed FROM shadow_cycles").fetchall()
+        assert rows == [('refs', 1, 1)]
+        assert 'Shadow detection' in HistoryStore(poller.history.path).report()
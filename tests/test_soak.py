@@ -0,0 +1,315 @@
+"""
+常駐モードの長時間稼働（メモリリーク）のソークテスト
+
+ローカルの偽 GitHub / Kubernetes API サーバーに対して、本物の PyGithub と
+kubernetes クライアントでデーモンのサイクルを繰り返し、tracemalloc と RSS で
+サイクルあたりのメモリ増加を計測する。増加量がしきい値を超えると失敗し、
+増加の大きい割り当て箇所を報告する。
+
+    SOAK_CYCLES=3000 pytest tests/test_soak.py -m slow -s   # make soak
+
+| 環境変数 | デフォルト | 説明 |
+|---------|-----------|------|
+| SOAK_CYCLES | 20 | 計測するサイクル数（ウォームアップを除く） |
+| SOAK_WARMUP_CYCLES | 5 | 計測前に実行するサイクル数 |
+| SOAK_REPOSITORIES | 10 | 監視するリポジトリ数 |
+| SOAK_MAX_GROWTH_BYTES | 2048 | サイクルあたりの Python ヒープ増加の上限 |
+| SOAK_MAX_RSS_GROWTH_BYTES | 16384 | サイクルあたりの RSS 増加の上限 |
+| SOAK_RSS_SLACK_BYTES | 8388608 | RSS の増加として許容する固定分（アロケータの揺らぎ） |
+"""
+
+import functools
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import threading
+import tracemalloc
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import yaml
+from github import Github
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from hints import Hint, HintQueue
+from poller import GitHubPoller
+
+NAMESPACE = 'soak'
+CONFIGMAP = 'github-poller-config'
+
+CONFIGMAP_PATH = re.compile(rf'^/api/v1/namespaces/{NAMESPACE}/configmaps/{CONFIGMAP}$')
+PIPELINERUNS_PATH = re.compile(rf'^/apis/tekton\.dev/v1beta1/namespaces/{NAMESPACE}/pipelineruns$')
+REPO_PATH = re.compile(r'^/api/v3/repos/([^/]+)/([^/]+)$')
+BRANCH_PATH = re.compile(r'^/api/v3/repos/([^/]+)/([^/]+)/branches/([^/]+)$')
+
+
+class FakeAPIServer(ThreadingHTTPServer):
+    """Serves the subset of the GitHub and Kubernetes APIs a polling cycle uses."""
+
+    daemon_threads = True
+
+    def __init__(self, configmap):
+        super().__init__(('127.0.0.1', 0), FakeAPIHandler)
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.configmap = configmap
+        self.resource_version = 1
+        self.created = 0
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately: avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+
+    def _configmap(self):
+        server = self.server
+        return {'apiVersion': 'v1', 'kind': 'ConfigMap',
+                'metadata': {'name': CONFIGMAP, 'namespace': NAMESPACE,
+                             'resourceVersion': str(server.resource_version)},
+                'data': dict(server.configmap)}
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            generation = server.generation
+        rate_limit = {'X-RateLimit-Remaining': '4999', 'X-RateLimit-Limit': '5000',
+                      'X-RateLimit-Reset': '9999999999'}
+        if self.path == '/_soak/stats':
+            with server.lock:
+                self._send(200, {'requests': server.requests, 'created': server.created})
+        elif CONFIGMAP_PATH.match(self.path):
+            with server.lock:
+                self._send(200, self._configmap())
+        elif BRANCH_PATH.match(self.path):
+            owner, repo, branch = BRANCH_PATH.match(self.path).groups()
+            sha = f"{generation:020x}{zlib.crc32(repo.encode()):020x}"
+            self._send(200, {'name': branch, 'commit': {
+                'sha': sha, 'url': f"{server.base_url}/api/v3/repos/{owner}/{repo}/commits/{sha}"}},
+                rate_limit)
+        elif REPO_PATH.match(self.path):
+            owner, repo = REPO_PATH.match(self.path).groups()
+            self._send(200, {'name': repo, 'full_name': f"{owner}/{repo}", 'owner': {'login': owner},
+                             'url': f"{server.base_url}/api/v3/repos/{owner}/{repo}"}, rate_limit)
+        else:
+            self._send(404, {'message': 'Not Found'})
+
+    def do_PUT(self):
+        server = self.server
+        if not CONFIGMAP_PATH.match(self.path):
+            self._send(404, {'message': 'Not Found'})
+            return
+        body = self._body()
+        with server.lock:
+            server.requests += 1
+            server.configmap = body.get('data') or {}
+            server.resource_version += 1
+            self._send(200, self._configmap())
+
+    def do_POST(self):
+        server = self.server
+        if self.path == '/_soak/advance':
+            # Move every branch head
+            with server.lock:
+                server.generation += 1
+            self._send(200, {})
+            return
+        if not PIPELINERUNS_PATH.match(self.path):
+            self._send(404, {'message': 'Not Found'})
+            return
+        body = self._body()
+        with server.lock:
+            server.requests += 1
+            server.created += 1
+        self._send(201, body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(server):
+    server.serve_forever()
+
+
+def _control(base_url, path, method='GET'):
+    """Talk to the fake server's control endpoints."""
+    request = urllib.request.Request(f"{base_url}{path}", method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _allocation_site(traceback) -> str:
+    """Innermost frame of an allocation, plus the poller frame that led to it."""
+    frames = list(traceback)
+    if not frames:
+        return '?'
+    site = f"{frames[-1].filename}:{frames[-1].lineno}"
+    poller_frames = [frame for frame in reversed(frames) if os.path.abspath(frame.filename).startswith(SRC_DIR)]
+    if poller_frames and poller_frames[0] is not frames[-1]:
+        site += f" (via {os.path.basename(poller_frames[0].filename)}:{poller_frames[0].lineno})"
+    return site
+
+
+def _heap_snapshot():
+    # Objects in reference cycles are only freed by the collector
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+
+
+@pytest.mark.slow
+class TestDaemonSoak:
+    """デーモンモードのソークテスト"""
+
+    @pytest.fixture
+    def api(self, tmp_path):
+        """偽 API サーバーを別プロセスで起動（計測対象のヒープに含めないため）"""
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            pytest.skip('fork is not available')
+        server = FakeAPIServer({})
+        host = server.base_url.split('://', 1)[1]
+        count = int(os.getenv('SOAK_REPOSITORIES', '10'))
+        server.configmap = {'config.yaml': yaml.dump({
+            'github': {'hosts': {host: {'apiUrl': f"{server.base_url}/api/v3", 'secretDir': str(tmp_path)}}},
+            'repositories': [
+                {'name': f'repo-{i}', 'url': f"{server.base_url}/org/repo-{i}", 'pipeline': 'build',
+                 'params': [{'name': 'revision', 'value': '${commit.sha}'}]}
+                for i in range(count)
+            ],
+        })}
+        process = multiprocessing.get_context('fork').Process(target=_serve, args=(server,), daemon=True)
+        process.start()
+        server.socket.close()
+        yield server.base_url
+        process.terminate()
+        process.join()
+
+    @pytest.fixture
+    def poller(self, api, monkeypatch, tmp_path):
+        """偽 API サーバーに接続する GitHubPoller を作成"""
+        from kubernetes import client
+
+        monkeypatch.setenv('GITHUB_TOKEN', 'test-token-123')
+        monkeypatch.setenv('GITHUB_AUTH_TYPE', 'pat')
+        monkeypatch.setenv('NAMESPACE', NAMESPACE)
+        monkeypatch.setenv('CONFIGMAP_NAME', CONFIGMAP)
+        monkeypatch.setenv('RETRY_MAX_ATTEMPTS', '1')
+        (tmp_path / 'github-token').write_text('fake-token\n')
+
+        def load_incluster_config():
+            configuration = client.Configuration()
+            configuration.host = api
+            client.Configuration.set_default(configuration)
+
+        # PyGithub waits 0.25s between requests by default; the fake server needs no pacing
+        unpaced = functools.partial(Github, seconds_between_requests=None, seconds_between_writes=None)
+        with patch('poller.config.load_incluster_config', side_effect=load_incluster_config), \
+                patch('poller.Github', unpaced):
+            yield GitHubPoller()
+
+    def test_memory_is_bounded_across_cycles(self, api, poller):
+        """サイクルを繰り返してもメモリがしきい値を超えて増えない"""
+        warmup = int(os.getenv('SOAK_WARMUP_CYCLES', '5'))
+        cycles = int(os.getenv('SOAK_CYCLES', '20'))
+        max_growth = int(os.getenv('SOAK_MAX_GROWTH_BYTES', '2048'))
+        max_rss_growth = int(os.getenv('SOAK_MAX_RSS_GROWTH_BYTES', '16384'))
+        rss_slack = int(os.getenv('SOAK_RSS_SLACK_BYTES', str(8 * 1024 * 1024)))
+
+        poller.hint_queue = HintQueue()
+        host = api.split('://', 1)[1]
+        stop = threading.Event()
+        poll = poller.poll_repositories
+        state = {'cycles': 0, 'hinted': 0, 'errors': []}
+
+        def cycle(hints=None):
+            try:
+                poll(hints)
+            except Exception as e:
+                state['errors'].append(repr(e))
+                raise
+            if hints is not None:
+                state['hinted'] += 1
+                return
+            state['cycles'] += 1
+            # Every 5th cycle all heads move and every repository triggers a PipelineRun
+            if state['cycles'] % 5 == 0:
+                _control(api, '/_soak/advance', 'POST')
+            # A hint between regular cycles exercises the hinted path
+            poller.hint_queue.put(Hint(host, 'org', f"repo-{state['cycles'] % 3}"))
+            if state['cycles'] == warmup:
+                state['baseline'] = (_heap_snapshot(), _rss_bytes())
+            elif state['cycles'] == warmup + cycles:
+                state['final'] = (_heap_snapshot(), _rss_bytes())
+                stop.set()
+
+        poller.poll_repositories = cycle
+        logging.disable(logging.INFO)
+        tracemalloc.start(10)
+        try:
+            poller.serve(interval=0.001, stop=stop, debounce=0)
+        finally:
+            tracemalloc.stop()
+            logging.disable(logging.NOTSET)
+
+        stats = _control(api, '/_soak/stats')
+        assert state['errors'] == []
+        assert stats['created'] >= int(os.getenv('SOAK_REPOSITORIES', '10')) * (cycles // 5)
+
+        (heap_before, rss_before), (heap_after, rss_after) = state['baseline'], state['final']
+        differences = heap_after.compare_to(heap_before, 'traceback')
+        growth = sum(stat.size_diff for stat in differences) / cycles
+        rss_growth = rss_after - rss_before
+        top = '\n'.join(
+            f"  {stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7d} blocks  {_allocation_site(stat.traceback)}"
+            for stat in sorted(differences, key=lambda s: s.size_diff, reverse=True)[:10]
+        )
+        report = (f"{cycles} cycles ({state['hinted']} hinted), {stats['requests']} API requests, "
+                  f"{stats['created']} PipelineRuns\n"
+                  f"heap growth {growth:.0f} B/cycle (limit {max_growth}), "
+                  f"RSS {rss_before / 2**20:.1f} -> {rss_after / 2**20:.1f} MiB\n"
+                  f"top allocation sites:\n{top}")
+        print(report)
+
+        assert growth <= max_growth, report
+        assert rss_growth <= max(max_rss_growth * cycles, rss_slack), report
@@ -0,0 +1,169 @@
+"""
+タグ監視（semver フィルタと matching-refs の取得）のテスト
+"""
+
+import pytest
+from unittest.mock import Mock
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from models import ConfigError, parse_repository
+from tags import Tag, TagFilter, fetch_matching_tags, parse_tag_filter, parse_version, peel
+
+
+def _ref(name, sha=None, type='commit'):
+    return {'ref': f'refs/tags/{name}', 'object': {'sha': sha or f'sha-{name}', 'type': type}}
+
+
+class TestVersions:
+    """バージョンの解釈と範囲指定のテスト"""
+
+    def test_precedence(self):
+        """semver の優先順位で並ぶ（プレリリースはリリースより前、数値は数値として比較）"""
+        names = ['v1.10.0', 'v1.2.0', 'v1.2.0-rc.10', 'v1.2.0-rc.2', 'v1.2.0-beta', 'release-1.3', 'v2']
+        ordered = sorted(names, key=parse_version)
+        assert ordered == ['v1.2.0-beta', 'v1.2.0-rc.2', 'v1.2.0-rc.10', 'v1.2.0', 'release-1.3', 'v1.10.0', 'v2']
+        assert parse_version('latest') is None
+        assert parse_version('v1.2.3+build.5') == parse_version('1.2.3')
+
+    def test_filter(self):
+        """glob・範囲・プレリリースの指定で対象のタグを絞り込み、古い順に並べる"""
+        tag_filter = parse_tag_filter({'pattern': 'v*', 'semver': '>=1.4.0 <2.0.0'})
+        tags = [Tag(name, 'sha') for name in ('v2.0.0', 'v1.5.0', 'v1.3.9', 'v1.6.0-rc.1', 'v1.4.0', 'x1.5.0')]
+
+        assert tag_filter.prefix == 'v'
+        assert [tag.name for _, tag in tag_filter.select(tags)] == ['v1.4.0', 'v1.5.0']
+        with_prereleases = parse_tag_filter({'pattern': 'v1.*', 'semver': '^1.5', 'prereleases': True})
+        assert with_prereleases.prefix == 'v1.'
+        assert [tag.name for _, tag in with_prereleases.select(tags)] == ['v1.5.0', 'v1.6.0-rc.1']
+        assert [tag.name for _, tag in TagFilter(comparators=parse_tag_filter({'semver': '~1.4'}).comparators)
+                .select(tags)] == ['v1.4.0']
+
+    def test_partial_ranges(self):
+        """~ と ^ の上限は指定された桁までで決まる（省略した桁はワイルドカード）"""
+        tags = [Tag(name, 'sha') for name in ('v0.0.3', 'v0.1.0', 'v0.2.0', 'v1.0.0', 'v1.2.0', 'v1.3.0', 'v2.0.0')]
+
+        def select(semver):
+            return [tag.name for _, tag in parse_tag_filter({'pattern': 'v*', 'semver': semver}).select(tags)]
+
+        assert select('~1') == ['v1.0.0', 'v1.2.0', 'v1.3.0']
+        assert select('~1.2') == ['v1.2.0']
+        assert select('~1.2.0') == ['v1.2.0']
+        assert select('^0') == ['v0.0.3', 'v0.1.0', 'v0.2.0']
+        assert select('^0.1') == ['v0.1.0']
+        assert select('^0.0.3') == ['v0.0.3']
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError) as excinfo:
+            parse_tag_filter({'pattern': '', 'semver': '>=one', 'prereleases': 'yes'})
+        assert str(excinfo.value).count(';') == 2
+        with pytest.raises(ConfigError):
+            parse_repository({'name': 'a', 'url': 'https://github.com/org/a', 'pipeline': 'p',
+                              'tags': {'pattern': 'v*'}})
+        with pytest.raises(ConfigError):
+            parse_repository({'name': 'a', 'url': 'https://github.com/org/a', 'pipeline': 'p', 'watch': 'commits'})
+
+
+class TestFetchMatchingTags:
+    """fetch_matching_tags のテスト"""
+
+    def test_pages_and_etag(self):
+        """次のページをたどり、ETag は1ページに収まった場合だけ返す"""
+        request = Mock(side_effect=[
+            ({'etag': '"a"', 'link': '<https://api.github.com/next?page=2>; rel="next"'}, [_ref('v1.0.0')]),
+            ({}, [_ref('v1.1.0', type='tag')]),
+        ])
+
+        listing = fetch_matching_tags(request, '/repos/org/app', 'v', '"old"')
+
+        assert listing.tags == [Tag('v1.0.0', 'sha-v1.0.0'), Tag('v1.1.0', 'sha-v1.1.0', 'tag')]
+        assert listing.etag is None
+        assert request.call_args_list[0][0] == ('/repos/org/app/git/matching-refs/tags/v', {'per_page': 100},
+                                                {'If-None-Match': '"old"'})
+        assert request.call_args_list[1][0] == ('https://api.github.com/next?page=2', None, {})
+
+        request = Mock(return_value=({'etag': '"b"'}, [_ref('v1.0.0')]))
+        assert fetch_matching_tags(request, '/repos/org/app', '').etag == '"b"'
+
+    def test_not_modified(self):
+        """304 の場合は変化なしとして返す"""
+        listing = fetch_matching_tags(Mock(return_value=({}, None)), '/repos/org/app', 'v', '"a"')
+        assert listing.unchanged and listing.etag == '"a"'
+
+    def test_peel_annotated_tag(self):
+        """注釈付きタグはタグオブジェクトをたどってコミットの SHA を返す"""
+        request = Mock(return_value=({}, {'object': {'sha': 'commit-sha', 'type': 'commit'}}))
+        assert peel(request, '/repos/org/app', Tag('v1', 'tag-sha', 'tag')) == 'commit-sha'
+        request.assert_called_once_with('/repos/org/app/git/tags/tag-sha', None, {})
+        assert peel(request, '/repos/org/app', Tag('v1', 'commit-sha')) == 'commit-sha'
+
+
+class TestPollerTags:
+    """GitHubPoller のタグ監視のテスト"""
+
+    @pytest.fixture
+    def poller(self, poller):
+        poller.requester = poller.github_client.get_repo.return_value._requester
+        return poller
+
+    def _poll(self, poller, entry, refs, etag='"etag"'):
+        def request(verb, url, parameters, headers):
+            if etag and headers.get('If-None-Match') == etag:
+                return {}, None
+            return {'etag': etag} if etag else {}, refs
+
+        poller.requester.requestJsonAndCheck.side_effect = request
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump({'repositories': [entry]})}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.poll_repositories()
+        return yaml.safe_load(mock_configmap.data['config.yaml'])['repositories'][0]
+
+    def _created(self, poller):
+        return [c[1]['body'] for c in poller.k8s_custom_client.create_namespaced_custom_object.call_args_list]
+
+    @pytest.fixture
+    def entry(self):
+        return {'name': 'app-release', 'url': 'https://github.com/org/app', 'pipeline': 'deploy',
+                'watch': 'tags', 'tags': {'pattern': 'v*'},
+                'params': [{'name': 'version', 'value': '${tag.name}'}]}
+
+    def test_first_check_records_newest_tag(self, poller, entry):
+        """初回は最新のタグを記録するだけで起動しない"""
+        saved = self._poll(poller, entry, [_ref('v1.0.0'), _ref('v1.2.0'), _ref('v1.1.0')])
+
+        assert (saved['lastTag'], saved['lastCheckedSHA'], saved['tagsETag']) == \
+            ('v1.2.0', 'sha-v1.2.0', '"etag"')
+        assert self._created(poller) == []
+        url = poller.requester.requestJsonAndCheck.call_args[0][1]
+        assert url == '/repos/org/app/git/matching-refs/tags/v'
+
+    def test_new_tags_trigger_in_version_order(self, poller, entry):
+        """新しいタグごとにバージョンの古い順で1回ずつ起動し、最後のタグを記録する"""
+        entry.update({'lastTag': 'v1.2.0', 'lastCheckedSHA': 'sha-v1.2.0'})
+        refs = [_ref('v1.0.0'), _ref('v1.10.0'), _ref('v1.2.0'), _ref('v1.3.0'), _ref('v1.3.1-rc.1')]
+
+        saved = self._poll(poller, entry, refs)
+
+        created = self._created(poller)
+        assert [run['spec']['params'][0]['value'] for run in created] == ['v1.3.0', 'v1.10.0']
+        assert created[0]['metadata']['labels']['github-poller/commit'] == 'sha-v1.3.0'
+        assert (saved['lastTag'], saved['lastCheckedSHA'], saved['tagsETag']) == \
+            ('v1.10.0', 'sha-v1.10.0', '"etag"')
+
+        poller.k8s_custom_client.create_namespaced_custom_object.reset_mock()
+        self._poll(poller, saved, refs)
+        assert self._created(poller) == []
+        assert poller.requester.requestJsonAndCheck.call_args[0][3] == {'If-None-Match': '"etag"'}
+
+    def test_failed_trigger_is_retried_next_run(self, poller, entry):
+        """起動に失敗したタグ以降は記録せず、次回に再び起動する"""
+        entry.update({'lastTag': 'v1.0.0', 'lastCheckedSHA': 'sha-v1.0.0', 'tagsETag': '"old"'})
+        poller.k8s_custom_client.create_namespaced_custom_object.side_effect = [{}, Exception('boom')]
+
+        saved = self._poll(poller, entry, [_ref('v1.1.0'), _ref('v1.2.0'), _ref('v1.0.0')])
+
+        assert saved['lastTag'] == 'v1.1.0'
+        assert saved['tagsETag'] == '"old"'
@@ -0,0 +1,91 @@
+"""
+PipelineRun テンプレートのテスト
+"""
+
+import pytest
+import dataclasses
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from templates import Variable, commit_variables, compile_template, expand
+
+
+class TestTemplates:
+    """テンプレートのコンパイルと展開のテスト"""
+
+    @pytest.fixture
+    def repo_config(self):
+        return {
+            'name': 'test-repo',
+            'url': 'https://github.com/test-org/test-repo',
+            'branch': 'develop',
+            'pipeline': 'test-pipeline',
+            'serviceAccount': 'pipeline-sa',
+            'timeout': '2h',
+            'params': [
+                {'name': 'repo-url', 'value': '${repo.url}'},
+                {'name': 'revision', 'value': '${commit.sha}'},
+                {'name': 'message', 'value': '${repo.name}: ${previous.shortSha} -> ${commit.shortSha}'},
+                {'name': 'replicas', 'value': 3},
+                {'name': 'skipped'},
+            ],
+            'workspaces': [
+                {'name': 'source', 'claimName': 'test-pvc'},
+                {'name': 'incomplete'},
+            ]
+        }
+
+    def test_repo_placeholders_resolved_at_compile_time(self, repo_config):
+        """リポジトリのプレースホルダーはコンパイル時に展開される"""
+        template = compile_template(repo_config)
+        params = dict(template.params)
+
+        assert params['repo-url'] == ('https://github.com/test-org/test-repo',)
+        assert params['revision'] == (Variable('commit.sha'),)
+        assert params['replicas'] == ('3',)
+        assert 'skipped' not in params
+        assert template.workspaces == (('source', 'test-pvc'),)
+
+    def test_render(self, repo_config):
+        """コミット情報を埋め込んで PipelineRun を生成"""
+        template = compile_template(repo_config)
+        pipeline_run = template.render(
+            'run-1', 'test-namespace', commit_variables('abcdef1234567', '1234567abcdef')
+        )
+
+        spec = pipeline_run['spec']
+        assert pipeline_run['metadata']['name'] == 'run-1'
+        assert pipeline_run['metadata']['labels']['github-poller/repository'] == 'test-repo'
+        assert spec['pipelineRef']['name'] == 'test-pipeline'
+        assert spec['serviceAccountName'] == 'pipeline-sa'
+        assert spec['timeout'] == '2h'
+        assert spec['params'][1] == {'name': 'revision', 'value': 'abcdef1234567'}
+        assert spec['params'][2]['value'] == 'test-repo: 1234567 -> abcdef1'
+        assert spec['workspaces'] == [{'name': 'source', 'persistentVolumeClaim': {'claimName': 'test-pvc'}}]
+
+    def test_template_is_immutable(self, repo_config):
+        """テンプレートは変更できず、生成結果も共有されない"""
+        template = compile_template(repo_config)
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            template.pipeline = 'other'
+
+        first = template.render('run-1', 'ns', commit_variables('a' * 40))
+        first['spec']['params'].clear()
+        second = template.render('run-2', 'ns', commit_variables('a' * 40))
+        assert len(second['spec']['params']) == 4
+
+    def test_unknown_placeholders_collected(self, repo_config):
+        """未知のプレースホルダーは収集され、文字列はそのまま残る"""
+        repo_config['params'] = [{'name': 'typo', 'value': '${repo.nmae}-${commit.sha}'}]
+
+        template = compile_template(repo_config)
+
+        assert template.unknown_placeholders == ('repo.nmae',)
+        rendered = template.render('run', 'ns', commit_variables('abc'))
+        assert rendered['spec']['params'][0]['value'] == '${repo.nmae}-abc'
+
+    def test_expand_single_pass(self):
+        """展開結果に含まれるプレースホルダーは再展開されない"""
+        result = expand('${a}${b}', {'a': '${b}', 'b': 'x'})
+        assert result == '${b}x'
@@ -0,0 +1,100 @@
+"""
+共有 HTTP トランスポートのテスト
+"""
+
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from github import Auth, Github
+from github.Requester import Requester
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from transport import Transport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.accept_encodings.append(self.headers.get('Accept-Encoding'))
+        body = gzip.compress(json.dumps({'full_name': 'org/app', 'name': 'app'}).encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-RateLimit-Remaining', '4990')
+        self.send_header('X-RateLimit-Limit', '5000')
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.accept_encodings = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestTransport:
+    """Transport のテスト"""
+
+    def test_requests_are_timed_and_connections_reused(self, server):
+        """新しい接続だけに接続時間が記録され、2回目以降は keep-alive 接続が再利用される"""
+        transport = Transport()
+        timings = []
+        transport.add_hook(timings.append)
+        url = f'http://127.0.0.1:{server.server_port}/app/installations/1/access_tokens'
+
+        assert transport.post(url).json()['name'] == 'app'
+        assert transport.post(url).json()['name'] == 'app'
+
+        first, second = timings
+        assert not first.reused and first.connection.connect >= 0 and first.ttfb > 0
+        assert second.reused
+        assert first.rate_limit == {'x-ratelimit-remaining': '4990', 'x-ratelimit-limit': '5000'}
+        assert server.accept_encodings == ['gzip', 'gzip']
+        stats = transport.stats.hosts['127.0.0.1']
+        assert (stats.requests, stats.connections) == (2, 1)
+        assert '4990/5000' in transport.stats.summary()
+
+    def test_pygithub_goes_through_the_transport(self, server):
+        """install() 後の PyGithub クライアントのリクエストもトランスポートで計測される"""
+        transport = Transport()
+        transport.install()
+        try:
+            github = Github(auth=Auth.Token('token'), base_url=f'http://127.0.0.1:{server.server_port}',
+                            seconds_between_requests=None)
+            assert github.get_repo('org/app').name == 'app'
+        finally:
+            Requester.resetConnectionClasses()
+
+        assert transport.stats.hosts['127.0.0.1'].requests == 1
+
+    def test_host_pool_size(self):
+        """プールサイズが既定と異なるホストには専用のプールを割り当てる"""
+        transport = Transport(pool_size=10)
+        transport.use_pool_size('https', 'ghes.example.com', 443, 4)
+        transport.use_pool_size('https', 'api.github.com', 443, 10)
+
+        adapter = transport.session.get_adapter('https://ghes.example.com/api/v3/repos/org/app')
+        assert adapter._pool_maxsize == 4
+        assert transport.session.get_adapter('https://api.github.com/repos')._pool_maxsize == 10
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            Transport(connect_timeout=0)
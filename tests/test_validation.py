@@ -0,0 +1,193 @@
+"""
+PipelineRun の事前検証（dry-run とキャッシュ）のテスト
+"""
+
+import json
+
+import pytest
+from unittest.mock import Mock
+from kubernetes.client.rest import ApiException
+import yaml
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from models import parse_repository
+from validation import STATUS_QUARANTINED, STATUS_VALID, PipelineRunValidator, shape_key
+
+
+def _repo(name, pipeline='build', claim='source', params=('git-url',)):
+    return parse_repository({
+        'name': name, 'url': f'https://github.com/org/{name}', 'pipeline': pipeline,
+        'params': [{'name': param, 'value': '${repo.url}'} for param in params],
+        'workspaces': [{'name': 'shared', 'claimName': claim}],
+    })
+
+
+def _pipeline(name, version='1', params=({'name': 'git-url'},)):
+    return {'metadata': {'name': name, 'resourceVersion': version},
+            'spec': {'params': list(params), 'workspaces': [{'name': 'shared'}]}}
+
+
+class TestPipelineRunValidator:
+    """PipelineRunValidator のテスト"""
+
+    @pytest.fixture
+    def cluster(self):
+        return {
+            'Pipeline': {'build': _pipeline('build')},
+            'PersistentVolumeClaim': {'source': {'metadata': {'resourceVersion': '7'}}},
+        }
+
+    def _validator(self, cluster, cache=None, dry_run=None):
+        dry_run = dry_run or Mock()
+        validator = PipelineRunValidator('ci', {} if cache is None else cache,
+                                         lambda kind: cluster.get(kind, {}), dry_run)
+        return validator, dry_run
+
+    def test_shapes_are_validated_once(self, cluster):
+        """同じ形の PipelineRun は1回だけ検証され、結果はキャッシュされる"""
+        cache = {}
+        validator, dry_run = self._validator(cluster, cache)
+
+        assert validator.check([_repo('a'), _repo('b')]) == {}
+        assert dry_run.call_count == 1
+        assert dry_run.call_args[0][0]['metadata']['name'].startswith('build-validate-')
+        assert cache[shape_key(_repo('a').template)]['status'] == STATUS_VALID
+
+        validator, dry_run = self._validator(cluster, cache)
+        validator.check([_repo('a'), _repo('b')])
+        dry_run.assert_not_called()
+        assert not validator.changed
+
+    def test_missing_references_are_quarantined(self, cluster):
+        """存在しない Pipeline・PVC や、デフォルトのない params の不足は dry-run せずに隔離する"""
+        validator, dry_run = self._validator(cluster)
+
+        quarantined = validator.check([_repo('typo', pipeline='buld'), _repo('no-pvc', claim='missing'),
+                                       _repo('no-param', params=())])
+
+        dry_run.assert_not_called()
+        assert quarantined['typo']['reason'] == 'not found: Pipeline/buld'
+        assert quarantined['no-pvc']['reason'] == 'not found: PersistentVolumeClaim/missing'
+        assert quarantined['no-param']['reason'] == 'params without default not provided: git-url'
+        assert all(entry['status'] == STATUS_QUARANTINED for entry in quarantined.values())
+
+    def test_changed_references_are_revalidated(self, cluster):
+        """参照先が作成・変更されると再検証され、隔離が解除される"""
+        cache = {}
+        validator, _ = self._validator(cluster, cache)
+        assert 'typo' in validator.check([_repo('typo', pipeline='buld')])
+
+        cluster['Pipeline']['buld'] = _pipeline('buld')
+        validator, dry_run = self._validator(cluster, cache)
+        assert validator.check([_repo('typo', pipeline='buld')]) == {}
+        dry_run.assert_called_once()
+
+        cluster['Pipeline']['buld'] = _pipeline('buld', version='2')
+        validator, dry_run = self._validator(cluster, cache)
+        validator.check([_repo('typo', pipeline='buld')])
+        dry_run.assert_called_once()
+
+    def test_dry_run_rejection(self, cluster):
+        """dry-run が拒否された形は理由付きで隔離され、一時的なエラーでは隔離しない"""
+        rejected = ApiException(status=400)
+        rejected.body = json.dumps({'message': 'admission webhook denied the request: invalid timeout'})
+        validator, _ = self._validator(cluster, dry_run=Mock(side_effect=rejected))
+        assert validator.check([_repo('a')])['a']['reason'] == \
+            'dry-run rejected: admission webhook denied the request: invalid timeout'
+
+        cache = {}
+        validator, _ = self._validator(cluster, cache, dry_run=Mock(side_effect=ApiException(status=503)))
+        assert validator.check([_repo('a')]) == {}
+        assert cache == {}
+
+    def test_unused_shapes_are_dropped(self, cluster):
+        """どのリポジトリにも使われなくなった形はキャッシュから削除される"""
+        cache = {'stale': {'status': STATUS_VALID}}
+        validator, _ = self._validator(cluster, cache)
+
+        validator.check([_repo('a')])
+
+        assert list(cache) == [shape_key(_repo('a').template)]
+
+
+class TestPollerValidation:
+    """GitHubPoller の事前検証のテスト"""
+
+    @pytest.fixture
+    def poller(self, poller):
+        poller.github_client.get_repo.return_value.get_branch.return_value.commit.sha = 'new-sha'
+        poller.k8s_custom_client.list_namespaced_custom_object.return_value = {
+            'items': [{'metadata': {'name': 'build', 'resourceVersion': '1'}, 'spec': {}}],
+            'metadata': {},
+        }
+        return poller
+
+    def _poll(self, poller, config_data):
+        mock_configmap = Mock()
+        mock_configmap.data = {'config.yaml': yaml.dump(config_data)}
+        poller.k8s_core_client.read_namespaced_config_map.return_value = mock_configmap
+        poller.poll_repositories()
+        return yaml.safe_load(mock_configmap.data['config.yaml'])
+
+    def _dry_runs(self, poller):
+        return [c for c in poller.k8s_custom_client.create_namespaced_custom_object.call_args_list
+                if c[1].get('dry_run') == 'All']
+
+    def test_quarantined_repositories_are_not_polled(self, poller):
+        """隔離されたリポジトリは参照されず、検証結果は次回の実行に引き継がれる"""
+        config_data = {
+            'validation': {'enabled': True},
+            'repositories': [
+                {'name': 'good', 'url': 'https://github.com/org/good', 'pipeline': 'build',
+                 'lastCheckedSHA': 'old-sha'},
+                {'name': 'typo', 'url': 'https://github.com/org/typo', 'pipeline': 'buld',
+                 'lastCheckedSHA': 'old-sha'},
+            ],
+        }
+
+        saved = self._poll(poller, config_data)
+
+        poller.github_client.get_repo.assert_called_once_with('org/good')
+        assert len(self._dry_runs(poller)) == 1
+        assert sorted(entry['status'] for entry in saved['validations'].values()) == \
+            [STATUS_QUARANTINED, STATUS_VALID]
+        assert [r['lastCheckedSHA'] for r in saved['repositories']] == ['new-sha', 'old-sha']
+
+        poller.k8s_custom_client.create_namespaced_custom_object.reset_mock()
+        self._poll(poller, saved)
+        assert self._dry_runs(poller) == []
+
+    def test_batch_params_are_provided_for_batched_pipelines(self, poller):
+        """バッチ起動のパイプラインでは、バッチの params はデフォルトがなくても渡されるものとして検証する"""
+        params = [{'name': name} for name in ('batch-repositories', 'batch-shas', 'batch-changes')]
+        poller.k8s_custom_client.list_namespaced_custom_object.return_value = {
+            'items': [{'metadata': {'name': 'build', 'resourceVersion': '1'}, 'spec': {'params': params}}],
+            'metadata': {},
+        }
+        repositories = [{'name': 'app', 'url': 'https://github.com/org/app', 'pipeline': 'build',
+                         'lastCheckedSHA': 'old-sha'}]
+
+        saved = self._poll(poller, {'validation': {'enabled': True},
+                                    'batching': {'pipelines': {'build': '10m'}},
+                                    'repositories': repositories})
+
+        assert [entry['status'] for entry in saved['validations'].values()] == [STATUS_VALID]
+        body = self._dry_runs(poller)[0][1]['body']
+        assert [p['name'] for p in body['spec']['params']][-3:] == \
+            ['batch-repositories', 'batch-shas', 'batch-changes']
+        assert [c['repository'] for c in saved['batches'][0]['changes']] == ['app']
+
+        poller.k8s_custom_client.create_namespaced_custom_object.reset_mock()
+        saved = self._poll(poller, {'validation': {'enabled': True}, 'repositories': repositories})
+        assert [entry['status'] for entry in saved['validations'].values()] == [STATUS_QUARANTINED]
+
+    def test_disabled_by_default(self, poller):
+        """設定がなければ検証しない"""
+        self._poll(poller, {'repositories': [
+            {'name': 'typo', 'url': 'https://github.com/org/typo', 'pipeline': 'buld', 'lastCheckedSHA': 'old'},
+        ]})
+
+        poller.k8s_custom_client.list_namespaced_custom_object.assert_not_called()
+        assert self._dry_runs(poller) == []